@@ -0,0 +1 @@
+# pytest añade este directorio a sys.path: los tests importan ejabberd_installer
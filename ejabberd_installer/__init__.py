@@ -0,0 +1,31 @@
+"""
+Ejabberd Installer como biblioteca: los mismos flujos que la CLI y la GUI,
+ejecutables desde Python sin cargar tkinter.
+
+    from ejabberd_installer import make_transport, run_workflow
+
+    transport = make_transport({"transport": "ssh", "address": "10.0.0.11", "user": "ubuntu"})
+    results = run_workflow("config", {"domain": "xmpp1.lab.local"}, transport)
+    for step in results:
+        print(step.status, step.title, f"{step.seconds:.1f} s", step.warnings)
+
+run_workflow(flujo, config, transport, on_message, check) valida config
+igual que un archivo --config (ConfigError) y devuelve un StepResult por
+paso: title, status ("ok", "skipped" o "failed"), seconds, messages
+[(etiqueta, texto)] y error.  Con check=True un fallo lanza WorkflowError,
+que lleva los resultados en .results.  Para reutilizar parámetros ya
+preparados: Engine(transport, on_message).run(flujo, build_params(config)).
+
+Los flujos disponibles son las claves de WORKFLOWS.  La interfaz gráfica
+vive en ejabberd_installer.gui y solo se importa al pedirla.
+"""
+
+from .transport import FakeTransport, LocalTransport, SimulatedTransport, SSHTransport, make_transport
+from .config import ConfigError, DEFAULT_CONFIG, build_params, load_config, validate_config
+from .engine import Engine, StepResult, WORKFLOWS, WorkflowError, run_workflow
+
+__all__ = [
+    "ConfigError", "DEFAULT_CONFIG", "Engine", "FakeTransport", "LocalTransport",
+    "SSHTransport", "SimulatedTransport", "StepResult", "WORKFLOWS", "WorkflowError",
+    "build_params", "load_config", "make_transport", "run_workflow", "validate_config",
+]
@@ -0,0 +1,229 @@
+"""
+Cliente de mod_http_api y alta masiva de usuarios.
+"""
+
+import time
+from pathlib import Path
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Cliente de mod_http_api y alta masiva de usuarios
+# ══════════════════════════════════════════════════════════════════════════════
+
+class ApiError(RuntimeError):
+    """Error de transporte (conexión, timeout) hablando con mod_http_api."""
+
+
+class EjabberdApi:
+    """
+    Cliente mínimo de mod_http_api sobre una única conexión HTTP keep-alive.
+    No es seguro entre hilos: cada hilo debe usar su propia instancia.
+    """
+
+    def __init__(self, base_url: str = "http://127.0.0.1:5280/api",
+                 auth: str = "", timeout: float = 10.0):
+        from urllib.parse import urlsplit
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"URL de API no válida: {base_url!r}")
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.path = url.path.rstrip("/") or "/api"
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if auth:
+            import base64
+            token = base64.b64encode(auth.encode()).decode()
+            self.headers["Authorization"] = f"Basic {token}"
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            import http.client
+            import ssl
+            if self.scheme == "https":
+                # El certificado del instalador es autofirmado
+                ctx = ssl._create_unverified_context()
+                self._conn = http.client.HTTPSConnection(self.netloc, timeout=self.timeout, context=ctx)
+            else:
+                self._conn = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def call(self, command: str, args: dict | None = None) -> tuple[int, object]:
+        """
+        Invoca un comando de la API.  Devuelve (status HTTP, cuerpo JSON) y
+        reintenta una vez si el servidor cerró la conexión reutilizada.
+        """
+        import http.client
+        import json
+        body = json.dumps(args or {}).encode()  # bytes: cabeceras y cuerpo en un solo envío
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request("POST", f"{self.path}/{command}", body, self.headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+                if resp.getheader("Connection", "").lower() == "close":
+                    self.close()
+                try:
+                    data = json.loads(raw) if raw else None
+                except ValueError:
+                    data = raw.decode(errors="replace")
+                return resp.status, data
+            except (http.client.HTTPException, OSError) as exc:
+                self.close()
+                if attempt == 2:
+                    raise ApiError(f"{command}: {exc}") from exc
+
+
+def iter_users(path: str, default_host: str):
+    """
+    Recorre el archivo de usuarios sin cargarlo entero en memoria.
+    CSV: user,password[,host] (cabecera opcional).  JSONL: {"user", "password", "host"}.
+    Devuelve (índice, user, host, password); índice cuenta solo los registros.
+    """
+    import csv
+    import json
+    with open(path, encoding="utf-8", newline="") as fh:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = ((json.loads(line) for line in fh if line.strip()))
+            records = ((r.get("user"), r.get("password"), r.get("host")) for r in rows)
+        else:
+            reader = csv.reader(fh)
+            records = ((row + [None, None])[:3] for row in reader if row)
+        index = 0
+        for user, password, host in records:
+            if index == 0 and user == "user" and password == "password":
+                continue  # cabecera CSV
+            if not user or password is None:
+                raise ValueError(f"{path}: registro {index + 1} sin usuario o contraseña")
+            yield index, user.strip(), (host or default_host).strip(), password
+            index += 1
+
+
+class BulkRegistrar:
+    """
+    Da de alta usuarios en bloque vía /api/register con concurrencia acotada,
+    conexiones persistentes por hilo, reintentos con espera exponencial y
+    progreso reanudable (<archivo>.progress).
+    """
+
+    PROGRESS_EVERY = 2.0   # segundos entre guardados del progreso
+
+    def __init__(self, path: str, host: str, api_url: str, concurrency: int = 16,
+                 retries: int = 4, auth: str = "", restart: bool = False):
+        self.path = path
+        self.host = host
+        self.api_url = api_url
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.auth = auth
+        self.progress_path = Path(f"{path}.progress")
+        self.failed_path = Path(f"{path}.failed.jsonl")
+        self.stats = {"ok": 0, "exists": 0, "failed": 0}
+        self.done = 0               # todos los registros < done están completados
+        self._pending = set()       # completados por encima de la marca
+        if not restart and self.progress_path.exists():
+            import json
+            saved = json.loads(self.progress_path.read_text())
+            self.done = saved.get("done", 0)
+            self.stats.update(saved.get("stats", {}))
+        elif restart:
+            self.failed_path.unlink(missing_ok=True)
+
+    def run(self) -> dict:
+        import queue
+        import threading
+        jobs = queue.Queue(maxsize=self.concurrency * 4)
+        lock = threading.Lock()
+        failed = open(self.failed_path, "a", encoding="utf-8")
+        start = time.monotonic()
+        last_save = start
+        skipped = self.done
+
+        def complete(index: int, outcome: str, record=None, error=""):
+            nonlocal last_save
+            with lock:
+                self.stats[outcome] += 1
+                if outcome == "failed":
+                    import json
+                    user, host = record
+                    failed.write(json.dumps({"user": user, "host": host, "error": error}) + "\n")
+                self._pending.add(index)
+                while self.done in self._pending:
+                    self._pending.discard(self.done)
+                    self.done += 1
+                now = time.monotonic()
+                if now - last_save >= self.PROGRESS_EVERY:
+                    last_save = now
+                    self._save()
+                    self._print_rate(self.done - skipped, now - start)
+
+        def worker():
+            api = EjabberdApi(self.api_url, auth=self.auth)
+            try:
+                while True:
+                    item = jobs.get()
+                    if item is None:
+                        return
+                    index, user, host, password = item
+                    outcome, error = self._register(api, user, host, password)
+                    complete(index, outcome, (user, host), error)
+            finally:
+                api.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        try:
+            for item in iter_users(self.path, self.host):
+                if item[0] >= skipped:
+                    jobs.put(item)
+        finally:
+            for _ in threads:
+                jobs.put(None)
+            for t in threads:
+                t.join()
+            failed.close()
+            self._save()
+        elapsed = time.monotonic() - start
+        self._print_rate(self.done - skipped, elapsed)
+        return {**self.stats, "seconds": elapsed, "processed": self.done - skipped}
+
+    def _register(self, api: EjabberdApi, user: str, host: str, password: str) -> tuple[str, str]:
+        delay = 0.2
+        error = ""
+        for attempt in range(self.retries + 1):
+            try:
+                status, body = api.call("register", {"user": user, "host": host, "password": password})
+            except ApiError as exc:
+                status, body, error = None, None, str(exc)
+            if status == 200:
+                return "ok", ""
+            if status == 409 or (isinstance(body, dict) and "already" in str(body.get("message", ""))):
+                return "exists", ""
+            if status is not None:
+                error = f"HTTP {status}: {body}"
+                if status < 500 and status != 429:
+                    return "failed", error      # error del cliente: no se reintenta
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+        return "failed", error
+
+    def _save(self):
+        import json
+        tmp = self.progress_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"done": self.done, "stats": self.stats}))
+        tmp.replace(self.progress_path)
+
+    def _print_rate(self, processed: int, elapsed: float):
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        print(f"  {self.done} registros · {self.stats['ok']} altas, "
+              f"{self.stats['exists']} ya existían, {self.stats['failed']} fallos "
+              f"· {rate:.0f}/s", flush=True)
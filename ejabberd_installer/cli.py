@@ -0,0 +1,550 @@
+"""
+Interfaz de terminal y punto de entrada de la línea de órdenes.
+"""
+
+import argparse
+import getpass
+import os
+import sys
+import time
+
+from .transport import Colors, SimulatedTransport
+from .components import (
+    check_haproxy, JOURNAL_STEPS, lint_config, LOCAL_API_PORT, local_api_url,
+    MODULE_PRESETS, render_haproxy, select_modules, session_kb,
+)
+from .config import build_params, ConfigError, DEFAULT_CONFIG, load_config, validate_config
+from .engine import Engine, SimulatedInstaller, WORKFLOWS
+from .fleet import FleetProvisioner, load_inventory, RollingUpgrade
+from .api import BulkRegistrar
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Instalador CLI (modo terminal sin GUI)
+# ══════════════════════════════════════════════════════════════════════════════
+
+class CLIInstaller:
+    """Interfaz de línea de comandos para instalación de ejabberd"""
+    
+    def __init__(self, config: dict | None = None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.verbose = True
+    
+    def run(self):
+        """Punto de entrada principal"""
+        self.show_banner()
+        while True:
+            self.show_menu()
+            choice = input(f"\n{Colors.CYAN}Seleccione una opción: {Colors.RESET}").strip()
+            
+            if choice == "1":
+                self.configure()
+            elif choice == "2":
+                self.show_config()
+            elif choice == "3":
+                self.install_full()
+            elif choice == "4":
+                self.config_only()
+            elif choice == "5":
+                self.cert_only()
+            elif choice == "0" or choice.lower() == "q":
+                print(f"\n{Colors.GREEN}¡Hasta luego!{Colors.RESET}")
+                break
+            else:
+                print(f"{Colors.RED}✖ Opción inválida{Colors.RESET}")
+    
+    def show_banner(self):
+        """Muestra el banner inicial"""
+        banner = f"""
+{Colors.BOLD}{Colors.GREEN}╔══════════════════════════════════════════════════════╗
+║     Ejabberd Automation Installer — Ubuntu 24.04     ║
+║          Instalador con Interfaz de Terminal         ║
+╚══════════════════════════════════════════════════════╝{Colors.RESET}
+"""
+        print(banner)
+    
+    def show_menu(self):
+        """Muestra el menú principal"""
+        menu = f"""
+{Colors.BOLD}═══ MENÚ PRINCIPAL ═══{Colors.RESET}
+
+{Colors.CYAN}1.{Colors.RESET} ⚙  Configurar parámetros
+{Colors.CYAN}2.{Colors.RESET} 👁  Ver configuración actual
+{Colors.CYAN}3.{Colors.RESET} ▶  Instalación completa (deps + compilar + configurar)
+{Colors.CYAN}4.{Colors.RESET} 🔧 Solo configurar (sin compilar)
+{Colors.CYAN}5.{Colors.RESET} 🔒 Solo generar certificado TLS
+{Colors.CYAN}0.{Colors.RESET} ✖  Salir
+"""
+        print(menu)
+    
+    def configure(self):
+        """Menú de configuración interactiva"""
+        print(f"\n{Colors.BOLD}{Colors.BLUE}═══ CONFIGURACIÓN ═══{Colors.RESET}\n")
+        
+        # Dominio
+        print(f"{Colors.YELLOW}Dominio XMPP:{Colors.RESET}")
+        val = input(f"  Principal [{self.config['domain']}]: ").strip()
+        if val:
+            self.config['domain'] = val
+            self.config['cn'] = val
+        
+        val = input(f"  Adicional (opcional) [{self.config['extra_domain']}]: ").strip()
+        if val:
+            self.config['extra_domain'] = val
+        
+        # Certificado
+        print(f"\n{Colors.YELLOW}Certificado TLS:{Colors.RESET}")
+        val = input(f"  Common Name [{self.config['cn']}]: ").strip()
+        if val:
+            self.config['cn'] = val
+        
+        val = input(f"  Validez en días [{self.config['cert_days']}]: ").strip()
+        if val:
+            self.config['cert_days'] = val
+        
+        # Base de datos
+        print(f"\n{Colors.YELLOW}Base de datos:{Colors.RESET}")
+        print("  1) sqlite  2) pgsql  3) mysql")
+        db_choice = input(f"  Tipo [1]: ").strip() or "1"
+        db_map = {"1": "sqlite", "2": "pgsql", "3": "mysql"}
+        self.config['db_type'] = db_map.get(db_choice, "sqlite")
+        
+        val = input(f"  Ruta [{self.config['db_path']}]: ").strip()
+        if val:
+            self.config['db_path'] = val
+        
+        # Módulos
+        print(f"\n{Colors.YELLOW}Módulos (memoria estimada por sesión):{Colors.RESET}")
+        presets = list(MODULE_PRESETS)
+        for i, name in enumerate(presets, 1):
+            print(f"  {i}) {name:<8} ~{session_kb(select_modules(name)):.0f} KB")
+        current = presets.index(self.config['module_preset']) + 1
+        val = input(f"  Preset [{current}]: ").strip()
+        if val.isdigit() and 1 <= int(val) <= len(presets):
+            self.config['module_preset'] = presets[int(val) - 1]
+        
+        # /etc/hosts
+        print(f"\n{Colors.YELLOW}Red (sin DNS):{Colors.RESET}")
+        hosts = input(f"  ¿Configurar /etc/hosts? (s/N): ").strip().lower()
+        self.config['etc_hosts'] = hosts in ('s', 'y', 'si', 'yes')
+        
+        if self.config['etc_hosts']:
+            val = input(f"  IP del servidor [{self.config['hosts_ip']}]: ").strip()
+            if val:
+                self.config['hosts_ip'] = val
+        
+        # Opciones
+        print(f"\n{Colors.YELLOW}Opciones de instalación:{Colors.RESET}")
+        systemd = input(f"  ¿Crear servicio systemd? (S/n): ").strip().lower()
+        self.config['systemd'] = systemd not in ('n', 'no')
+        
+        if self.config['systemd']:
+            enable = input(f"  ¿Activar servicio automáticamente? (S/n): ").strip().lower()
+            self.config['enable_svc'] = enable not in ('n', 'no')
+        
+        perms = input(f"  ¿Aplicar permisos? (S/n): ").strip().lower()
+        self.config['set_perms'] = perms not in ('n', 'no')
+        
+        # Sudo
+        print(f"\n{Colors.YELLOW}Autenticación:{Colors.RESET}")
+        self.config['sudo_pass'] = getpass.getpass("  Contraseña sudo: ")
+        
+        print(f"\n{Colors.GREEN}✔ Configuración actualizada{Colors.RESET}")
+    
+    def show_config(self):
+        """Muestra la configuración actual"""
+        print(f"\n{Colors.BOLD}{Colors.BLUE}═══ CONFIGURACIÓN ACTUAL ═══{Colors.RESET}\n")
+        
+        print(f"{Colors.CYAN}Dominio principal:{Colors.RESET}    {self.config['domain']}")
+        if self.config['extra_domain']:
+            print(f"{Colors.CYAN}Dominio adicional:{Colors.RESET}    {self.config['extra_domain']}")
+        if self.config['extra_domains']:
+            print(f"{Colors.CYAN}Otros dominios:{Colors.RESET}       {', '.join(self.config['extra_domains'])}")
+        print(f"{Colors.CYAN}Certificado CN:{Colors.RESET}       {self.config['cn']}")
+        print(f"{Colors.CYAN}Validez cert:{Colors.RESET}         {self.config['cert_days']} días")
+        print(f"{Colors.CYAN}Base de datos:{Colors.RESET}        {self.config['db_type']}")
+        print(f"{Colors.CYAN}Ruta DB:{Colors.RESET}              {self.config['db_path']}")
+        print(f"{Colors.CYAN}Módulos:{Colors.RESET}              {self.config['module_preset']}")
+        print(f"{Colors.CYAN}/etc/hosts:{Colors.RESET}           {'Sí' if self.config['etc_hosts'] else 'No'}")
+        if self.config['etc_hosts']:
+            print(f"{Colors.CYAN}IP servidor:{Colors.RESET}           {self.config['hosts_ip']}")
+        print(f"{Colors.CYAN}Servicio systemd:{Colors.RESET}     {'Sí' if self.config['systemd'] else 'No'}")
+        if self.config['systemd']:
+            print(f"{Colors.CYAN}Auto-activar:{Colors.RESET}          {'Sí' if self.config['enable_svc'] else 'No'}")
+        print(f"{Colors.CYAN}Aplicar permisos:{Colors.RESET}     {'Sí' if self.config['set_perms'] else 'No'}")
+        print(f"{Colors.CYAN}Contraseña sudo:{Colors.RESET}      {'Configurada' if self.config['sudo_pass'] else 'No configurada'}")
+        print()
+    
+    def log_msg(self, text: str, tag: str = "out"):
+        """Log de mensajes con colores"""
+        if not self.verbose:
+            return
+        
+        color = Colors.RESET
+        if tag == "cmd":
+            color = Colors.BLUE
+        elif tag == "ok":
+            color = Colors.GREEN
+        elif tag == "warn":
+            color = Colors.YELLOW
+        elif tag == "err":
+            color = Colors.RED
+        elif tag == "head":
+            color = Colors.BOLD + Colors.GREEN
+        elif tag == "section":
+            color = Colors.CYAN
+        
+        print(f"{color}{text}{Colors.RESET}")
+    
+    def confirm(self, message: str) -> bool:
+        """Pide confirmación al usuario"""
+        resp = input(f"{Colors.YELLOW}{message} (S/n): {Colors.RESET}").strip().lower()
+        return resp not in ('n', 'no')
+    
+    def install_full(self):
+        """Instalación completa"""
+        print(f"\n{Colors.BOLD}{Colors.YELLOW}═══ INSTALACIÓN COMPLETA ═══{Colors.RESET}\n")
+        print("Esta operación instalará dependencias, compilará ejabberd y configurará el sistema.")
+        
+        if not self.confirm("¿Desea continuar?"):
+            print(f"{Colors.YELLOW}Operación cancelada{Colors.RESET}")
+            return
+        
+        if not self.config['sudo_pass']:
+            self.config['sudo_pass'] = getpass.getpass("Contraseña sudo: ")
+        
+        try:
+            p = self._params()
+            self.log_msg("╔══ INSTALACIÓN COMPLETA DE EJABBERD ══╗", "head")
+            Engine(on_message=self.log_msg).run("full", p, check=True)
+            self.log_msg("╚══ INSTALACIÓN COMPLETADA ══╝", "head")
+            print(f"\n{Colors.BOLD}{Colors.GREEN}✔ Instalación completada con éxito{Colors.RESET}\n")
+        except Exception as exc:
+            self.log_msg(f"✖ ERROR: {exc}", "err")
+            print(f"\n{Colors.RED}La instalación falló. Revise los mensajes anteriores.{Colors.RESET}\n")
+    
+    def config_only(self):
+        """Solo configuración"""
+        print(f"\n{Colors.BOLD}{Colors.YELLOW}═══ CONFIGURACIÓN (sin compilar) ═══{Colors.RESET}\n")
+        
+        if not self.config['sudo_pass']:
+            self.config['sudo_pass'] = getpass.getpass("Contraseña sudo: ")
+        
+        try:
+            p = self._params()
+            self.log_msg("╔══ CONFIGURACIÓN (sin compilar) ══╗", "head")
+            Engine(on_message=self.log_msg).run("config", p, check=True)
+            self.log_msg("╚══ CONFIGURACIÓN COMPLETADA ══╝", "head")
+            print(f"\n{Colors.BOLD}{Colors.GREEN}✔ Configuración aplicada{Colors.RESET}\n")
+        except Exception as exc:
+            self.log_msg(f"✖ ERROR: {exc}", "err")
+    
+    def cert_only(self):
+        """Solo certificado"""
+        print(f"\n{Colors.BOLD}{Colors.YELLOW}═══ GENERACIÓN DE CERTIFICADO TLS ═══{Colors.RESET}\n")
+        
+        if not self.config['sudo_pass']:
+            self.config['sudo_pass'] = getpass.getpass("Contraseña sudo: ")
+        
+        try:
+            p = self._params()
+            self.log_msg("╔══ GENERACIÓN DE CERTIFICADO TLS ══╗", "head")
+            Engine(on_message=self.log_msg).run("cert", p, check=True)
+            self.log_msg("╚══ CERTIFICADO GENERADO ══╝", "head")
+            print(f"\n{Colors.BOLD}{Colors.GREEN}✔ Certificado generado{Colors.RESET}\n")
+        except Exception as exc:
+            self.log_msg(f"✖ ERROR: {exc}", "err")
+    
+    def apply(self, workflow: str = "full") -> bool:
+        """Ejecuta un flujo sin ninguna pregunta (modo --apply)"""
+        titles = {
+            "full":   "INSTALACIÓN COMPLETA DE EJABBERD",
+            "config": "CONFIGURACIÓN (sin compilar)",
+            "cert":   "GENERACIÓN DE CERTIFICADO TLS",
+            "vendor": "VENDOR DE DEPENDENCIAS",
+            "prefetch": "REPOSITORIO APT LOCAL",
+            "retention": "RETENCIÓN DE MENSAJES",
+            "migrate": "MIGRACIÓN DE LA BASE DE DATOS",
+            "backup": "COPIA DE SEGURIDAD",
+            "restore": "RESTAURACIÓN",
+            "boot": "TIEMPO DE ARRANQUE",
+            "haproxy": "BALANCEADOR HAPROXY",
+            "health": "SALUD DEL NODO",
+        }
+        try:
+            p = self._params()
+            self.log_msg(f"╔══ {titles[workflow]} ══╗", "head")
+            Engine(on_message=self.log_msg).run(workflow, p, check=True)
+            self.log_msg("╚══ COMPLETADO ══╝", "head")
+            return True
+        except Exception as exc:
+            self.log_msg(f"✖ ERROR: {exc}", "err")
+            return False
+    
+    def _params(self) -> dict:
+        """Convierte config en formato de parámetros"""
+        return build_params(self.config)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Entry point
+# ══════════════════════════════════════════════════════════════════════════════
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        # con «python3 -m ejabberd_installer», argv[0] es __main__.py
+        prog="python3 -m ejabberd_installer" if sys.argv[0].endswith("__main__.py") else None,
+        description="Instalador automatizado de ejabberd para Ubuntu 24.04",
+    )
+    parser.add_argument("--cli", "--no-gui", dest="cli", action="store_true",
+                        help="forzar el modo terminal")
+    parser.add_argument("--workflow", choices=sorted(WORKFLOWS), default="full",
+                        help="flujo a ejecutar en modo no interactivo (por defecto: full)")
+
+    conf = parser.add_argument_group("configuración declarativa")
+    conf.add_argument("--config", metavar="ARCHIVO",
+                      help="archivo TOML/JSON con los parámetros (validado antes de empezar)")
+    conf.add_argument("--profile", metavar="NOMBRE",
+                      help="perfil del archivo de configuración a aplicar")
+    conf.add_argument("--check", action="store_true",
+                      help="solo validar la configuración y salir")
+    conf.add_argument("--apply", action="store_true",
+                      help="ejecutar --workflow sin ninguna pregunta")
+
+    fleet = parser.add_argument_group("aprovisionamiento de flota")
+    fleet.add_argument("--fleet", metavar="INVENTARIO",
+                       help="inventario JSON de hosts a aprovisionar en paralelo")
+    fleet.add_argument("--parallel", type=int, metavar="N",
+                       help="máximo de hosts simultáneos (por defecto: 8)")
+    fleet.add_argument("--log-dir", default="fleet-logs", metavar="DIR",
+                       help="directorio de logs por host (por defecto: fleet-logs)")
+    fleet.add_argument("--rolling", action="store_true",
+                       help="actualización escalonada: compilar una vez y actualizar los nodos "
+                            "de uno en uno, drenándolos antes")
+
+    parser.add_argument("--simulate", nargs="*", metavar="FLUJO",
+                        choices=sorted(WORKFLOWS),
+                        help="ejecuta flujos contra un sistema simulado (sin sudo ni "
+                             "compilación) y mide cada paso; por defecto full, config, cert y backup")
+    parser.add_argument("--verbose", action="store_true",
+                        help="con --simulate, muestra el log completo de cada paso")
+    parser.add_argument("--force-step", action="append", metavar="PASO",
+                        choices=("all", *JOURNAL_STEPS),
+                        help="repite PASO y los siguientes aunque el diario lo dé por hecho "
+                             f"(repetible; all, {', '.join(JOURNAL_STEPS)})")
+    parser.add_argument("--restore", nargs="+", metavar="ARCHIVO",
+                        help="restaura copias (completa y luego incrementales) y termina")
+    parser.add_argument("--log-rate", type=int, nargs="?", const=30, metavar="SEGUNDOS",
+                        help="mide los bytes de log por segundo del nodo local (por defecto: 30 s)")
+
+    bulk = parser.add_argument_group("alta masiva de usuarios")
+    bulk.add_argument("--bulk-users", metavar="ARCHIVO",
+                      help="CSV (user,password[,host]) o JSONL a registrar vía mod_http_api")
+    bulk.add_argument("--api-url", metavar="URL",
+                      help="URL base de mod_http_api (por defecto: http://127.0.0.1:5280/api, "
+                           f"o :{LOCAL_API_PORT} con proxy_protocol)")
+    bulk.add_argument("--api-auth", default="", metavar="JID:CLAVE",
+                      help="credenciales de administrador si la API las exige")
+    bulk.add_argument("--concurrency", type=int, default=16, metavar="N",
+                      help="peticiones simultáneas (por defecto: 16)")
+    bulk.add_argument("--retries", type=int, default=4, metavar="N",
+                      help="reintentos ante errores 5xx o de red (por defecto: 4)")
+    bulk.add_argument("--restart-import", action="store_true",
+                      help="ignorar el progreso guardado y empezar desde el principio")
+    return parser.parse_args(argv)
+
+
+def check_rendered(config: dict) -> int:
+    """Genera ejabberd.yml (y haproxy.cfg si hay nodos) sin tocar ningún host y los valida."""
+    p = build_params(config)
+    problems = lint_config(Engine()._render_yaml(p))
+    for msg in problems:
+        print(f"{Colors.RED}✖ ejabberd.yml: {msg}{Colors.RESET}", file=sys.stderr)
+    if not problems:
+        print(f"{Colors.GREEN}✔ ejabberd.yml generado sin problemas{Colors.RESET}")
+    if not p["haproxy_backends"]:
+        return 1 if problems else 0
+    result = check_haproxy(render_haproxy(p))
+    if result is None:
+        print(f"{Colors.YELLOW}⚠ haproxy no está instalado aquí: haproxy.cfg sin comprobar{Colors.RESET}")
+    elif result[0]:
+        print(f"{Colors.GREEN}✔ haproxy.cfg: haproxy -c lo acepta{Colors.RESET}")
+    else:
+        print(f"{Colors.RED}✖ haproxy.cfg:\n{result[1]}{Colors.RESET}", file=sys.stderr)
+    return 1 if problems or (result and not result[0]) else 0
+
+
+def run_fleet(args: argparse.Namespace) -> int:
+    """Aprovisiona todos los hosts del inventario y muestra el resumen."""
+    inventory = load_inventory(args.fleet)
+    defaults = inventory.setdefault("defaults", {})
+    if args.config:
+        defaults = inventory["defaults"] = {**load_config(args.config, args.profile), **defaults}
+    if args.force_step:
+        defaults["force_steps"] = args.force_step
+    if not defaults.get("sudo_pass"):
+        defaults["sudo_pass"] = os.environ.get("EJABBERD_SUDO_PASS", "")
+    if not defaults["sudo_pass"] and sys.stdin.isatty():
+        defaults["sudo_pass"] = getpass.getpass("Contraseña sudo (común a la flota): ")
+
+    # Validar todos los hosts antes de tocar ninguno
+    errors = []
+    for host in inventory["hosts"]:
+        name = host.get("name") or host.get("address")
+        try:
+            host["config"] = validate_config({**defaults, **host.get("config", {})})
+        except ConfigError as exc:
+            errors += [f"{name}: {e}" for e in exc.errors]
+    if errors:
+        raise ConfigError(errors)
+    if args.check:
+        print(f"{Colors.GREEN}✔ Inventario válido ({len(inventory['hosts'])} hosts){Colors.RESET}")
+        return 0
+
+    if args.rolling:
+        upgrade = RollingUpgrade(inventory, log_dir=args.log_dir)
+        print(f"{Colors.BOLD}Actualización escalonada de {len(upgrade.hosts)} hosts "
+              f"(compila {upgrade.builder}){Colors.RESET}\n")
+        results = upgrade.run()
+        FleetProvisioner.print_summary(results)
+        return 0 if all(r["ok"] for r in results) else 1
+
+    fleet = FleetProvisioner(inventory, workflow=args.workflow,
+                             parallel=args.parallel, log_dir=args.log_dir)
+    print(f"{Colors.BOLD}Aprovisionando {len(fleet.hosts)} hosts "
+          f"({fleet.parallel} en paralelo, flujo '{args.workflow}'){Colors.RESET}\n")
+    results = fleet.run()
+    fleet.print_summary(results)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+def run_bulk_users(args: argparse.Namespace, config: dict | None) -> int:
+    """Alta masiva de usuarios y resumen final."""
+    host = (config or DEFAULT_CONFIG)["domain"]
+    api_url = args.api_url or local_api_url(config or DEFAULT_CONFIG)
+    registrar = BulkRegistrar(args.bulk_users, host, api_url,
+                              concurrency=args.concurrency, retries=args.retries,
+                              auth=args.api_auth, restart=args.restart_import)
+    if registrar.done:
+        print(f"{Colors.YELLOW}Reanudando tras {registrar.done} registros ya procesados{Colors.RESET}")
+    print(f"{Colors.BOLD}Registrando usuarios de {args.bulk_users} en {api_url} "
+          f"({registrar.concurrency} en paralelo){Colors.RESET}")
+    try:
+        result = registrar.run()
+    except (OSError, ValueError) as exc:
+        print(f"{Colors.RED}✖ {exc}{Colors.RESET}", file=sys.stderr)
+        return 1
+    print(f"\n{Colors.GREEN}✔ {result['ok']} altas{Colors.RESET}, {result['exists']} ya existían, "
+          f"{Colors.RED if result['failed'] else ''}{result['failed']} fallos{Colors.RESET} "
+          f"en {result['seconds']:.1f}s")
+    if result["failed"]:
+        print(f"  Fallos detallados en {registrar.failed_path}")
+    return 1 if result["failed"] else 0
+
+
+def run_log_rate(args: argparse.Namespace, config: dict | None) -> int:
+    """Mide el volumen de log del nodo local."""
+    app = CLIInstaller(config)
+    if not app.config["sudo_pass"]:
+        app.config["sudo_pass"] = os.environ.get("EJABBERD_SUDO_PASS", "")
+    try:
+        Engine(on_message=app.log_msg)._measure_log_rate(app._params(), args.log_rate)
+    except RuntimeError as exc:
+        print(f"{Colors.RED}✖ {exc}{Colors.RESET}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_simulation(args: argparse.Namespace, config: dict | None) -> int:
+    """
+    Ejecuta flujos contra un sistema simulado, muestra el tiempo de cada paso
+    y comprueba el estado que deja cada flujo.
+    """
+    workflows = args.simulate or ["full", "config", "cert", "backup"]
+    import tempfile
+    with tempfile.TemporaryDirectory(prefix="ejabberd-sim-") as root:
+        transport = SimulatedTransport(root=root)
+        app = SimulatedInstaller(transport, verbose=args.verbose)
+        p = build_params(config or DEFAULT_CONFIG)
+        failed = False
+        for workflow in workflows:
+            print(f"\n{Colors.BOLD}{Colors.CYAN}Simulación: {workflow}{Colors.RESET}")
+            start = time.perf_counter()
+            backups = app.backups(p)
+            try:
+                timings = app.simulate(workflow, p)
+                problems = app.verify(workflow, p, backups)
+            except Exception as exc:
+                timings, problems = app.timings, [str(exc)]
+            for problem in problems:
+                print(f"  {Colors.RED}✖ {problem}{Colors.RESET}")
+            failed = failed or bool(problems)
+            for name, seconds, ncmds in timings:
+                print(f"  {name[:46]:<46} {seconds * 1000:8.1f} ms {ncmds:5d} órdenes")
+            total = time.perf_counter() - start
+            print(f"  {Colors.BOLD}{'total':<46} {total * 1000:8.1f} ms "
+                  f"{sum(t[2] for t in timings):5d} órdenes{Colors.RESET}")
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if sys.platform != "linux":
+        print("⚠ Este script está diseñado para Ubuntu/Linux.")
+    
+    Colors.strip_if_no_tty()
+
+    try:
+        if args.fleet:
+            return run_fleet(args)
+        config = load_config(args.config, args.profile) if args.config else None
+    except ConfigError as exc:
+        print(f"{Colors.RED}✖ {exc}{Colors.RESET}", file=sys.stderr)
+        return 2
+
+    if args.bulk_users:
+        return run_bulk_users(args, config)
+
+    if args.log_rate:
+        return run_log_rate(args, config)
+
+    if args.simulate is not None:
+        return run_simulation(args, config)
+
+    if args.check:
+        if not config:
+            print(f"{Colors.RED}✖ --check requiere --config{Colors.RESET}", file=sys.stderr)
+            return 2
+        print(f"{Colors.GREEN}✔ {args.config} es válido{Colors.RESET}")
+        return check_rendered(config)
+
+    if args.force_step:
+        config = {**(config or DEFAULT_CONFIG), "force_steps": args.force_step}
+
+    if args.restore:
+        config = {**(config or DEFAULT_CONFIG), "restore_from": args.restore}
+        args.apply, args.workflow = True, "restore"
+
+    if args.apply:
+        config = config or dict(DEFAULT_CONFIG)
+        if not config["sudo_pass"]:
+            config["sudo_pass"] = os.environ.get("EJABBERD_SUDO_PASS", "")
+        return 0 if CLIInstaller(config).apply(args.workflow) else 1
+    
+    if not args.cli:
+        try:
+            from .gui import EjabberdInstaller   # tkinter solo se carga aquí
+        except ImportError:
+            print(f"{Colors.YELLOW}⚠ tkinter no disponible, usando modo CLI{Colors.RESET}\n")
+        else:
+            app = EjabberdInstaller(config)
+            app.mainloop()
+            return 0
+    app = CLIInstaller(config)
+    app.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1568 @@
+"""
+Piezas del nodo independientes de los flujos: plantillas (ejabberd.yml,
+unidades, HAProxy, nginx), presets, cálculos y los scripts que se ejecutan
+en el nodo.
+"""
+
+import re
+import shutil
+import subprocess
+import textwrap
+from datetime import datetime
+from pathlib import PurePosixPath
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ejabberd.yml: comparación y validación previa a aplicar
+# ══════════════════════════════════════════════════════════════════════════════
+
+EJABBERD_PREFIX = PurePosixPath("/usr/local/ejabberd")
+CONF_PATH       = EJABBERD_PREFIX / "etc/ejabberd/ejabberd.yml"
+EJABBERDCTL     = EJABBERD_PREFIX / "sbin/ejabberdctl"
+
+# Opciones de nivel superior que 'ejabberdctl reload_config' no puede aplicar
+# en caliente: cambiarlas obliga a reiniciar el nodo.
+RESTART_OPTIONS = {
+    "default_db", "default_ram_db", "auth_method",
+    "sql_type", "sql_server", "sql_port", "sql_database", "sql_username",
+    "sql_password", "sql_pool_size", "sql_ssl", "update_sql_schema",
+    "new_sql_schema", "log_rotate_size", "log_rotate_count",
+    "log_burst_limit_count", "log_burst_limit_window_time", "cluster_backend",
+}
+
+_REQUIRED_OPTIONS = ("hosts", "listen", "modules")
+
+
+def yaml_sections(text: str) -> dict[str, str]:
+    """
+    Divide un ejabberd.yml en bloques por opción de nivel superior.
+    Ignora comentarios y líneas vacías, de modo que la cabecera con la fecha
+    de generación no cuenta como cambio.
+    """
+    sections: dict[str, list[str]] = {}
+    current = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if not line[0].isspace():
+            current = line.split(":", 1)[0].strip()
+            sections.setdefault(current, [])
+        if current is not None:
+            sections[current].append(line.rstrip())
+    return {k: "\n".join(v) for k, v in sections.items()}
+
+
+def diff_config(old: str, new: str) -> set[str]:
+    """Devuelve las opciones de nivel superior que cambian entre dos ejabberd.yml."""
+    a, b = yaml_sections(old), yaml_sections(new)
+    return {k for k in a.keys() | b.keys() if a.get(k) != b.get(k)}
+
+
+def lint_config(text: str) -> list[str]:
+    """
+    Comprobaciones estructurales de un ejabberd.yml generado, antes de
+    instalarlo: tabuladores, opciones duplicadas u obligatorias ausentes y
+    puertos de escucha repetidos.  Devuelve la lista de problemas.
+    """
+    problems = []
+    keys = []
+    for n, line in enumerate(text.splitlines(), 1):
+        if "\t" in line:
+            problems.append(f"línea {n}: YAML no admite tabuladores")
+        if line and not line[0].isspace() and not line.startswith("#"):
+            if ":" not in line:
+                problems.append(f"línea {n}: se esperaba 'opción: valor'")
+            keys.append(line.split(":", 1)[0].strip())
+    for key in sorted({k for k in keys if keys.count(k) > 1}):
+        problems.append(f"opción '{key}' duplicada")
+    for key in _REQUIRED_OPTIONS:
+        if key not in keys:
+            problems.append(f"falta la opción obligatoria '{key}'")
+
+    seen = set()
+    for block in yaml_sections(text).get("listen", "").split("\n  -")[1:]:
+        port = re.search(r"^\s*port:\s*(\S+)", block, re.M)
+        transport = re.search(r"^\s*transport:\s*(\S+)", block, re.M)
+        if not port:
+            problems.append("listener sin 'port'")
+            continue
+        bind = (port.group(1), transport.group(1) if transport else "tcp")
+        if bind in seen:
+            problems.append(f"puerto {bind[0]}/{bind[1]} declarado dos veces en 'listen'")
+        seen.add(bind)
+    return problems
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Selección de funcionalidades de compilación (./configure --enable-*)
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Funcionalidades opcionales de ./configure de ejabberd
+BUILD_FEATURES = (
+    "elixir", "lua", "mssql", "mysql", "odbc", "pam", "pgsql",
+    "redis", "sip", "sqlite", "stun", "tools", "zlib",
+)
+
+# Patrón en ejabberd.yml → funcionalidad que lo necesita
+_FEATURE_TRIGGERS = [
+    (r"^\s*module:\s*ejabberd_stun\b|^\s*mod_stun_disco:", "stun"),
+    (r"^\s*module:\s*ejabberd_sip\b|^\s*mod_sip:",         "sip"),
+    (r"^auth_method:.*\bpam\b",                            "pam"),
+    (r"^\s*\w*ram_db_type:\s*redis|^redis_server:",        "redis"),
+    (r"^\s*zlib:\s*true",                                  "zlib"),
+    (r"^\s*'?Elixir\.",                                    "elixir"),
+]
+
+APT_BASE_PACKAGES = [
+    "build-essential", "libexpat1-dev", "libyaml-dev", "libssl-dev", "automake",
+    "git", "erlang-dev", "erlang-reltool", "erlang-asn1", "erlang-public-key",
+    "erlang-ssl", "erlang-syntax-tools", "erlang-runtime-tools", "erlang-nox",
+    "erlang-observer", "erlang-inets", "erlang-debugger", "erlang-wx",
+    "erlang-os-mon", "zlib1g-dev",
+]
+
+# Paquetes de desarrollo que solo hacen falta con ciertas funcionalidades
+APT_FEATURE_PACKAGES = {
+    "elixir": ["elixir"],
+    "pam":    ["libpam0g-dev"],
+    "sqlite": ["libsqlite3-dev"],
+    "odbc":   ["unixodbc-dev", "erlang-odbc"],
+}
+
+
+def required_features(p: dict, yaml_text: str) -> set[str]:
+    """Deduce las funcionalidades necesarias del backend SQL y del ejabberd.yml."""
+    features = {p["db_type"]}
+    for rx, feature in _FEATURE_TRIGGERS:
+        if re.search(rx, yaml_text, re.M):
+            features.add(feature)
+    return features
+
+
+def build_features(p: dict, yaml_text: str) -> list[str]:
+    """Funcionalidades a compilar según la opción build_features."""
+    choice = p.get("build_features", "auto")
+    if choice == "all":
+        return list(BUILD_FEATURES)
+    if choice == "auto":
+        return sorted(required_features(p, yaml_text))
+    # lista explícita: se respeta, pero el backend elegido siempre se incluye
+    return sorted(set(choice) | {p["db_type"]})
+
+
+def configure_flags(features: list[str]) -> str:
+    """--enable-* para lo elegido y --disable-* explícito para el resto."""
+    return " ".join(
+        f"--enable-{f}" if f in features else f"--disable-{f}"
+        for f in BUILD_FEATURES
+    )
+
+
+def _opt_features(value):
+    if value in ("auto", "all"):
+        return value
+    if not isinstance(value, list):
+        raise ValueError("se esperaba 'auto', 'all' o una lista de funcionalidades")
+    unknown = [v for v in value if v not in BUILD_FEATURES]
+    if unknown:
+        raise ValueError(f"funcionalidades desconocidas: {', '.join(map(str, unknown))}; "
+                         f"opciones: {', '.join(BUILD_FEATURES)}")
+    return list(value)
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Erlang/OTP fijado: compilado con JIT en su propio prefijo
+# ══════════════════════════════════════════════════════════════════════════════
+
+OTP_ROOT = PurePosixPath("/opt/erlang")
+OTP_SOURCE_URL = "https://github.com/erlang/otp/releases/download/OTP-{v}/otp_src_{v}.tar.gz"
+# Lo que hace falta para compilar OTP (en lugar de los paquetes erlang-* del PPA)
+APT_OTP_PACKAGES = ["autoconf", "m4", "libncurses-dev", "curl"]
+# ejabberd no usa las aplicaciones gráficas ni Java
+OTP_CONFIGURE = ("--enable-jit --without-javac --without-wx --without-debugger "
+                 "--without-observer --without-et")
+
+_OTP_VERSION_RE = re.compile(r"^\d{2}(\.\d+){1,3}$")
+
+
+def otp_prefix(version: str) -> PurePosixPath:
+    return OTP_ROOT / version
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  TLS de clientes: TLS directo (XEP-0368) y perfiles de cifrado
+# ══════════════════════════════════════════════════════════════════════════════
+
+DIRECT_TLS_PORT = 5223
+
+# Solo suites ECDHE con AEAD: no hay DHE, así que no hace falta dhfile.  La
+# reanudación de sesión (caché de OpenSSL y tickets de TLS 1.3) viene activa
+# por defecto en fast_tls; por eso ningún perfil incluye 'no_ticket'.
+_ECDHE_AEAD = ":".join((
+    "ECDHE-ECDSA-AES128-GCM-SHA256", "ECDHE-RSA-AES128-GCM-SHA256",
+    "ECDHE-ECDSA-CHACHA20-POLY1305", "ECDHE-RSA-CHACHA20-POLY1305",
+    "ECDHE-ECDSA-AES256-GCM-SHA384", "ECDHE-RSA-AES256-GCM-SHA384",
+))
+_NO_LEGACY = ["no_sslv2", "no_sslv3", "no_tlsv1", "no_tlsv1_1",
+              "cipher_server_preference", "no_compression"]
+
+# perfil → (ciphers, protocol_options); None = valores por defecto de ejabberd
+TLS_PROFILES = {
+    "default":      None,
+    "intermediate": (_ECDHE_AEAD, _NO_LEGACY),                    # TLS 1.2 + 1.3
+    "modern":       (_ECDHE_AEAD, _NO_LEGACY + ["no_tlsv1_2"]),   # solo TLS 1.3
+}
+
+
+def tls_options_yaml(profile: str, prefix: str = "", indent: int = 0) -> str:
+    """Líneas ciphers/protocol_options del perfil (vacío para 'default')."""
+    spec = TLS_PROFILES[profile]
+    if spec is None:
+        return ""
+    ciphers, options = spec
+    pad = " " * indent
+    lines = [f'{pad}{prefix}ciphers: "{ciphers}"', f"{pad}{prefix}protocol_options:"]
+    lines += [f"{pad}  - {o}" for o in options]
+    return "\n".join(lines) + "\n"
+
+
+# Se ejecuta en el nodo con python3 -c: mide el tiempo hasta tener un canal
+# cifrado (TCP + negociación STARTTLS si aplica + handshake TLS), primero con
+# handshakes completos y luego reanudando la sesión del primero.
+_TLS_PROBE = r'''
+import json, socket, ssl, statistics, sys, time
+port, mode, domain, rounds, wait = int(sys.argv[1]), sys.argv[2], sys.argv[3], int(sys.argv[4]), float(sys.argv[5])
+proxy = sys.argv[6:] == ["proxy"]   # listener con use_proxy_protocol
+ctx = ssl.create_default_context()
+ctx.check_hostname = False
+ctx.verify_mode = ssl.CERT_NONE
+header = ("<?xml version='1.0'?><stream:stream to='%s' xmlns='jabber:client' "
+          "xmlns:stream='http://etherx.jabber.org/streams' version='1.0'>" % domain).encode()
+def until(sock, marker):
+    buf = b""
+    while marker not in buf:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise OSError("conexión cerrada")
+        buf += chunk
+def connect():
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.25)
+            continue
+        if proxy:
+            sock.sendall(b"PROXY TCP4 127.0.0.1 127.0.0.1 %d %d\r\n" % (sock.getsockname()[1], port))
+        return sock
+def once(session=None):
+    t0 = time.perf_counter()
+    sock = connect()
+    if mode == "starttls":
+        sock.sendall(header)
+        until(sock, b"</stream:features>")
+        sock.sendall(b"<starttls xmlns='urn:ietf:params:xml:ns:xmpp-tls'/>")
+        until(sock, b"<proceed")
+    tls = ctx.wrap_socket(sock, server_hostname=domain, session=session)
+    elapsed = (time.perf_counter() - t0) * 1000
+    tls.sendall(header)
+    tls.recv(4096)   # con TLS 1.3 el ticket de sesión llega tras el handshake
+    info = (tls.session, tls.session_reused, tls.version(), tls.cipher()[0])
+    tls.close()
+    return elapsed, info
+try:
+    first, (session, _, version, cipher) = once()
+    full = [first] + [once()[0] for _ in range(rounds - 1)]
+    resumed = [once(session) for _ in range(rounds)]
+    print(json.dumps({"full_ms": statistics.median(full),
+                      "resumed_ms": statistics.median(r[0] for r in resumed),
+                      "reused": all(r[1][1] for r in resumed),
+                      "version": version, "cipher": cipher}))
+except Exception as exc:
+    print(json.dumps({"error": str(exc)}))
+'''
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Módulos de ejabberd: presets por tipo de nodo
+# ══════════════════════════════════════════════════════════════════════════════
+
+# módulo → (opciones YAML, dependencias, KB estimados por sesión)
+# Los KB son órdenes de magnitud para comparar presets (estado por sesión y
+# tablas ETS que crecen con los usuarios conectados), no una medición.
+MODULES = {
+    "mod_adhoc":          ("", (), 0.2),
+    "mod_announce":       ("access: announce", ("mod_adhoc",), 0.1),
+    "mod_caps":           ("", (), 2),
+    "mod_carboncopy":     ("", (), 0.5),
+    "mod_client_state":   ("", (), 1),
+    "mod_configure":      ("", ("mod_adhoc",), 0.1),
+    "mod_disco":          ("", (), 0.2),
+    "mod_fail2ban":       ("", (), 0.1),
+    "mod_http_api":       ("", (), 0),
+    "mod_last":           ("", (), 0.3),
+    "mod_mam": ("""\
+        assume_mam_usage: true
+        default: always""", (), 3),
+    # las salas se crean con mam: true, por eso depende de mod_mam
+    "mod_muc": ("""\
+        access:
+          - allow
+        access_admin:
+          - allow: admin
+        access_create: muc_create
+        access_persistent: muc_create
+        access_mam:
+          - allow
+        default_room_options:
+          mam: true""", ("mod_mam",), 4),
+    "mod_muc_admin":      ("", ("mod_muc",), 0.1),
+    "mod_offline":        ("access_max_user_messages: max_user_offline_messages", (), 1),
+    "mod_ping":           ("", (), 0.3),
+    "mod_pubsub": ("""\
+        access_createnode: pubsub_createnode
+        plugins:
+          - flat
+          - pep
+        force_node_config:
+          "eu.siacs.conversations.axolotl.*":
+            access_model: open
+          "storage:bookmarks":
+            access_model: whitelist""", ("mod_caps",), 8),
+    "mod_push":           ("", (), 1),
+    "mod_push_keepalive": ("", ("mod_push", "mod_stream_mgmt"), 0.5),
+    "mod_register":       ("ip_access: trusted_network", (), 0),
+    "mod_roster":         ("versioning: true", (), 4),
+    "mod_s2s_dialback":   ("", (), 0),
+    "mod_shared_roster":  ("", ("mod_roster",), 3),
+    "mod_stream_mgmt":    ("resend_on_timeout: if_offline", (), 6),
+    "mod_stun_disco":     ("", (), 0.1),
+    "mod_vcard":          ("", (), 1),
+    "mod_vcard_xupdate":  ("", ("mod_vcard",), 0.5),
+    "mod_version":        ("show_os: false", (), 0),
+    "mod_http_upload": ("""\
+        put_url: "https://@HOST@:5443/upload"
+        custom_headers:
+          "Access-Control-Allow-Origin": "https://@HOST@"
+          "Access-Control-Allow-Methods": "GET,HEAD,PUT,OPTIONS"
+          "Access-Control-Allow-Headers": "Content-Type"
+        """, (), 0.2),
+}
+
+# Memoria aproximada de una sesión c2s sin módulos (proceso, buffers TLS)
+SESSION_BASE_KB = 40
+
+_CHAT_CORE = ("mod_disco", "mod_fail2ban", "mod_http_api", "mod_ping",
+              "mod_roster", "mod_stream_mgmt", "mod_client_state")
+
+MODULE_PRESETS = {
+    "minimal": _CHAT_CORE + ("mod_carboncopy", "mod_offline", "mod_register",
+                             "mod_s2s_dialback", "mod_vcard"),
+    "full":    tuple(MODULES),
+    "muc":     _CHAT_CORE + ("mod_carboncopy", "mod_offline", "mod_s2s_dialback",
+                             "mod_vcard", "mod_muc_admin", "mod_http_upload"),
+    "iot":     ("mod_disco", "mod_fail2ban", "mod_http_api", "mod_ping",
+                "mod_roster", "mod_stream_mgmt"),
+}
+
+# Manejadores HTTP que solo tienen sentido si su módulo está cargado
+_HTTP_HANDLERS = (
+    ("/admin", "ejabberd_web_admin"),
+    ("/api", "mod_http_api"),
+    ("/bosh", "mod_bosh"),
+    ("/captcha", "ejabberd_captcha"),
+    ("/upload", "mod_http_upload"),
+    ("/ws", "ejabberd_http_ws"),
+)
+
+
+def select_modules(preset: str, extra=()) -> list[str]:
+    """Módulos del preset más los extra, con sus dependencias, en orden estable."""
+    wanted = set()
+    pending = [*MODULE_PRESETS[preset], *extra]
+    while pending:
+        mod = pending.pop()
+        if mod not in wanted:
+            wanted.add(mod)
+            pending.extend(MODULES[mod][1])
+    return [m for m in MODULES if m in wanted]
+
+
+def session_kb(modules) -> float:
+    """Coste estimado en KB de una sesión c2s con estos módulos."""
+    return SESSION_BASE_KB + sum(MODULES[m][2] for m in modules)
+
+
+def http_handlers_yaml(modules, captcha: bool = True) -> str:
+    """Bloque request_handlers con solo los manejadores de módulos cargados."""
+    lines = ["request_handlers:"]
+    for path, handler in _HTTP_HANDLERS:
+        if handler in MODULES and handler not in modules:
+            continue
+        if path == "/captcha" and not captcha:
+            continue
+        lines.append(f"  {path}: {handler}")
+    return "\n".join(lines) + "\n"
+
+
+def _opt_modules(value):
+    if not isinstance(value, list):
+        raise ValueError("se esperaba una lista de módulos")
+    unknown = [v for v in value if v not in MODULES]
+    if unknown:
+        raise ValueError(f"módulos desconocidos: {', '.join(map(str, unknown))}")
+    return list(value)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Registro (logs): nivel, rotación, límite de ráfagas y journald
+# ══════════════════════════════════════════════════════════════════════════════
+
+LOG_DIR = EJABBERD_PREFIX / "var/log/ejabberd"
+
+LOG_LEVELS = ("none", "emergency", "alert", "critical", "error",
+              "warning", "notice", "info", "debug")
+
+# perfil → (loglevel, log_rotate_size, log_rotate_count, ráfaga: mensajes, ventana en s)
+# 'default' reproduce la configuración histórica del instalador.
+LOG_PROFILES = {
+    "default":   ("info",    10485760,  1,  None, None),
+    "standard":  ("info",    52428800,  5,  500,  1),
+    "high_load": ("warning", 104857600, 10, 200,  1),
+    "debug":     ("debug",   104857600, 10, 5000, 1),
+}
+
+
+def log_settings(config: dict) -> dict:
+    """Resuelve las opciones de log: las explícitas mandan sobre el perfil."""
+    level, size, count, burst, window = LOG_PROFILES[config.get("log_profile") or "default"]
+    return {
+        "log_level": config.get("log_level") or level,
+        "log_rotate_size": config.get("log_rotate_size") or size,
+        "log_rotate_count": config.get("log_rotate_count") or count,
+        "log_burst_limit_count": config.get("log_burst_limit_count") or burst,
+        "log_burst_limit_window_time": config.get("log_burst_limit_window_time") or window,
+    }
+
+
+def log_options_yaml(p: dict) -> str:
+    """Opciones de nivel superior de ejabberd.yml relativas al log."""
+    text = (f"loglevel: {p['log_level']}\n"
+            f"log_rotate_size: {p['log_rotate_size']}\n"
+            f"log_rotate_count: {p['log_rotate_count']}\n")
+    if p["log_burst_limit_count"]:
+        text += (f"log_burst_limit_count: {p['log_burst_limit_count']}\n"
+                 f"log_burst_limit_window_time: {p['log_burst_limit_window_time']} second\n")
+    return text
+
+
+def _log_bytes(before: dict, after: dict) -> int:
+    """
+    Bytes escritos entre dos muestras {inodo: tamaño} del directorio de logs.
+    Sigue los inodos, así una rotación (renombrado a .0) no cuenta como pérdida.
+    """
+    return sum(size - before.get(inode, 0) for inode, size in after.items()
+               if size >= before.get(inode, 0))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Backend SQL y migración de sqlite a PostgreSQL/MySQL
+# ══════════════════════════════════════════════════════════════════════════════
+
+def sql_options_yaml(p: dict) -> str:
+    """Opciones de nivel superior de ejabberd.yml para el backend SQL."""
+    import json
+    lines = ["default_db: sql", f"sql_type: {p['db_type']}"]
+    if p["db_type"] == "sqlite":
+        lines.append(f'sql_database: "{p["db_path"]}"')
+    else:
+        lines.append(f"sql_server: {json.dumps(p['sql_server'])}")
+        if p["sql_port"]:
+            lines.append(f"sql_port: {p['sql_port']}")
+        lines += [f"sql_database: {json.dumps(p['sql_database'] or p['db_path'])}",
+                  f"sql_username: {json.dumps(p['sql_username'])}",
+                  f"sql_password: {json.dumps(p['sql_password'])}"]
+    if p["sql_pool_size"]:
+        lines.append(f"sql_pool_size: {p['sql_pool_size']}")
+    if p["new_sql_schema"]:
+        lines.append("new_sql_schema: true")
+    lines.append(f"update_sql_schema: {'false' if p.get('sql_schema_ready') else 'true'}")
+    return "\n".join(lines) + "\n"
+
+
+# Se ejecuta en el nodo (sudo python3 script trabajo.json).  Copia cada tabla de
+# una instantánea del sqlite al destino por lotes, a través de un único proceso
+# psql/mysql; el punto de control de cada lote se guarda en la misma transacción
+# (tabla ejabberd_migration), así que una interrupción se reanuda sin duplicar.
+_MIGRATE_SCRIPT = r'''
+import glob, json, os, sqlite3, subprocess, sys, zlib
+
+job = json.load(open(sys.argv[1]))
+kind, batch = job["target"], job["batch"]
+env = dict(os.environ)
+if kind == "pgsql":
+    env["PGPASSWORD"] = job["password"]
+    base = ["psql", "-X", "-q", "-At", "-v", "ON_ERROR_STOP=1",
+            "-h", job["server"], "-U", job["username"], "-d", job["database"]]
+    base += ["-p", str(job["port"])] if job["port"] else []
+    sep, q = "|", '"'
+else:
+    env["MYSQL_PWD"] = job["password"]
+    base = ["mysql", "--batch", "--skip-column-names", "--default-character-set=utf8mb4",
+            "-h", job["server"], "-u", job["username"], job["database"]]
+    base += ["-P", str(job["port"])] if job["port"] else []
+    sep, q = "\t", "`"
+
+def fail(msg):
+    print("✖ " + msg, flush=True)
+    sys.exit(2)
+
+def query(sql=None, script=None):
+    if script and kind == "mysql":
+        args, stdin = base, open(script)
+    elif script:
+        args, stdin = base + ["-f", script], None
+    else:
+        args, stdin = base + ["-c" if kind == "pgsql" else "-e", sql], None
+    r = subprocess.run(args, stdin=stdin, env=env, capture_output=True, text=True)
+    if r.returncode:
+        fail(r.stderr.strip() or "error en " + base[0])
+    return [line.split(sep) for line in r.stdout.splitlines() if line]
+
+def target_columns():
+    if kind == "pgsql":
+        rows = query("select table_name, column_name, coalesce(column_default, '') like 'nextval%' "
+                     "from information_schema.columns where table_schema = current_schema()")
+    else:
+        rows = query("select table_name, column_name, 0 from information_schema.columns "
+                     "where table_schema = database()")
+    cols, serial = {}, []
+    for table, column, seq in rows:
+        cols.setdefault(table, set()).add(column)
+        if seq == "t":
+            serial.append((table, column))
+    return cols, serial
+
+MY_ESC = {0: "\\0", 10: "\\n", 13: "\\r", 26: "\\Z", 34: '\\"', 39: "\\'", 92: "\\\\"}
+
+def pg_value(v):
+    if v is None:
+        return ""
+    if isinstance(v, bytes):
+        return '"\\x' + v.hex() + '"'
+    if isinstance(v, (int, float)):
+        return str(v)
+    return '"' + str(v).replace('"', '""') + '"'
+
+def my_value(v):
+    if v is None:
+        return "NULL"
+    if isinstance(v, bytes):
+        return "X'" + v.hex() + "'"
+    if isinstance(v, (int, float)):
+        return str(v)
+    return "'" + str(v).translate(MY_ESC) + "'"
+
+class Sink:
+    """Proceso psql/mysql persistente: un lote + punto de control por transacción."""
+    def __init__(self):
+        self.proc = subprocess.Popen(base, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, env=env, text=True, encoding="utf-8")
+        if kind == "mysql":
+            self.send("SET FOREIGN_KEY_CHECKS = 0;\n")
+
+    def send(self, text):
+        marker = "\\echo __ok__\n" if kind == "pgsql" else "select '__ok__';\n"
+        try:
+            self.proc.stdin.write(text + marker)
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline()
+        except BrokenPipeError:
+            line = ""
+        if line.strip() != "__ok__":
+            fail((line + self.proc.stderr.read()).strip() or base[0] + " terminó inesperadamente")
+
+    def batch(self, table, cols, rows, last):
+        names = ", ".join(q + c + q for c in cols)
+        if kind == "pgsql":
+            data = "".join(",".join(pg_value(v) for v in row) + "\n" for row in rows)
+            text = (f'BEGIN;\nCOPY "{table}" ({names}) FROM STDIN WITH (FORMAT csv);\n{data}\\.\n'
+                    f"INSERT INTO ejabberd_migration VALUES ('{table}', {last}) "
+                    f"ON CONFLICT (tbl) DO UPDATE SET last_rowid = EXCLUDED.last_rowid;\nCOMMIT;\n")
+        else:
+            values = ",".join("(" + ",".join(my_value(v) for v in row) + ")" for row in rows)
+            text = (f"START TRANSACTION;\nINSERT INTO `{table}` ({names}) VALUES {values};\n"
+                    f"INSERT INTO ejabberd_migration VALUES ('{table}', {last}) "
+                    f"ON DUPLICATE KEY UPDATE last_rowid = VALUES(last_rowid);\nCOMMIT;\n")
+        self.send(text)
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+# ── esquema del destino ──
+source = job["source"]
+src_cols = lambda db, t: [r[1] for r in db.execute(f'pragma table_info("{t}")')]
+probe = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+new_schema = "server_host" in src_cols(probe, "users")
+probe.close()
+cols, serial = target_columns()
+if "users" not in cols:
+    name = ("pg" if kind == "pgsql" else "mysql") + (".new.sql" if new_schema else ".sql")
+    found = sorted(glob.glob(f"{job['prefix']}/lib/ejabberd-*/priv/sql/{name}"))
+    if not found:
+        fail(f"no se encontró {name} en {job['prefix']}/lib para crear el esquema")
+    print(f"Creando el esquema con {found[-1]}", flush=True)
+    query(script=found[-1])
+    cols, serial = target_columns()
+
+fresh_db = "ejabberd_migration" not in cols
+if fresh_db and query("select count(*) from users")[0][0] != "0":
+    fail("la base de datos destino ya tiene usuarios y no procede de una migración anterior")
+text_type = "text" if kind == "pgsql" else "varchar(191)"
+query(f"create table if not exists ejabberd_migration (tbl {text_type} primary key, last_rowid bigint not null)")
+
+# ── instantánea coherente del origen (reutilizada al reanudar) ──
+st = os.stat(source)
+fingerprint = zlib.crc32(f"{st.st_size}:{st.st_mtime_ns}".encode())
+marks = {t: int(r) for t, r in query("select tbl, last_rowid from ejabberd_migration")}
+snapshot = job["snapshot"]
+if marks.get("__source__") != fingerprint or not os.path.exists(snapshot):
+    os.makedirs(os.path.dirname(snapshot), mode=0o700, exist_ok=True)
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(snapshot)
+    src.backup(dst)
+    src.close()
+    dst.close()
+    marks = {}
+    resumed = False
+else:
+    resumed = True
+snap = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+tables = [r[0] for r in snap.execute(
+    "select name from sqlite_master where type = 'table' and name not like 'sqlite_%' order by name")]
+copy = [t for t in tables if t in cols and t != "ejabberd_migration"]
+copy.sort(key=lambda t: t != "pubsub_node")     # tabla padre de las claves foráneas de pubsub
+skipped = [t for t in tables if t not in cols]
+if not resumed:
+    if kind == "pgsql":
+        query("TRUNCATE " + ", ".join(f'"{t}"' for t in copy) + " RESTART IDENTITY CASCADE")
+    else:
+        query("SET FOREIGN_KEY_CHECKS = 0; " + " ".join(f"TRUNCATE TABLE `{t}`;" for t in copy))
+    query("delete from ejabberd_migration")
+    query(f"insert into ejabberd_migration values ('__source__', {fingerprint})")
+else:
+    print("Reanudando la migración anterior", flush=True)
+
+# ── copia por lotes ──
+sink = Sink()
+for table in copy:
+    names = [c for c in src_cols(snap, table) if c in cols[table]]
+    total = snap.execute(f'select count(*) from "{table}"').fetchone()[0]
+    last = marks.get(table, 0)
+    done = snap.execute(f'select count(*) from "{table}" where rowid <= ?', (last,)).fetchone()[0]
+    step = max(total // 10, 1)
+    quoted = ", ".join(f'"{c}"' for c in names)
+    cur = snap.execute(f'select rowid, {quoted} from "{table}" where rowid > ? order by rowid', (last,))
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            break
+        sink.batch(table, names, [r[1:] for r in rows], rows[-1][0])
+        before, done = done, done + len(rows)
+        if done // step != before // step or done == total:
+            print(f"  {table}: {done}/{total}", flush=True)
+    if total == 0:
+        print(f"  {table}: 0/0", flush=True)
+sink.close()
+
+# ── secuencias y verificación ──
+for table, column in serial:
+    if table in copy:
+        query(f"select setval(pg_get_serial_sequence('{table}', '{column}'), "
+              f"coalesce(max(\"{column}\"), 0) + 1, false) from \"{table}\"")
+counts = {t: [snap.execute(f'select count(*) from "{t}"').fetchone()[0],
+              int(query(f"select count(*) from {q}{t}{q}")[0][0])] for t in copy}
+bad = {t: c for t, c in counts.items() if c[0] != c[1]}
+for t, (a, b) in bad.items():
+    print(f"✖ {t}: {a} filas en sqlite, {b} en {kind}", flush=True)
+print(json.dumps({"ok": not bad, "tables": counts, "skipped": skipped, "new_schema": new_schema}))
+sys.exit(3 if bad else 0)
+'''
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Comprobación previa: hardware del nodo → backend, límites y sesiones
+# ══════════════════════════════════════════════════════════════════════════════
+
+GIB = 1024 ** 3
+
+# Se ejecuta en el nodo con sudo python3 -c.  Mide en el directorio de datos
+# (o en su antepasado existente más cercano, que estará en el mismo sistema de
+# archivos) la latencia de write+fsync de 4 KiB —lo que cuesta cada commit del
+# sqlite— y el caudal secuencial con fsync final.
+_PREFLIGHT_PROBE = r'''
+import json, os, shutil, statistics, sys, time
+path, rounds, mib = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+while not os.path.isdir(path):
+    path = os.path.dirname(path) or "/"
+mem = {}
+for line in open("/proc/meminfo"):
+    key, value = line.split(":", 1)
+    mem[key] = int(value.split()[0])
+probe = os.path.join(path, ".ejabberd-preflight")
+lat = []
+fd = os.open(probe, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+try:
+    block = os.urandom(4096)
+    for _ in range(rounds):
+        t = time.perf_counter()
+        os.write(fd, block)
+        os.fsync(fd)
+        lat.append((time.perf_counter() - t) * 1000)
+    os.lseek(fd, 0, 0)
+    chunk = os.urandom(1 << 20)
+    t = time.perf_counter()
+    for _ in range(mib):
+        os.write(fd, chunk)
+    os.fsync(fd)
+    write = mib / (time.perf_counter() - t)
+finally:
+    os.close(fd)
+    os.unlink(probe)
+lat.sort()
+print(json.dumps({
+    "dir": path, "cpus": os.cpu_count(), "mem_total": mem["MemTotal"] * 1024,
+    "mem_available": mem.get("MemAvailable", 0) * 1024,
+    "disk_free": shutil.disk_usage(path).free,
+    "nr_open": int(open("/proc/sys/fs/nr_open").read()),
+    "fsync_ms": statistics.median(lat), "fsync_p99_ms": lat[int(len(lat) * 0.99) - 1],
+    "write_mb_s": write,
+}))
+'''
+
+PREFLIGHT_MIN_MEM     = 1 * GIB          # compilar OTP/ejabberd por debajo de esto falla
+PREFLIGHT_MIN_DISK    = {True: 3 * GIB, False: GIB // 2}   # con/sin compilación
+PREFLIGHT_MIN_SESSIONS = 100
+PREFLIGHT_RESERVED    = 768 * 1024 ** 2  # sistema + BEAM + Mnesia antes de la primera sesión
+
+
+def session_limits(max_sessions: int) -> tuple[int, int]:
+    """(descriptores de archivo, procesos Erlang) para max_sessions sesiones."""
+    return max_sessions + 8192, max(262144, max_sessions * 4)
+
+
+def preflight_plan(facts: dict, p: dict, build: bool) -> dict:
+    """
+    Convierte las medidas del nodo en {"fatal": [...], "advice": [...],
+    "params": {...}}.  params solo rellena lo que la configuración deja en
+    automático (0); backend y preset quedan como recomendación, porque
+    cambiarlos exige un servidor SQL o renunciar a funcionalidades.
+    """
+    fatal, advice, params = [], [], {}
+    mem, cpus = facts["mem_total"], facts["cpus"] or 1
+    if mem < PREFLIGHT_MIN_MEM:
+        fatal.append(f"RAM {_fmt_bytes(mem)} < {_fmt_bytes(PREFLIGHT_MIN_MEM)}")
+    if facts["disk_free"] < PREFLIGHT_MIN_DISK[build]:
+        fatal.append(f"espacio libre en {facts['dir']} {_fmt_bytes(facts['disk_free'])} "
+                     f"< {_fmt_bytes(PREFLIGHT_MIN_DISK[build])}")
+
+    kb = session_kb(p["modules"])
+    by_mem = max(0, mem - PREFLIGHT_RESERVED) // 1024 / kb
+    by_fd = facts["nr_open"] - 8192
+    sessions = int(min(by_mem, by_fd))
+    sessions -= sessions % (1000 if sessions >= 10000 else 100)
+    if sessions < PREFLIGHT_MIN_SESSIONS:
+        fatal.append(f"capacidad estimada de {sessions} sesiones (< {PREFLIGHT_MIN_SESSIONS})")
+    if not p["max_sessions"]:
+        params["max_sessions"] = max(sessions, PREFLIGHT_MIN_SESSIONS)
+
+    if p["db_type"] == "sqlite":
+        if facts["fsync_ms"] > 10:
+            advice.append(f"fsync de {facts['fsync_ms']:.1f} ms: cada mensaje guardado espera al "
+                          f"disco; con sqlite (un único escritor) se nota. Recomendado: pgsql")
+        elif sessions >= 20000 and cpus >= 4:
+            advice.append(f"{cpus} CPU y capacidad para ~{sessions:,} sesiones: sqlite "
+                          f"serializa las escrituras. Recomendado: pgsql")
+    elif not p["sql_pool_size"]:
+        params["sql_pool_size"] = min(max(cpus * 2, 5), 50)
+    if p["module_preset"] == "full" and mem < 2 * GIB:
+        advice.append(f"RAM {_fmt_bytes(mem)}: el preset 'minimal' reduce la memoria por sesión")
+    if facts["fsync_p99_ms"] > 100:
+        advice.append(f"fsync p99 de {facts['fsync_p99_ms']:.0f} ms: almacenamiento con picos de "
+                      f"latencia (¿disco compartido o de red?)")
+    return {"fatal": fatal, "advice": advice, "params": params}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Arranque de ejabberd: medición por fases y arranque rápido
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Con fast_start, marca (con la versión instalada) que un arranque con
+# update_sql_schema: true terminó bien: el esquema está al día y los siguientes
+# arranques pueden saltarse su comprobación.  Una compilación nueva la borra.
+FAST_START_MARKER = PurePosixPath("/var/lib/ejabberd-installer/sql-schema-ready")
+
+# Se ejecuta en el nodo con sudo python3 -c: para ejabberd, lo arranca y mide
+# hasta que el puerto c2s acepta conexiones; devuelve el log de ese arranque.
+_BOOT_PROBE = r'''
+import json, os, socket, subprocess, sys, time
+port, log, timeout = int(sys.argv[1]), sys.argv[2], float(sys.argv[3])
+subprocess.run(["systemctl", "stop", "ejabberd"])
+offset = os.path.getsize(log) if os.path.exists(log) else 0
+t0 = time.time()
+subprocess.run(["systemctl", "start", "--no-block", "ejabberd"], check=True)
+ready = None
+while time.time() - t0 < timeout:
+    try:
+        socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+        ready = time.time() - t0
+        break
+    except OSError:
+        time.sleep(0.01)
+deadline, text = time.time() + 5, ""
+while ready is not None:
+    try:
+        if os.path.getsize(log) < offset:
+            offset = 0  # rotado durante el arranque
+        with open(log, errors="replace") as fh:
+            fh.seek(offset)
+            text = fh.read(1 << 20)
+    except OSError:
+        pass
+    if "is started in the node" in text or time.time() > deadline:
+        break
+    time.sleep(0.1)
+print(json.dumps({"t0": t0, "ready": ready, "log": text}))
+'''
+
+# (regex, fase): cada fase empieza con la primera línea de log que la menciona
+BOOT_MARKERS = [
+    (r"Loading configuration from", "configuración"),
+    (r"(?i)mnesia", "Mnesia"),
+    (r"(?i)sql.{0,40}schema|schema.{0,40}sql|creating table|updating table", "esquema SQL"),
+    (r"Loading modules for", "módulos"),
+    (r"Start accepting", "listeners"),
+]
+
+_LOG_TS_RE = re.compile(r"^(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d(?:\.\d+)?(?:[+-]\d\d:?\d\d|Z)?)")
+
+
+def boot_phases(t0: float, ready: float, log_text: str) -> list[tuple[str, float]]:
+    """
+    Reparte el arranque en fases: de t0 a la primera marca (arranque de la BEAM
+    y carga de código) y luego entre las marcas de BOOT_MARKERS hasta ready.
+    """
+    marks = {}
+    for line in log_text.splitlines():
+        m = _LOG_TS_RE.match(line)
+        if not m:
+            continue
+        try:
+            ts = datetime.fromisoformat(m.group(1).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            continue
+        for rx, label in BOOT_MARKERS:
+            if label not in marks and re.search(rx, line):
+                marks[label] = ts
+    edges = [("BEAM y carga de código", t0)] + sorted(marks.items(), key=lambda kv: kv[1])
+    edges.append(("", t0 + ready))
+    return [(label, max(0.0, edges[i + 1][1] - start)) for i, (label, start) in enumerate(edges[:-1])]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Balanceo con HAProxy (PROXY protocol)
+# ══════════════════════════════════════════════════════════════════════════════
+
+HAPROXY_CFG = PurePosixPath("/etc/haproxy/haproxy.cfg")
+HAPROXY_SOCKET = "/run/haproxy/admin.sock"
+
+# Con proxy_protocol los listeners públicos exigen la cabecera PROXY; los
+# clientes locales del instalador (exportador, altas masivas) usan este
+# listener solo de loopback para mod_http_api.
+LOCAL_API_PORT = 5281
+
+
+def local_api_url(p: dict) -> str:
+    """URL de mod_http_api para los clientes que corren en el propio nodo."""
+    port = LOCAL_API_PORT if p["proxy_protocol"] else 5280
+    return f"http://127.0.0.1:{port}/api"
+
+
+def haproxy_sections(p: dict) -> list[tuple[str, int]]:
+    """Secciones listen de haproxy.cfg: (nombre, puerto)."""
+    ports = [("xmpp_c2s", 5222)]
+    if p["direct_tls"]:
+        ports.append(("xmpp_c2s_tls", DIRECT_TLS_PORT))
+    return ports + [("xmpp_https", 5443), ("xmpp_http", 5280)]
+
+
+def render_haproxy(p: dict) -> str:
+    """
+    haproxy.cfg para repartir c2s, TLS directo, BOSH y WebSocket entre los
+    nodos de haproxy_backends: modo TCP (el TLS lo termina ejabberd),
+    leastconn para conexiones de larga duración, comprobaciones de salud y
+    PROXY protocol v2 hacia los nodos (también en las comprobaciones).
+    """
+    stream = ("<?xml version='1.0'?><stream:stream to='%s' xmlns='jabber:client' "
+              "xmlns:stream='http://etherx.jabber.org/streams' version='1.0'>" % p["domain"])
+    checks = {
+        5222: [f'tcp-check send "{stream}"', "tcp-check expect string <stream:stream"],
+        5280: ["option httpchk", "http-check send meth GET uri / ver HTTP/1.1 hdr Host "
+               + p["domain"], "http-check expect rstatus ^[234]"],
+    }
+
+    out = textwrap.dedent(f"""\
+        # haproxy.cfg — generado por Ejabberd Installer
+        global
+            log /dev/log local0
+            maxconn {max(p['max_sessions'], 50000) * 2}
+            user haproxy
+            group haproxy
+            daemon
+            stats socket {HAPROXY_SOCKET} mode 660 level admin
+
+        defaults
+            log global
+            mode tcp
+            option tcplog
+            option dontlognull
+            balance leastconn
+            timeout connect 5s
+            timeout client 1h
+            timeout server 1h
+            timeout tunnel 1h
+            timeout check 5s
+            default-server inter 5s fall 3 rise 2 send-proxy-v2 check-send-proxy
+    """)
+    for name, port in haproxy_sections(p):
+        out += f"\nlisten {name}\n    bind :::{port} v4v6\n"
+        if port == 5222:
+            out += "    option tcp-check\n"
+        for line in checks.get(port, []):
+            out += f"    {line}\n"
+        for host in p["haproxy_backends"]:
+            out += f"    server {host} {host}:{port} check\n"
+    return out
+
+
+def check_haproxy(text: str) -> tuple[bool, str] | None:
+    """Valida un haproxy.cfg con 'haproxy -c' local; None si haproxy no está instalado."""
+    import tempfile
+    if not shutil.which("haproxy"):
+        return None
+    with tempfile.NamedTemporaryFile("w", suffix=".cfg") as fh:
+        fh.write(text)
+        fh.flush()
+        res = subprocess.run(["haproxy", "-c", "-f", fh.name],
+                             capture_output=True, text=True)
+    return res.returncode == 0, (res.stdout + res.stderr).strip()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Exportador de métricas (formato de texto de Prometheus)
+# ══════════════════════════════════════════════════════════════════════════════
+
+EXPORTER_PATH = EJABBERD_PREFIX / "sbin/ejabberd-exporter"
+
+# Servicio independiente en el nodo (solo stdlib).  Un hilo consulta
+# mod_http_api cada --interval segundos sobre una única conexión keep-alive y
+# deja el texto listo; /metrics devuelve la última lectura sin tocar ejabberd,
+# así que la frecuencia de scrape no añade carga al servidor.
+_EXPORTER_SCRIPT = r'''#!/usr/bin/env python3
+# Exportador de métricas de ejabberd — generado por Ejabberd Installer
+import argparse, http.client, http.server, json, os, threading, time
+from urllib.parse import urlsplit
+
+# (métrica, tipo, ayuda, comando de la API, argumentos)
+API_METRICS = [
+    ("ejabberd_connected_users", "gauge", "Sesiones c2s conectadas", "connected_users_number", {}),
+    ("ejabberd_registered_users", "gauge", "Usuarios registrados", "stats", {"name": "registeredusers"}),
+    ("ejabberd_s2s_incoming", "gauge", "Conexiones s2s entrantes", "incoming_s2s_number", {}),
+    ("ejabberd_s2s_outgoing", "gauge", "Conexiones s2s salientes", "outgoing_s2s_number", {}),
+    ("ejabberd_uptime_seconds", "gauge", "Segundos desde el arranque", "stats", {"name": "uptimeseconds"}),
+    ("ejabberd_beam_processes", "gauge", "Procesos Erlang", "stats", {"name": "processes"}),
+]
+
+
+class Api:
+    def __init__(self, url, timeout):
+        u = urlsplit(url)
+        self.netloc, self.path, self.timeout = u.netloc, u.path.rstrip("/") or "/api", timeout
+        self.conn, self.connections = None, 0
+
+    def call(self, command, args):
+        body = json.dumps(args).encode()  # bytes: cabeceras y cuerpo en un solo envío
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+                self.connections += 1
+            try:
+                self.conn.request("POST", f"{self.path}/{command}", body,
+                                  {"Content-Type": "application/json"})
+                resp = self.conn.getresponse()
+                data = resp.read()
+                if resp.status != 200:
+                    raise ValueError(f"{command}: HTTP {resp.status}")
+                return number(json.loads(data))
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+
+def number(data):
+    # según la versión de la API el entero llega solo o dentro de un objeto
+    if isinstance(data, dict):
+        data = next(iter(data.values()), None)
+    return float(data)
+
+
+def beam_rss():
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/status") as fh:
+                status = fh.read()
+        except OSError:
+            continue
+        if status.startswith("Name:\tbeam"):
+            return sum(float(line.split()[1]) * 1024 for line in status.splitlines()
+                       if line.startswith("VmRSS:"))
+    return None
+
+
+def db_bytes(path):
+    total = None
+    for f in (path, path + "-wal"):
+        try:
+            total = (total or 0) + os.stat(f).st_size
+        except OSError:
+            pass
+    return total
+
+
+class Poller(threading.Thread):
+    def __init__(self, args):
+        super().__init__(daemon=True)
+        self.args, self.api = args, Api(args.api, args.timeout)
+        self.text, self.errors = "", 0
+
+    def poll(self):
+        start = time.monotonic()
+        samples, up = [], 1
+        for name, kind, help_, command, cargs in API_METRICS:
+            try:
+                samples.append((name, kind, help_, self.api.call(command, cargs)))
+            except Exception:
+                self.errors += 1
+                up = 0
+        samples.append(("ejabberd_up", "gauge", "1 si la API respondió a todas las consultas", up))
+        rss = beam_rss()
+        if rss is not None:
+            samples.append(("ejabberd_beam_memory_bytes", "gauge", "Memoria residente de la BEAM", rss))
+        if self.args.db:
+            size = db_bytes(self.args.db)
+            if size is not None:
+                samples.append(("ejabberd_db_bytes", "gauge", "Tamaño de la base de datos sqlite (con WAL)", size))
+        samples += [
+            ("ejabberd_exporter_poll_seconds", "gauge", "Duración de la última consulta", time.monotonic() - start),
+            ("ejabberd_exporter_errors_total", "counter", "Consultas a la API fallidas", self.errors),
+            ("ejabberd_exporter_api_connections_total", "counter", "Conexiones HTTP abiertas hacia la API",
+             self.api.connections),
+        ]
+        self.text = "".join(f"# HELP {n} {h}\n# TYPE {n} {k}\n{n} {v:.15g}\n" for n, k, h, v in samples)
+
+    def run(self):
+        while True:
+            self.poll()
+            time.sleep(self.args.interval)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--api", default="http://127.0.0.1:5280/api")
+    ap.add_argument("--listen", default="127.0.0.1:9280")
+    ap.add_argument("--interval", type=float, default=15)
+    ap.add_argument("--timeout", type=float, default=5)
+    ap.add_argument("--db", default="")
+    args = ap.parse_args()
+    poller = Poller(args)
+    poller.poll()
+    poller.start()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = poller.text.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    host, port = args.listen.rsplit(":", 1)
+    http.server.ThreadingHTTPServer((host, int(port)), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Copias de seguridad: rutas y compresores
+# ══════════════════════════════════════════════════════════════════════════════
+
+SPOOL_DIR  = EJABBERD_PREFIX / "var/lib/ejabberd"     # Mnesia (y el sqlite por defecto)
+UPLOAD_DIR = PurePosixPath("/var/lib/ejabberd/upload")  # docroot por defecto: @HOME@/upload
+
+# compresor → (comando de compresión, extensión).  Se usa el primero disponible
+# en el nodo; zstd y pigz comprimen con todos los núcleos.
+BACKUP_COMPRESSORS = {
+    "zstd": ("zstd -T0 -3 -q", ".tar.zst"),
+    "pigz": ("pigz -c", ".tar.gz"),
+    "gzip": ("gzip -c", ".tar.gz"),
+}
+
+
+def _decompressor(archive: str) -> str:
+    return "zstd -dc -q" if archive.endswith(".zst") else "gzip -dc"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Descargas de mod_http_upload servidas por nginx
+# ══════════════════════════════════════════════════════════════════════════════
+
+NGINX_SITE = PurePosixPath("/etc/nginx/sites-available/ejabberd-upload")
+NGINX_SITE_ENABLED = PurePosixPath("/etc/nginx/sites-enabled/ejabberd-upload")
+
+
+def upload_offloaded(p: dict) -> bool:
+    return p["upload_offload"] and "mod_http_upload" in p["modules"]
+
+
+def upload_get_url(p: dict) -> str:
+    port = "" if p["upload_port"] == 443 else f":{p['upload_port']}"
+    return f"https://@HOST@{port}/upload"
+
+
+def upload_module_yaml(p: dict) -> str:
+    """
+    Opciones añadidas a mod_http_upload con upload_offload: las subidas (PUT)
+    siguen llegando a ejabberd, las descargas (GET) van a nginx, que lee el
+    mismo docroot (www-data entra por el grupo ejabberd).
+    """
+    return textwrap.dedent(f"""\
+        docroot: "{UPLOAD_DIR}"
+        get_url: "{upload_get_url(p)}"
+        max_size: {p['upload_max_size_mb'] * 1048576}
+        file_mode: "0640"
+        dir_mode: "2750"
+    """)
+
+
+def upload_quota_yaml(p: dict) -> str:
+    """Reglas de shaper_rules para mod_http_upload_quota (MiB por usuario)."""
+    if not upload_offloaded(p):
+        return ""
+    hard = p["upload_quota_mb"]
+    return (f"  soft_upload_quota:\n    {hard * 4 // 5}: all\n"
+            f"  hard_upload_quota:\n    {hard}: all\n")
+
+
+def render_nginx_upload(p: dict) -> str:
+    """Sitio nginx que sirve las descargas de mod_http_upload desde el docroot."""
+    pem = EJABBERD_PREFIX / "etc/ejabberd/server.pem"
+    return textwrap.dedent(f"""\
+        # ejabberd-upload — generado por Ejabberd Installer
+        server {{
+            listen {p['upload_port']} ssl http2;
+            listen [::]:{p['upload_port']} ssl http2;
+            server_name _;
+
+            ssl_certificate     {pem};
+            ssl_certificate_key {pem};
+
+            sendfile on;
+            sendfile_max_chunk 1m;
+            tcp_nopush on;
+            open_file_cache max=10000 inactive=60s;
+
+            location /upload/ {{
+                alias {UPLOAD_DIR}/;
+                limit_except GET {{ deny all; }}
+                autoindex off;
+                # Cada archivo tiene una URL única: no cambia nunca
+                add_header Cache-Control "public, max-age=31536000, immutable" always;
+                add_header Access-Control-Allow-Origin "*" always;
+                add_header X-Content-Type-Options nosniff always;
+                add_header Content-Security-Policy "default-src 'none'" always;
+            }}
+
+            location / {{
+                return 404;
+            }}
+        }}
+    """)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  STUN/TURN (ejabberd_stun)
+# ══════════════════════════════════════════════════════════════════════════════
+
+TURN_PORT = 3478
+TURN_TLS_PORT = 5349
+TURN_SECRET_PATH = PurePosixPath("/var/lib/ejabberd-installer/turn-secret")
+
+
+def turn_port_range(calls: int) -> tuple[int, int]:
+    """
+    Puertos de relay para calls llamadas simultáneas: hasta dos asignaciones
+    por llamada (un extremo cada una) y dos flujos por asignación si el
+    cliente no agrupa audio y vídeo.  Se toman de la zona efímera (49152+).
+    """
+    count = max(200, calls * 4)
+    lo = max(1024, min(49152, 65536 - count))
+    return lo, min(65535, lo + count - 1)
+
+
+def turn_listen_yaml(p: dict) -> str:
+    """Listeners ejabberd_stun: UDP 3478 y TLS 5349, con TURN y rango de relay."""
+    lo, hi = turn_port_range(p["turn_max_calls"])
+    turn = textwrap.dedent(f"""\
+        ip: "::"
+        module: ejabberd_stun
+        use_turn: true
+        turn_ipv4_address: "{p['turn_ipv4_address']}"
+        turn_min_port: {lo}
+        turn_max_port: {hi}
+    """)
+    return (f"  -\n    port: {TURN_PORT}\n    transport: udp\n" + textwrap.indent(turn, "    ")
+            + f"  -\n    port: {TURN_TLS_PORT}\n    transport: tcp\n" + textwrap.indent(turn, "    ")
+            + "    tls: true\n")
+
+
+# Se ejecuta en el nodo con python3 -c: Binding STUN y luego Allocate TURN con
+# credenciales temporales (las de mod_stun_disco: usuario "caducidad:nombre",
+# clave base64(HMAC-SHA1(secret, usuario))); libera la asignación al terminar.
+_TURN_PROBE = r'''
+import base64, hashlib, hmac, json, os, socket, struct, sys, time
+host, port, secret = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+COOKIE = 0x2112A442
+sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+sock.settimeout(2)
+def attr(t, v):
+    return struct.pack("!HH", t, len(v)) + v + b"\0" * (-len(v) % 4)
+def request(method, attrs, key=None):
+    tid = os.urandom(12)
+    body = b"".join(attr(t, v) for t, v in attrs)
+    if key:
+        head = struct.pack("!HHI", method, len(body) + 24, COOKIE) + tid
+        body += attr(0x0008, hmac.new(key, head + body, hashlib.sha1).digest())
+    msg = struct.pack("!HHI", method, len(body), COOKIE) + tid + body
+    for _ in range(5):
+        sock.sendto(msg, (host, port))
+        try:
+            data = sock.recv(2048)
+        except OSError:
+            time.sleep(1)
+            continue
+        if data[8:20] == tid:
+            break
+    else:
+        raise OSError("sin respuesta en %s:%d/udp" % (host, port))
+    found, pos = {}, 20
+    while pos + 4 <= len(data):
+        t, n = struct.unpack("!HH", data[pos:pos + 4])
+        found[t] = data[pos + 4:pos + 4 + n]
+        pos += 4 + n + (-n % 4)
+    return struct.unpack("!H", data[:2])[0], found
+def xaddr(v):
+    port = struct.unpack("!H", v[2:4])[0] ^ (COOKIE >> 16)
+    ip = struct.unpack("!I", v[4:8])[0] ^ COOKIE
+    return "%s:%d" % (socket.inet_ntoa(struct.pack("!I", ip)), port)
+result = {}
+try:
+    kind, found = request(0x0001, [])
+    result["mapped"] = xaddr(found[0x0020]) if kind == 0x0101 and 0x0020 in found else None
+    udp = [(0x0019, struct.pack("!B3x", 17))]
+    kind, found = request(0x0003, udp)
+    if kind != 0x0113 or 0x0014 not in found:
+        raise OSError("el listener no ofrece TURN (responde sin pedir credenciales)")
+    user = ("%d:ejabberd-installer" % (time.time() + 600)).encode()
+    password = base64.b64encode(hmac.new(secret.encode(), user, hashlib.sha1).digest())
+    key = hashlib.md5(user + b":" + found[0x0014] + b":" + password).digest()
+    auth = [(0x0006, user), (0x0014, found[0x0014]), (0x0015, found[0x0015])]
+    kind, found = request(0x0003, udp + auth, key)
+    if kind != 0x0103 or 0x0016 not in found:
+        code = found.get(0x0009, b"\0\0\0\0")
+        raise OSError("Allocate rechazado (error %d%02d)" % (code[2] & 7, code[3]))
+    result["relay"] = xaddr(found[0x0016])
+    request(0x0004, [(0x000D, struct.pack("!I", 0))] + auth, key)
+except (OSError, KeyError) as exc:
+    result["error"] = str(exc)
+print(json.dumps(result))
+'''
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Agente de salud: watchdog de systemd
+# ══════════════════════════════════════════════════════════════════════════════
+
+HEALTH_AGENT_PATH = EJABBERD_PREFIX / "sbin/ejabberd-health"
+HEALTH_STATE = SPOOL_DIR / "health.json"
+
+
+def health_watchdog_sec(p: dict) -> int:
+    """WatchdogSec: tres latidos perdidos seguidos."""
+    return p["health_interval"] * 3
+
+
+def health_erl_call(p: dict) -> PurePosixPath:
+    """Patrón de erl_call del OTP con que corre ejabberd (el agente lo expande)."""
+    root = otp_prefix(p["otp_version"]) if p["otp_version"] else PurePosixPath("/usr")
+    return root / "lib/erlang/lib/erl_interface-*/bin/erl_call"
+
+
+def health_agent_args(p: dict) -> str:
+    """Argumentos del agente según la configuración del nodo."""
+    args = [f"--port 5222 --domain {p['domain']}",
+            f"--interval {p['health_interval']} --grace {p['health_grace']}",
+            f"--accept-ms {p['health_accept_ms']} --run-queue {p['health_run_queue']}",
+            f"--action {p['health_agent']} --state {HEALTH_STATE}",
+            f"--erl-call {health_erl_call(p)}"]
+    if "mod_http_api" in p["modules"]:
+        args.append(f"--api {local_api_url(p)}")
+    else:
+        args.append(f"--ctl {EJABBERDCTL}")
+    if p["proxy_protocol"]:
+        args.append("--proxy")
+    return " ".join(args)
+
+
+# Corre dentro del servicio ejabberd (ExecStartPost en segundo plano, así
+# pertenece a su cgroup y NotifyAccess=all acepta sus mensajes).  Cada
+# --interval segundos comprueba el listener, el comando status y la cola de
+# ejecución de la BEAM (por erl_call, con el nodo que indica status); mientras el nodo está sano envía WATCHDOG=1.  Si un umbral se
+# supera durante más de --grace segundos: con --action restart deja de latir y
+# systemd reinicia ejabberd al vencer WatchdogSec; con --action flag sigue
+# latiendo y solo lo marca (STATUS= y el archivo --state).
+_HEALTH_AGENT_SCRIPT = r'''#!/usr/bin/env python3
+# Agente de salud de ejabberd — generado por Ejabberd Installer
+import argparse, glob, http.client, json, os, re, socket, subprocess, sys, time
+from urllib.parse import urlsplit
+
+
+def notify(message):
+    path = os.environ.get("NOTIFY_SOCKET")
+    if not path:
+        return
+    if path.startswith("@"):
+        path = "\0" + path[1:]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.sendto(message.encode(), path)
+        except OSError:
+            pass
+
+
+def accept_ms(args):
+    """Conexión y cabecera de stream hasta la respuesta del listener c2s."""
+    t0 = time.perf_counter()
+    with socket.create_connection(("127.0.0.1", args.port), timeout=args.timeout) as sock:
+        if args.proxy:
+            sock.sendall(b"PROXY TCP4 127.0.0.1 127.0.0.1 %d %d\r\n"
+                         % (sock.getsockname()[1], args.port))
+        sock.sendall(("<?xml version='1.0'?><stream:stream to='%s' xmlns='jabber:client' "
+                      "xmlns:stream='http://etherx.jabber.org/streams' version='1.0'>"
+                      % args.domain).encode())
+        buf = b""
+        while b"<stream:stream" not in buf:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise OSError("conexión cerrada sin cabecera de stream")
+            buf += chunk
+    return (time.perf_counter() - t0) * 1000
+
+
+def status(args):
+    """Comando status por mod_http_api (o ejabberdctl si la API no está)."""
+    if args.api:
+        u = urlsplit(args.api)
+        conn = http.client.HTTPConnection(u.netloc, timeout=args.timeout)
+        try:
+            conn.request("POST", u.path.rstrip("/") + "/status", b"{}",
+                         {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            data = resp.read()
+        finally:
+            conn.close()
+        if resp.status != 200:
+            raise OSError("HTTP %d" % resp.status)
+        try:
+            text = str(json.loads(data))
+        except ValueError:
+            text = data.decode(errors="replace")
+    else:
+        res = subprocess.run([args.ctl, "status"], capture_output=True, text=True,
+                             timeout=args.timeout * 3)
+        text = res.stdout
+        if res.returncode != 0:
+            raise OSError(text.strip() or "ejabberdctl status: código %d" % res.returncode)
+    if "is running" not in text:
+        raise OSError(text.strip().splitlines()[-1] if text.strip() else "respuesta vacía")
+    return text.strip().splitlines()[0]
+
+
+def run_queue(args, node):
+    """
+    erlang:statistics(run_queue) del nodo, por erl_call (ni ejabberdctl ni la
+    API la exponen).  La cookie es la de $HOME, como para ejabberdctl.
+    """
+    found = sorted(glob.glob(args.erl_call))
+    if not found:
+        raise OSError("no se encuentra erl_call (%s)" % args.erl_call)
+    name = "-name" if "." in node.split("@")[-1] else "-sname"
+    res = subprocess.run([found[-1], name, node, "-a", "erlang statistics [run_queue]"],
+                         capture_output=True, text=True, timeout=args.timeout * 3)
+    if res.returncode != 0 or not res.stdout.strip().isdigit():
+        raise OSError(res.stdout.strip() or res.stderr.strip() or "erl_call: código %d" % res.returncode)
+    return int(res.stdout)
+
+
+def check(args):
+    result, problems = {}, []
+    try:
+        result["accept_ms"] = round(accept_ms(args), 1)
+        if result["accept_ms"] > args.accept_ms:
+            problems.append("listener lento: %.0f ms" % result["accept_ms"])
+    except OSError as exc:
+        problems.append("listener: %s" % exc)
+    try:
+        result["status"] = status(args)
+    except (OSError, subprocess.SubprocessError) as exc:
+        problems.append("status: %s" % exc)
+    node = re.search(r"node (\S+@\S+)", result.get("status", ""))
+    if node:
+        try:
+            result["run_queue"] = run_queue(args, node.group(1))
+            if result["run_queue"] > args.run_queue:
+                problems.append("cola de ejecución: %d > %d" % (result["run_queue"], args.run_queue))
+        except (OSError, subprocess.SubprocessError) as exc:
+            result["run_queue_error"] = str(exc)    # sin dato no se juzga la cola
+    result["problems"] = problems
+    return result
+
+
+def save(path, state):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=5222)
+    ap.add_argument("--domain", default="localhost")
+    ap.add_argument("--proxy", action="store_true")
+    ap.add_argument("--api", default="")
+    ap.add_argument("--ctl", default="ejabberdctl")
+    ap.add_argument("--erl-call", default="/usr/lib/erlang/lib/erl_interface-*/bin/erl_call")
+    ap.add_argument("--interval", type=float, default=10)
+    ap.add_argument("--grace", type=float, default=60)
+    ap.add_argument("--startup", type=float, default=300)
+    ap.add_argument("--timeout", type=float, default=5)
+    ap.add_argument("--accept-ms", type=float, default=2000)
+    ap.add_argument("--run-queue", type=int, default=0)
+    ap.add_argument("--action", choices=("flag", "restart"), default="restart")
+    ap.add_argument("--state", default="")
+    ap.add_argument("--once", action="store_true")
+    args = ap.parse_args()
+    if args.run_queue <= 0:
+        args.run_queue = 4 * (os.cpu_count() or 1)
+
+    if args.once:
+        result = check(args)
+        print(json.dumps(result))
+        sys.exit(1 if result["problems"] else 0)
+
+    started = time.monotonic()
+    healthy_once, bad_since = False, None
+    while True:
+        result = check(args)
+        now = time.monotonic()
+        if not result["problems"]:
+            healthy_once, bad_since = True, None
+        elif not healthy_once and now - started < args.startup:
+            pass    # arranque: el listener aún puede no estar abierto
+        elif bad_since is None:
+            bad_since = now
+        failing = bad_since is not None and now - bad_since >= args.grace
+        result.update(time=int(time.time()), unhealthy=failing)
+        save(args.state, result)
+        if result["problems"]:
+            print("ejabberd-health: " + "; ".join(result["problems"]), file=sys.stderr, flush=True)
+        if not failing:
+            notify("WATCHDOG=1\nSTATUS=sano" if not result["problems"] else
+                   "WATCHDOG=1\nSTATUS=degradado: " + "; ".join(result["problems"]))
+        elif args.action == "flag":
+            notify("WATCHDOG=1\nSTATUS=NO SANO: " + "; ".join(result["problems"]))
+        else:
+            notify("STATUS=NO SANO, sin latido: " + "; ".join(result["problems"]))
+        time.sleep(max(0.0, args.interval - (time.monotonic() - now)))
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Diario de pasos: reanudación de instalaciones interrumpidas
+# ══════════════════════════════════════════════════════════════════════════════
+
+JOURNAL_PATH = PurePosixPath("/var/lib/ejabberd-installer/journal.json")
+
+# Pasos que se registran, en el orden en que los ejecutan los flujos
+JOURNAL_STEPS = ("deps", "otp", "clone", "user", "build", "etc_hosts", "yaml",
+                 "cert", "permissions", "systemd", "retention", "exporter", "upload", "turn")
+
+
+def step_digest(inputs) -> str:
+    """Huella de las entradas de un paso (cualquier valor serializable en JSON)."""
+    import hashlib
+    import json
+    data = json.dumps(inputs, sort_keys=True, default=str).encode()
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _opt_steps(value):
+    if not isinstance(value, list):
+        raise ValueError("se esperaba una lista de pasos")
+    unknown = [v for v in value if v not in (*JOURNAL_STEPS, "all")]
+    if unknown:
+        raise ValueError(f"pasos desconocidos: {', '.join(map(str, unknown))}; "
+                         f"opciones: all, {', '.join(JOURNAL_STEPS)}")
+    return list(value)
@@ -0,0 +1,428 @@
+"""
+Archivo de configuración declarativo (--config): valores por defecto,
+validación de opciones y conversión a los parámetros de los pasos.
+"""
+
+import re
+from pathlib import Path
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: solo JSON
+    tomllib = None
+
+from .components import (
+    LOG_LEVELS, LOG_PROFILES, log_settings, MODULE_PRESETS, _opt_features, _opt_modules,
+    _opt_steps, _OTP_VERSION_RE, select_modules, TLS_PROFILES,
+)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Archivo de configuración declarativo (--config)
+# ══════════════════════════════════════════════════════════════════════════════
+
+DEFAULT_CONFIG = {
+    "domain": "my.lab.local",
+    "extra_domain": "",
+    "extra_domains": [],
+    "cn": "my.lab.local",
+    "cert_days": "365",
+    "db_type": "sqlite",
+    "db_path": "/usr/local/ejabberd/var/lib/ejabberd/ejabberd.db",
+    "etc_hosts": False,
+    "hosts_ip": "127.0.0.1",
+    "systemd": True,
+    "enable_svc": True,
+    "set_perms": True,
+    "sudo_pass": "",
+    "apply_mode": "auto",
+    "build_features": "auto",
+    "vendor_mode": "off",
+    "vendor_dir": "",
+    "apt_mode": "online",
+    "apt_bundle_dir": "/var/cache/ejabberd-installer/apt",
+    "direct_tls": False,
+    "tls_profile": "default",
+    "tls_probe": True,
+    "module_preset": "full",
+    "extra_modules": [],
+    "mam_retention_days": 0,
+    "offline_retention_days": 0,
+    "retention_schedule": "*-*-* 03:30:00",
+    "retention_batch": 1000,
+    "retention_rate": 60000,
+    "log_profile": "default",
+    "log_level": "",
+    "log_rotate_size": 0,
+    "log_rotate_count": 0,
+    "log_burst_limit_count": 0,
+    "log_burst_limit_window_time": 0,
+    "log_journald": False,
+    "sql_server": "localhost",
+    "sql_port": 0,
+    "sql_database": "",
+    "sql_username": "ejabberd",
+    "sql_password": "",
+    "new_sql_schema": False,
+    "migrate_to": "",
+    "migrate_batch": 5000,
+    "backup_dir": "/var/backups/ejabberd",
+    "backup_incremental": False,
+    "restore_from": [],
+    "force_steps": [],
+    "exporter": False,
+    "exporter_port": 9280,
+    "exporter_interval": 15,
+    "proxy_protocol": False,
+    "haproxy_backends": [],
+    "release_cache_dir": "/var/cache/ejabberd-installer/releases",
+    "drain_seconds": 60,
+    "upload_offload": False,
+    "upload_port": 443,
+    "upload_max_size_mb": 100,
+    "upload_quota_mb": 1000,
+    "upload_max_days": 30,
+    "turn": False,
+    "turn_ipv4_address": "",
+    "turn_max_calls": 100,
+    "turn_secret": "",
+    "health_agent": "off",
+    "health_interval": 10,
+    "health_grace": 60,
+    "health_accept_ms": 2000,
+    "health_run_queue": 0,
+    "preflight": True,
+    "sql_pool_size": 0,
+    "max_sessions": 0,
+    "otp_version": "",
+    "otp_cache_dir": "/var/cache/ejabberd-installer/otp",
+    "fast_start": False,
+    # ── ajuste fino (sección [tuning] del archivo) ──
+    "max_user_sessions": 10,
+    "max_offline_messages": 100,
+    "c2s_rate": 3000,
+    "c2s_burst": 20000,
+    "max_stanza_size": 262144,
+}
+
+
+class ConfigError(ValueError):
+    """Errores de validación de la configuración (se acumulan todos)."""
+
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__("Configuración inválida:\n" + "\n".join(f"  - {e}" for e in errors))
+
+
+_DOMAIN_RE = re.compile(
+    r"^(?=.{1,253}$)[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?(\.[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?)*$",
+    re.IGNORECASE,
+)
+
+
+def _opt_str(value):
+    if not isinstance(value, str):
+        raise ValueError("se esperaba un texto")
+    return value
+
+
+def _opt_bool(value):
+    if not isinstance(value, bool):
+        raise ValueError("se esperaba true o false")
+    return value
+
+
+def _opt_int(lo: int, hi: int):
+    def check(value):
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError("se esperaba un número entero")
+        if not lo <= value <= hi:
+            raise ValueError(f"debe estar entre {lo} y {hi}")
+        return value
+    return check
+
+
+def _opt_choice(*choices):
+    def check(value):
+        if value not in choices:
+            raise ValueError(f"valor {value!r} no válido; opciones: {', '.join(choices)}")
+        return value
+    return check
+
+
+def _opt_domain(value, allow_empty: bool = False):
+    value = _opt_str(value).strip()
+    if not value and allow_empty:
+        return value
+    if not _DOMAIN_RE.match(value):
+        raise ValueError(f"{value!r} no es un nombre de dominio válido")
+    return value
+
+
+def _opt_domain_list(value):
+    if not isinstance(value, list):
+        raise ValueError("se esperaba una lista de dominios")
+    return [_opt_domain(v) for v in value]
+
+
+def _opt_ip(value):
+    import ipaddress
+    try:
+        return str(ipaddress.ip_address(_opt_str(value).strip()))
+    except ValueError:
+        raise ValueError(f"{value!r} no es una dirección IP válida") from None
+
+
+def _opt_abspath(value, allow_empty: bool = False):
+    value = _opt_str(value).strip()
+    if not value and allow_empty:
+        return value
+    if not value.startswith("/"):
+        raise ValueError("se esperaba una ruta absoluta")
+    return value
+
+
+def _opt_path_list(value):
+    if not isinstance(value, list):
+        raise ValueError("se esperaba una lista de rutas")
+    return [_opt_abspath(v) for v in value]
+
+
+def _opt_calendar(value):
+    value = _opt_str(value).strip()
+    if not value or "\n" in value:
+        raise ValueError("se esperaba una expresión OnCalendar de systemd (p. ej. 'daily')")
+    return value
+
+
+def _opt_otp_version(value):
+    value = _opt_str(value).strip()
+    if value and not _OTP_VERSION_RE.match(value):
+        raise ValueError(f"versión de OTP no válida: {value!r} (ej. 26.2.5)")
+    return value
+
+
+def _opt_host_list(value):
+    if not isinstance(value, list):
+        raise ValueError("se esperaba una lista de hosts")
+    hosts = []
+    for v in value:
+        try:
+            hosts.append(_opt_ip(v))
+        except ValueError:
+            hosts.append(_opt_domain(v))
+    if len(set(hosts)) != len(hosts):
+        raise ValueError("hosts repetidos")
+    return hosts
+
+
+# clave → validador (devuelve el valor normalizado o lanza ValueError)
+CONFIG_SCHEMA = {
+    "domain":        _opt_domain,
+    "extra_domain":  lambda v: _opt_domain(v, allow_empty=True),
+    "extra_domains": _opt_domain_list,
+    "cn":            _opt_domain,
+    "cert_days":     lambda v: str(_opt_int(1, 36500)(v)),
+    "db_type":       _opt_choice("sqlite", "pgsql", "mysql"),
+    "db_path":       _opt_abspath,
+    "etc_hosts":     _opt_bool,
+    "hosts_ip":      _opt_ip,
+    "systemd":       _opt_bool,
+    "enable_svc":    _opt_bool,
+    "set_perms":     _opt_bool,
+    "sudo_pass":     _opt_str,
+    "apply_mode":    _opt_choice("auto", "reload", "restart"),
+    "build_features": _opt_features,
+    "vendor_mode":   _opt_choice("off", "auto", "create", "use"),
+    "vendor_dir":    lambda v: _opt_abspath(v, allow_empty=True),
+    "apt_mode":      _opt_choice("online", "prefetch", "offline"),
+    "apt_bundle_dir": _opt_abspath,
+    "direct_tls":    _opt_bool,
+    "tls_profile":   _opt_choice(*TLS_PROFILES),
+    "tls_probe":     _opt_bool,
+    "module_preset": _opt_choice(*MODULE_PRESETS),
+    "extra_modules": _opt_modules,
+    "mam_retention_days":     _opt_int(0, 36500),
+    "offline_retention_days": _opt_int(0, 36500),
+    "retention_schedule":     _opt_calendar,
+    "retention_batch":        _opt_int(10, 100000),
+    "retention_rate":         _opt_int(100, 100000000),
+    "log_profile":   _opt_choice(*LOG_PROFILES),
+    "log_level":     _opt_choice(*LOG_LEVELS),
+    "log_rotate_size":  _opt_int(1048576, 10737418240),
+    "log_rotate_count": _opt_int(1, 1000),
+    "log_burst_limit_count":       _opt_int(1, 1000000),
+    "log_burst_limit_window_time": _opt_int(1, 3600),
+    "log_journald":  _opt_bool,
+    "sql_server":    _opt_str,
+    "sql_port":      _opt_int(0, 65535),
+    "sql_database":  _opt_str,
+    "sql_username":  _opt_str,
+    "sql_password":  _opt_str,
+    "new_sql_schema": _opt_bool,
+    "migrate_to":    _opt_choice("pgsql", "mysql"),
+    "migrate_batch": _opt_int(100, 100000),
+    "backup_dir":    _opt_abspath,
+    "backup_incremental": _opt_bool,
+    "restore_from":  _opt_path_list,
+    "force_steps":   _opt_steps,
+    "exporter":      _opt_bool,
+    "exporter_port": _opt_int(1024, 65535),
+    "exporter_interval": _opt_int(1, 3600),
+    "proxy_protocol":   _opt_bool,
+    "haproxy_backends": _opt_host_list,
+    "release_cache_dir": _opt_abspath,
+    "drain_seconds":    _opt_int(0, 3600),
+    "upload_offload":   _opt_bool,
+    "upload_port":      _opt_int(1, 65535),
+    "upload_max_size_mb": _opt_int(1, 102400),
+    "upload_quota_mb":  _opt_int(1, 10485760),
+    "upload_max_days":  _opt_int(1, 3650),
+    "turn":             _opt_bool,
+    "turn_ipv4_address": lambda v: _opt_ip(v) if str(v).strip() else "",
+    "turn_max_calls":   _opt_int(1, 4000),
+    "turn_secret":      _opt_str,
+    "health_agent":     _opt_choice("off", "flag", "restart"),
+    "health_interval":  _opt_int(2, 300),
+    "health_grace":     _opt_int(0, 3600),
+    "health_accept_ms": _opt_int(10, 60000),
+    "health_run_queue": _opt_int(0, 100000),
+    "preflight":     _opt_bool,
+    "sql_pool_size": _opt_int(0, 500),
+    "max_sessions":  _opt_int(0, 10000000),
+    "otp_version":   _opt_otp_version,
+    "otp_cache_dir": _opt_abspath,
+    "fast_start":    _opt_bool,
+}
+
+TUNING_SCHEMA = {
+    "max_user_sessions":    _opt_int(1, 1000),
+    "max_offline_messages": _opt_int(0, 1000000),
+    "c2s_rate":             _opt_int(100, 100000000),
+    "c2s_burst":            _opt_int(100, 100000000),
+    "max_stanza_size":      _opt_int(1024, 67108864),
+}
+
+
+def _validate_section(raw: dict, schema: dict, where: str, errors: list) -> dict:
+    import difflib
+    out = {}
+    for key, value in raw.items():
+        check = schema.get(key)
+        if check is None:
+            hint = difflib.get_close_matches(key, schema, n=1)
+            errors.append(f"{where}{key}: opción desconocida"
+                          + (f" (¿quiso decir '{hint[0]}'?)" if hint else ""))
+            continue
+        try:
+            out[key] = check(value)
+        except ValueError as exc:
+            errors.append(f"{where}{key}: {exc}")
+    return out
+
+
+def _validate_layer(raw: dict, where: str, errors: list) -> dict:
+    """Valida una capa (raíz o perfil): opciones planas más la sección [tuning]."""
+    raw = dict(raw)
+    tuning = raw.pop("tuning", {})
+    if not isinstance(tuning, dict):
+        errors.append(f"{where}tuning: se esperaba una tabla")
+        tuning = {}
+    if "domains" in raw:
+        raw["extra_domains"] = raw.pop("domains")
+    out = _validate_section(raw, CONFIG_SCHEMA, where, errors)
+    out.update(_validate_section(tuning, TUNING_SCHEMA, f"{where}tuning.", errors))
+    return out
+
+
+def validate_config(raw: dict, profile: str | None = None) -> dict:
+    """
+    Valida un archivo de configuración completo (incluidos todos sus perfiles)
+    y devuelve la configuración plana resultante de aplicar el perfil elegido
+    sobre DEFAULT_CONFIG.  Lanza ConfigError con todos los errores a la vez.
+    """
+    errors: list[str] = []
+    raw = dict(raw)
+    profiles = raw.pop("profiles", {})
+    profile = profile or raw.pop("profile", None)
+    raw.pop("profile", None)
+
+    base = _validate_layer(raw, "", errors)
+    layers = {}
+    if not isinstance(profiles, dict):
+        errors.append("profiles: se esperaba una tabla de perfiles")
+        profiles = {}
+    for name, body in profiles.items():
+        if not isinstance(body, dict):
+            errors.append(f"profiles.{name}: se esperaba una tabla")
+            continue
+        layers[name] = _validate_layer(body, f"profiles.{name}.", errors)
+    if profile and profile not in layers:
+        errors.append(f"perfil {profile!r} no definido"
+                      + (f"; disponibles: {', '.join(layers)}" if layers else ""))
+
+    config = {**DEFAULT_CONFIG, **base, **layers.get(profile, {})}
+    if "cn" not in base and "cn" not in layers.get(profile, {}):
+        config["cn"] = config["domain"]
+    if config["c2s_burst"] < config["c2s_rate"]:
+        errors.append("tuning.c2s_burst: no puede ser menor que c2s_rate")
+    if errors:
+        raise ConfigError(errors)
+    return config
+
+
+def load_config(path: str, profile: str | None = None) -> dict:
+    """Lee un archivo TOML o JSON y lo valida con validate_config()."""
+    import json
+    file = Path(path)
+    try:
+        text = file.read_text(encoding="utf-8")
+    except OSError as exc:
+        raise ConfigError([f"no se pudo leer {path}: {exc.strerror}"]) from None
+    try:
+        if file.suffix == ".toml":
+            if tomllib is None:
+                raise ConfigError(["los archivos TOML requieren Python 3.11+; use JSON"])
+            raw = tomllib.loads(text)
+        else:
+            raw = json.loads(text)
+    except (ValueError, TypeError) as exc:
+        if isinstance(exc, ConfigError):
+            raise
+        raise ConfigError([f"{path}: sintaxis inválida: {exc}"]) from None
+    if not isinstance(raw, dict):
+        raise ConfigError([f"{path}: la raíz debe ser una tabla/objeto"])
+    return validate_config(raw, profile)
+
+
+def build_params(config: dict) -> dict:
+    """Convierte un diccionario de configuración en los parámetros de los pasos"""
+    config = {**DEFAULT_CONFIG, **config}
+    domain = (config.get('domain') or "").strip() or "my.lab.local"
+    extra = [(config.get('extra_domain') or "").strip(), *config.get('extra_domains', [])]
+    domains = ['"localhost"', f'"{domain}"']
+    for d in extra:
+        if d and f'"{d}"' not in domains:
+            domains.append(f'"{d}"')
+
+    return {
+        **config,
+        "domain": domain,
+        "domains_yaml": "\n".join(f"  - {d}" for d in domains),
+        "cn": (config.get('cn') or "").strip() or domain,
+        "cert_days": str(config.get('cert_days') or "365").strip(),
+        "db_type": config.get('db_type', "sqlite"),
+        "db_path": (config.get('db_path') or "").strip(),
+        "etc_hosts": bool(config.get('etc_hosts')),
+        "hosts_ip": (config.get('hosts_ip') or "").strip(),
+        "systemd": bool(config.get('systemd', True)),
+        "enable_svc": bool(config.get('enable_svc', True)),
+        "set_perms": bool(config.get('set_perms', True)),
+        "sudo_pass": config.get('sudo_pass', ""),
+        **log_settings(config),
+        "modules": select_modules(config.get('module_preset') or "full",
+                                  [*(config.get('extra_modules') or []),
+                                   *(["mod_stun_disco"] if config.get('turn') else [])]),
+    }
@@ -0,0 +1,2235 @@
+"""
+Motor de instalación: los pasos que comparten todas las interfaces, los
+flujos (WORKFLOWS) y la API de Python para ejecutarlos (Engine, StepResult).
+"""
+
+import re
+import shlex
+import textwrap
+import time
+from datetime import datetime
+from pathlib import PurePosixPath
+
+from .transport import LocalTransport, _quiet, SimulatedTransport
+from .components import (
+    APT_BASE_PACKAGES, APT_FEATURE_PACKAGES, APT_OTP_PACKAGES, BACKUP_COMPRESSORS,
+    boot_phases, _BOOT_PROBE, build_features, CONF_PATH, configure_flags, _decompressor,
+    diff_config, DIRECT_TLS_PORT, EJABBERD_PREFIX, EJABBERDCTL, EXPORTER_PATH,
+    _EXPORTER_SCRIPT, FAST_START_MARKER, _fmt_bytes, HAPROXY_CFG, HAPROXY_SOCKET,
+    health_agent_args, HEALTH_AGENT_PATH, _HEALTH_AGENT_SCRIPT, HEALTH_STATE,
+    health_watchdog_sec, http_handlers_yaml, JOURNAL_PATH, lint_config, LOCAL_API_PORT,
+    local_api_url, _log_bytes, LOG_DIR, log_options_yaml, _MIGRATE_SCRIPT, MODULES,
+    NGINX_SITE, NGINX_SITE_ENABLED, OTP_CONFIGURE, otp_prefix, OTP_SOURCE_URL,
+    preflight_plan, _PREFLIGHT_PROBE, render_haproxy, render_nginx_upload, RESTART_OPTIONS,
+    session_kb, session_limits, SPOOL_DIR, sql_options_yaml, step_digest, tls_options_yaml,
+    _TLS_PROBE, turn_listen_yaml, TURN_PORT, turn_port_range, _TURN_PROBE, TURN_SECRET_PATH,
+    TURN_TLS_PORT, UPLOAD_DIR, upload_get_url, upload_module_yaml, upload_offloaded,
+    upload_quota_yaml, yaml_sections,
+)
+from .config import build_params, validate_config
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Pasos de instalación (compartidos por CLI, GUI y aprovisionamiento en flota)
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Cada versión vive en RELEASES_DIR/<git describe>; lib/ y ejabberdctl del
+# prefijo son enlaces a RELEASES_DIR/current, así que cambiar de versión (o
+# volver atrás) es cambiar un enlace.  etc/ y var/ no cambian de sitio.
+RELEASES_DIR   = PurePosixPath("/usr/local/ejabberd-releases")
+RELEASE_PATHS  = ("lib", "sbin/ejabberdctl")
+RELEASE_KEEP   = 3
+HEALTH_TIMEOUT = 120
+HAPROXY_SETTLE = 30    # s hasta que HAProxy da por caído un nodo (fall 3 × inter 5s), con margen
+
+
+class InstallerSteps:
+    """
+    Pasos de instalación reutilizables.  La clase que los mezcle debe aportar
+    log_msg(text, tag); los comandos se ejecutan a través de self.transport.
+    """
+
+    transport = LocalTransport()
+    last_section = ""     # título de la última sección; lo mantiene la subclase que lo conozca
+
+    def _run(self, cmd: str, p: dict) -> tuple[int, str]:
+        """Ejecuta un comando en el destino usando el transporte activo."""
+        return self.transport.run(cmd, self.log_msg, p["sudo_pass"])
+
+    def _read_remote(self, path, p: dict) -> str | None:
+        """Lee un archivo del destino (con sudo) sin volcarlo al log."""
+        self.log_msg(f"$ sudo cat {path}", "cmd")
+        rc, out = self.transport.run(f"sudo cat {path}", _quiet, p["sudo_pass"])
+        return out + "\n" if rc == 0 else None
+
+    def _private_dir(self, p: dict) -> PurePosixPath:
+        """Directorio temporal 700 del usuario en el destino, para archivos con secretos."""
+        rc, out = self.transport.run("mktemp -d", _quiet, p["sudo_pass"])
+        if rc != 0 or not out.strip():
+            raise RuntimeError("No se pudo crear un directorio temporal en el destino")
+        return PurePosixPath(out.strip().splitlines()[-1])
+
+    def _begin(self):
+        """Reinicia el estado acumulado durante un flujo."""
+        self._config_changes = set()
+        self._restart_reasons = []
+        self._cert_changed = False
+
+    def _step_started(self, name: str):
+        """Aviso a la interfaz: empieza el paso name del diario ("" al salir de ellos)."""
+
+    def _step_skipped(self, name: str, title: str):
+        """
+        Aviso a la interfaz: el diario da por hecho el paso name.  title es el
+        de su sección cuando se ejecutó ("" si no abrió ninguna).
+        """
+
+    # ── flujos de trabajo ────────────────────────────────────────────────────
+
+    def _do_full(self, p: dict):
+        """Secuencia completa: deps + compilación + configuración."""
+        self._begin()
+        self._step_preflight(p, build=True)
+        self._fast_start_state(p)
+        self._turn_state(p)
+        tls_before = self._tls_probe(p)
+        ejdir = self._source_dir()
+        self._run_journaled("full", [
+            ("deps",      lambda: self._step_deps(p)),
+            *([("otp",    lambda: self._step_otp(p))] if p["otp_version"] else []),
+            ("clone",     lambda: self._step_clone(p)),
+            ("user",      lambda: self._step_user(p)),
+            ("build",     lambda: self._step_build(ejdir, p)),
+            *self._config_steps(p),
+        ], p)
+        if p["systemd"] and p["enable_svc"]:
+            self._report_tls(p, tls_before)
+        self._report_footprint(p)
+
+    def _do_prefetch(self, p: dict):
+        """Secuencia de prefetch: solo prepara el repositorio apt local."""
+        self._begin()
+        self.log_msg("━━━  Repositorio apt local  ━━━", "section")
+        self._apt_prefetch(p)
+        self._apt_verify_bundle(p)
+
+    def _do_vendor(self, p: dict):
+        """Secuencia de vendor: clona, compila y empaqueta las dependencias."""
+        self._begin()
+        p = {**p, "vendor_mode": "create"}
+        ejdir = self._step_clone(p)
+        self.log_msg("━━━  Vendor de dependencias  ━━━", "section")
+        self._compile(ejdir, p)
+
+    def _do_config_only(self, p: dict):
+        """Secuencia de configuración sin compilar."""
+        self._begin()
+        self._step_preflight(p, build=False)
+        self._fast_start_state(p)
+        self._turn_state(p)
+        tls_before = self._tls_probe(p)
+        self._run_journaled("config", [
+            ("user",      lambda: self._step_user(p)),
+            *self._config_steps(p),
+        ], p)
+        if p["systemd"] and p["enable_svc"]:
+            self._report_tls(p, tls_before)
+
+    def _config_steps(self, p: dict) -> list:
+        """Pasos de configuración comunes a los flujos full y config."""
+        steps = [
+            ("etc_hosts", lambda: self._step_etc_hosts(p)),
+            ("yaml",      lambda: self._step_yaml(p)),
+            ("cert",      lambda: self._step_cert(p)),
+        ]
+        if p["set_perms"]:
+            steps.append(("permissions", lambda: self._step_permissions(p)))
+        if p["systemd"]:
+            steps += [("systemd",   lambda: self._step_systemd(p)),
+                      ("retention", lambda: self._step_retention(p)),
+                      ("exporter",  lambda: self._step_exporter(p))]
+        steps.append(("upload", lambda: self._step_upload(p)))
+        if p["turn"]:
+            steps.append(("turn", lambda: self._step_turn(p)))
+        return steps
+
+    def _do_cert_only(self, p: dict):
+        """Secuencia de regeneración del certificado TLS."""
+        self._begin()
+        self._step_cert(p)
+        if p["set_perms"]:
+            self._step_permissions(p)
+        if p["systemd"] and p["enable_svc"]:
+            self._step_apply(p)
+
+    def _do_retention(self, p: dict):
+        """Secuencia de retención: instala el timer y lo ejecuta una vez ya."""
+        self._begin()
+        if not (p["mam_retention_days"] or p["offline_retention_days"]):
+            raise RuntimeError("Retención desactivada: defina mam_retention_days "
+                               "u offline_retention_days")
+        before = self._step_retention(p)
+        self.log_msg("Ejecutando la retención ahora (puede tardar)…", "out")
+        rc, _ = self._run("sudo systemctl start ejabberd-retention.service", p)
+        if rc != 0:
+            raise RuntimeError("ejabberd-retention.service falló (journalctl -u ejabberd-retention)")
+        self.log_msg("━━━  Después de la retención  ━━━", "section")
+        after = self._db_report(p)
+        for name, (rows, size) in after.items():
+            old_rows, old_size = before.get(name, (None, None))
+            if rows is not None and old_rows is not None and old_rows > rows:
+                self.log_msg(f"✔ {name}: {old_rows - rows:,} filas borradas", "ok")
+            if size is not None and old_size is not None and old_size > size:
+                self.log_msg(f"✔ {name}: {_fmt_bytes(old_size - size)} liberados", "ok")
+
+    def _do_migrate(self, p: dict):
+        """Secuencia de migración: copia el sqlite al backend nuevo y lo activa."""
+        import json
+        self._begin()
+        target = p["migrate_to"]
+        if p["db_type"] != "sqlite" or not target:
+            raise RuntimeError("La migración requiere db_type = 'sqlite' y migrate_to = 'pgsql' o 'mysql'")
+        self.log_msg(f"━━━  Migración sqlite → {target}  ━━━", "section")
+        client, pkg = {"pgsql": ("psql", "postgresql-client"),
+                       "mysql": ("mysql", "default-mysql-client")}[target]
+        rc, _ = self._run(f"command -v {client}", p)
+        if rc != 0:
+            raise RuntimeError(f"Falta el cliente '{client}' en el nodo (apt install {pkg})")
+        rc, _ = self._run(f"sudo test -f {shlex.quote(p['db_path'])}", p)
+        if rc != 0:
+            raise RuntimeError(f"No existe la base de datos sqlite {p['db_path']}")
+
+        self.log_msg("Parando ejabberd para copiar un estado coherente…", "out")
+        self._run("sudo systemctl stop ejabberd", p)
+        job = {
+            "target": target, "batch": p["migrate_batch"], "source": p["db_path"],
+            "snapshot": "/var/lib/ejabberd-installer/migrate-snapshot.db",
+            "prefix": str(EJABBERD_PREFIX), "server": p["sql_server"], "port": p["sql_port"],
+            "database": p["sql_database"] or "ejabberd", "username": p["sql_username"],
+            "password": p["sql_password"],
+        }
+        # El trabajo lleva la contraseña SQL: solo se escribe en un directorio privado
+        private = self._private_dir(p)
+        script, job_file = private / "migrate.py", private / "job.json"
+        try:
+            self.transport.write_text(script, _MIGRATE_SCRIPT)
+            self.transport.write_text(job_file, json.dumps(job))
+            rc, out = self._run(f"sudo python3 {script} {job_file}", p)
+        finally:
+            self.transport.remove(private)
+        try:
+            summary = json.loads(out.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            summary = {}
+        if rc != 0 or not summary.get("ok"):
+            self.log_msg("✖ Migración incompleta. ejabberd sigue parado y el sqlite intacto: "
+                         "relance la migración para reanudarla o 'sudo systemctl start ejabberd' "
+                         "para seguir con sqlite.", "err")
+            raise RuntimeError("La migración no se completó")
+
+        rows = sum(src for src, _ in summary["tables"].values())
+        self.log_msg(f"✔ {len(summary['tables'])} tablas, {rows:,} filas copiadas y verificadas.", "ok")
+        if summary["skipped"]:
+            self.log_msg("Tablas sin equivalente en el destino (omitidas): "
+                         + ", ".join(summary["skipped"]), "warn")
+        p = build_params({**p, "db_type": target, "sql_database": job["database"],
+                          "new_sql_schema": summary["new_schema"]})
+        self._step_yaml(p)
+        if p["systemd"]:
+            self._step_apply(p)
+        else:
+            self.log_msg("Arranque ejabberd manualmente para usar el backend nuevo.", "warn")
+        hint = f'db_type = "{target}"' + (", new_sql_schema = true" if summary["new_schema"] else "")
+        self.log_msg(f"✔ ejabberd usa ahora {target}. Actualice su archivo de configuración: {hint}", "ok")
+
+    def _do_boot(self, p: dict):
+        """Mide el arranque; con fast_start lo repite sin update_sql_schema."""
+        self._begin()
+        self._fast_start_state(p)
+        self.log_msg("━━━  Tiempo de arranque  ━━━", "section")
+        before = self._measure_boot(p)
+        if p.get("sql_schema_ready"):
+            self.log_msg("✔ Arranque rápido activo (update_sql_schema: false).", "ok")
+            return
+        if not p["fast_start"]:
+            self.log_msg("Con fast_start = true, los arranques siguientes omiten la "
+                         "comprobación del esquema SQL (update_sql_schema: false).", "out")
+            return
+
+        # Este arranque terminó con update_sql_schema: true, así que el esquema está al día
+        release = self._ejabberd_release(p)
+        tmp = PurePosixPath("/tmp/ejabberd_schema_ready")
+        self.transport.write_text(tmp, release + "\n")
+        self._run(f"sudo install -D -m 644 {tmp} {FAST_START_MARKER}", p)
+        self.transport.remove(tmp)
+        p["sql_schema_ready"] = True
+        self._step_yaml(p)
+        self.log_msg("━━━  Arranque rápido  ━━━", "section")
+        after = self._measure_boot(p)
+        self.log_msg(f"✔ Arranque: {before:.2f} s → {after:.2f} s "
+                     f"({(after - before) / before:+.0%}).", "ok")
+
+    def _ejabberd_release(self, p: dict) -> str:
+        """Versión instalada (nombre del directorio lib/ejabberd-*)."""
+        rc, out = self.transport.run(f"ls -d {EJABBERD_PREFIX}/lib/ejabberd-*", _quiet, p["sudo_pass"])
+        return PurePosixPath(out.split()[-1]).name if rc == 0 and out.strip() else ""
+
+    def _fast_start_state(self, p: dict):
+        """Con fast_start, activa update_sql_schema: false si el esquema ya se comprobó."""
+        if not p["fast_start"]:
+            return
+        marker = self._read_remote(FAST_START_MARKER, p)
+        release = self._ejabberd_release(p)
+        p["sql_schema_ready"] = bool(release) and marker is not None and marker.strip() == release
+
+    def _measure_boot(self, p: dict) -> float:
+        """Para y arranca ejabberd midiendo hasta que acepta conexiones; muestra las fases."""
+        import json
+        self.log_msg("Reiniciando ejabberd para medir el arranque…", "out")
+        rc, out = self.transport.run(
+            f"sudo python3 -c {shlex.quote(_BOOT_PROBE)} 5222 {LOG_DIR}/ejabberd.log 300",
+            _quiet, p["sudo_pass"])
+        try:
+            result = json.loads(out.strip().splitlines()[-1]) if rc == 0 else {}
+        except (ValueError, IndexError):
+            result = {}
+        if not result.get("ready"):
+            raise RuntimeError("ejabberd no aceptó conexiones en 5222 (journalctl -u ejabberd)")
+        ready = result["ready"]
+        m = re.search(r"is started in the node \S+ in ([\d.]+)s", result["log"])
+        own = f" (ejabberd declara {m.group(1)} s)" if m else ""
+        self.log_msg(f"Arranque: {ready:.2f} s hasta aceptar conexiones en 5222{own}", "out")
+        for label, seconds in boot_phases(result["t0"], ready, result["log"]):
+            self.log_msg(f"  {label:<24} {seconds:6.2f} s  {seconds / ready:4.0%}", "out")
+        return ready
+
+    def _do_health(self, p: dict):
+        """Una ronda de comprobaciones del agente de salud y su último estado."""
+        import json
+        self._begin()
+        self.log_msg("━━━  Salud del nodo  ━━━", "section")
+        rc, out = self.transport.run(
+            f"sudo -u ejabberd -H python3 -c {shlex.quote(_HEALTH_AGENT_SCRIPT)} "
+            f"{health_agent_args(p)} --once",
+            _quiet, p["sudo_pass"])
+        try:
+            result = json.loads(out.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            raise RuntimeError(f"El agente de salud no respondió: {out.strip()[-200:]}")
+        if "accept_ms" in result:
+            self.log_msg(f"Listener 5222: {result['accept_ms']:.1f} ms hasta la cabecera de "
+                         f"stream (umbral {p['health_accept_ms']} ms)", "out")
+        if "status" in result:
+            self.log_msg(f"status: {result['status']}", "out")
+        if "run_queue" in result:
+            self.log_msg(f"Cola de ejecución de la BEAM: {result['run_queue']}", "out")
+        else:
+            self.log_msg(f"⚠ Cola de ejecución sin medir: {result.get('run_queue_error', '?')}", "warn")
+        for problem in result["problems"]:
+            self.log_msg(f"✖ {problem}", "err")
+
+        state = self._read_remote(HEALTH_STATE, p)
+        if p["health_agent"] == "off":
+            self.log_msg("health_agent = off: ningún agente vigila este nodo.", "warn")
+        elif state is None:
+            self.log_msg(f"⚠ {HEALTH_STATE} no existe: el agente no está en marcha "
+                         f"(journalctl -u ejabberd).", "warn")
+        else:
+            last = json.loads(state)
+            age = int(time.time()) - last.get("time", 0)
+            if last.get("unhealthy"):
+                self.log_msg(f"✖ El agente marca el nodo como NO SANO (hace {age} s).", "err")
+            else:
+                self.log_msg(f"✔ Última comprobación del agente hace {age} s: sano.", "ok")
+        if rc != 0:
+            raise RuntimeError("El nodo no supera las comprobaciones de salud")
+        self.log_msg("✔ Nodo sano.", "ok")
+
+    def _do_haproxy(self, p: dict):
+        """Instala HAProxy en el destino como balanceador de los nodos de haproxy_backends."""
+        self._begin()
+        self.log_msg("━━━  Balanceador HAProxy  ━━━", "section")
+        if not p["haproxy_backends"]:
+            raise RuntimeError("haproxy_backends está vacío: indique los nodos ejabberd")
+        if not p["proxy_protocol"]:
+            self.log_msg("⚠ proxy_protocol = false: los nodos verán la IP del balanceador, "
+                         "no la del cliente, y rechazarán la cabecera PROXY.", "warn")
+        rc, _ = self._run("sudo apt-get install -y haproxy socat", p)
+        if rc != 0:
+            raise RuntimeError("No se pudo instalar haproxy")
+
+        tmp = PurePosixPath("/tmp/ejabberd_installer_haproxy.cfg")
+        self.transport.write_text(tmp, render_haproxy(p))
+        rc, _ = self._run(f"sudo haproxy -c -f {tmp}", p)
+        if rc != 0:
+            self.transport.remove(tmp)
+            raise RuntimeError("haproxy -c rechazó la configuración generada; no se aplica.")
+        self._run(f"sudo cp -p {HAPROXY_CFG} {HAPROXY_CFG}.bak", p)
+        rc, _ = self._run(f"sudo install -m 644 {tmp} {HAPROXY_CFG}", p)
+        self.transport.remove(tmp)
+        if rc != 0:
+            raise RuntimeError(f"No se pudo escribir {HAPROXY_CFG}")
+        rc, _ = self._run("sudo systemctl enable haproxy && sudo systemctl reload-or-restart haproxy", p)
+        if rc != 0:
+            raise RuntimeError("No se pudo recargar haproxy (journalctl -u haproxy)")
+
+        # Estado de las comprobaciones de salud según el socket de administración: se
+        # consulta hasta que cada nodo tiene resultado (srv_check_result) y su contador
+        # (srv_check_health) está en un extremo: 0 caído o 4 sano (rise 2 + fall 3 − 1)
+        show = f"echo 'show servers state' | socat stdio {HAPROXY_SOCKET}"
+        deadline = time.monotonic() + HAPROXY_SETTLE
+        while True:
+            rc, out = self.transport.run(f"sudo sh -c {shlex.quote(show)}", _quiet, p["sudo_pass"])
+            servers = [cols for cols in (l.split() for l in out.splitlines())
+                       if len(cols) > 12 and cols[0].isdigit()]
+            settled = rc == 0 and servers and all(c[11] != "0" and c[12] in ("0", "4") for c in servers)
+            if settled or time.monotonic() >= deadline:
+                break
+            time.sleep(1)
+        down = sorted({f"{cols[1]}/{cols[3]}" for cols in servers if cols[5] != "2"})
+        if rc != 0 or not servers:
+            self.log_msg(f"⚠ No se pudo consultar el estado de los nodos en {HAPROXY_SOCKET}.", "warn")
+        elif not settled:
+            self.log_msg(f"⚠ Las comprobaciones de salud no se estabilizaron en {HAPROXY_SETTLE} s.", "warn")
+        elif down:
+            self.log_msg("⚠ Nodos que no superan la comprobación de salud: " + ", ".join(down), "warn")
+        else:
+            self.log_msg(f"✔ HAProxy reparte entre {len(p['haproxy_backends'])} nodos "
+                         f"(leastconn, PROXY v2).", "ok")
+
+    def _do_backup(self, p: dict):
+        """Secuencia de copia: instantáneas coherentes + un único archivo comprimido."""
+        import json
+        self._begin()
+        self.log_msg("━━━  Copia de seguridad  ━━━", "section")
+        ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+        bdir = PurePosixPath(p["backup_dir"])
+        snap = bdir / "snapshot"
+        rc, out = self._run("command -v zstd || command -v pigz || command -v gzip", p)
+        compressor = PurePosixPath(out.strip().splitlines()[-1]).name if rc == 0 else "gzip"
+        compress, ext = BACKUP_COMPRESSORS[compressor]
+        snar = bdir / "ejabberd.snar"
+        kind = "full"
+        if p["backup_incremental"]:
+            rc, _ = self._run(f"sudo test -f {snar}", p)
+            kind = "inc" if rc == 0 else "full"
+        archive = bdir / f"ejabberd-{p['domain']}-{ts}-{kind}{ext}"
+
+        self._run(f"sudo rm -rf {snap} && sudo mkdir -p {snap} && sudo chmod 711 {bdir} "
+                  f"&& sudo chown ejabberd:ejabberd {snap}", p)
+        try:
+            contents = self._backup_snapshots(p, snap, bdir)
+            paths = {"snapshot": str(snap), "etc": str(EJABBERD_PREFIX / "etc")}
+            rc, _ = self._run(f"sudo test -d {UPLOAD_DIR}", p)
+            if rc == 0:
+                paths["upload"] = str(UPLOAD_DIR)
+            manifest = {
+                "created": datetime.now().isoformat(timespec="seconds"), "host": p["domain"],
+                "kind": kind, "db_type": p["db_type"], "db_path": p["db_path"],
+                "contents": contents, "paths": paths, "compressor": compressor,
+            }
+            tmp = PurePosixPath("/tmp/ejabberd_manifest.json")
+            self.transport.write_text(tmp, json.dumps(manifest, indent=2))
+            self._run(f"sudo cp {tmp} {snap}/manifest.json", p)
+            self.transport.remove(tmp)
+
+            # rutas relativas a / con un único -C: tar no admite varios junto a --listed-incremental
+            sources = " ".join(shlex.quote(path.lstrip("/")) for path in paths.values())
+            incremental = ""
+            if p["backup_incremental"]:
+                # se trabaja sobre una copia del índice: si la copia falla, el nivel anterior vale
+                self._run(f"sudo sh -c 'cp {snar} {snar}.new 2>/dev/null || true'", p)
+                incremental = f"--listed-incremental={snar}.new "
+            self.log_msg(f"Empaquetando con {compressor} ({'incremental' if kind == 'inc' else 'completa'})…", "out")
+            start = time.monotonic()
+            pipeline = f"tar {incremental}-C / -cf - {sources} | {compress} > {archive}"
+            rc, _ = self._run(f"sudo bash -o pipefail -c {shlex.quote(pipeline)}", p)
+            if rc != 0:
+                self._run(f"sudo rm -f {archive} {snar}.new", p)
+                raise RuntimeError("No se pudo crear el archivo de copia")
+            if p["backup_incremental"]:
+                self._run(f"sudo mv {snar}.new {snar}", p)
+            elapsed = time.monotonic() - start
+        finally:
+            self._run(f"sudo rm -rf {snap} {bdir}/.pgpass {bdir}/.my.cnf", p)
+
+        rc, out = self.transport.run(f"sudo stat -c %s {archive}", _quiet, p["sudo_pass"])
+        size = int(out.strip()) if rc == 0 and out.strip().isdigit() else 0
+        self.log_msg(f"✔ Copia escrita en {archive} ({_fmt_bytes(size)}, {elapsed:.1f} s, "
+                     f"{_fmt_bytes(size / max(elapsed, 0.001))}/s)", "ok")
+        return archive
+
+    def _backup_snapshots(self, p: dict, snap: PurePosixPath, bdir: PurePosixPath) -> list[str]:
+        """Instantáneas coherentes de Mnesia y de la base SQL en snap."""
+        contents = []
+        rc, _ = self._run("systemctl is-active --quiet ejabberd", p)
+        if rc == 0:
+            rc, _ = self._run(f"sudo -u ejabberd {EJABBERDCTL} backup {snap}/mnesia.backup", p)
+            if rc != 0:
+                raise RuntimeError("ejabberdctl backup falló")
+            contents.append("mnesia.backup")
+        else:
+            # con el nodo parado los archivos de Mnesia ya son coherentes
+            self._run(f"sudo mkdir -p {snap}/mnesia && sudo sh -c 'cd {SPOOL_DIR} && "
+                      f"tar --exclude=\"*.db*\" -cf - . | tar -C {snap}/mnesia -xf -'", p)
+            contents.append("mnesia/")
+
+        db = p["db_type"]
+        if db == "sqlite":
+            script = ("import sqlite3,sys;d=sqlite3.connect(sys.argv[2]);"
+                      "sqlite3.connect(sys.argv[1]).backup(d);d.close()")
+            rc, _ = self._run(f"sudo python3 -c {shlex.quote(script)} "
+                              f"{shlex.quote(p['db_path'])} {snap}/ejabberd.db", p)
+            contents.append("ejabberd.db")
+        else:
+            cred = self._sql_credentials(p, bdir)
+            target = f"{snap}/ejabberd.pgdump" if db == "pgsql" else f"{snap}/ejabberd.sql"
+            if db == "pgsql":
+                dump = f"env PGPASSFILE={cred} pg_dump {self._sql_conn_args(p)} -Fc -Z0 -f {target}"
+            else:
+                dump = (f"sh -c 'mysqldump --defaults-extra-file={cred} --single-transaction "
+                        f"--quick --routines {self._sql_conn_args(p)} > {target}'")
+            rc, _ = self._run(f"sudo {dump}", p)
+            contents.append(PurePosixPath(target).name)
+        if rc != 0:
+            raise RuntimeError("No se pudo volcar la base de datos")
+        return contents
+
+    def _sql_conn_args(self, p: dict) -> str:
+        """Argumentos de conexión de psql/pg_dump o mysql/mysqldump (sin contraseña)."""
+        database = shlex.quote(p["sql_database"] or p["db_path"])
+        if p["db_type"] == "pgsql":
+            port = f" -p {p['sql_port']}" if p["sql_port"] else ""
+            return f"-h {shlex.quote(p['sql_server'])}{port} -U {shlex.quote(p['sql_username'])} -d {database}"
+        port = f" -P {p['sql_port']}" if p["sql_port"] else ""
+        return f"-h {shlex.quote(p['sql_server'])}{port} -u {shlex.quote(p['sql_username'])} {database}"
+
+    def _sql_credentials(self, p: dict, directory: PurePosixPath) -> PurePosixPath:
+        """
+        Escribe la contraseña SQL en un archivo 600 (pgpass o my.cnf) para no
+        pasarla por la línea de comandos ni por el log.  La copia intermedia
+        se crea en un directorio privado, nunca en una ruta fija de /tmp.
+        """
+        if p["db_type"] == "pgsql":
+            esc = lambda s: str(s).replace("\\", "\\\\").replace(":", "\\:")
+            content = ":".join([esc(p["sql_server"]), str(p["sql_port"] or "*"),
+                                "*", esc(p["sql_username"]), esc(p["sql_password"])]) + "\n"
+            dest = directory / ".pgpass"
+        else:
+            content = f"[client]\npassword=\"{p['sql_password']}\"\n"
+            dest = directory / ".my.cnf"
+        private = self._private_dir(p)
+        try:
+            self.transport.write_text(private / dest.name, content)
+            self._run(f"sudo install -m 600 {private / dest.name} {dest}", p)
+        finally:
+            self.transport.remove(private)
+        return dest
+
+    def _do_restore(self, p: dict):
+        """Secuencia de restauración de una copia (completa + incrementales, en orden)."""
+        import json
+        archives = p["restore_from"]
+        if not archives:
+            raise RuntimeError("Indique las copias a restaurar (--restore o restore_from)")
+        self._begin()
+        self.log_msg("━━━  Restauración  ━━━", "section")
+        staging = PurePosixPath(p["backup_dir"]) / f"restore-{datetime.now():%Y%m%d-%H%M%S}"
+        self._run(f"sudo mkdir -p {staging} && sudo chmod 711 {p['backup_dir']} {staging}", p)
+        try:
+            for archive in archives:
+                pipeline = (f"{_decompressor(archive)} < {shlex.quote(archive)} | "
+                            f"tar -C {staging} --listed-incremental=/dev/null -xf -")
+                rc, _ = self._run(f"sudo bash -o pipefail -c {shlex.quote(pipeline)}", p)
+                if rc != 0:
+                    raise RuntimeError(f"No se pudo extraer {archive}")
+            rc, out = self.transport.run(f"sudo find {staging} -path '*/snapshot/manifest.json'",
+                                         _quiet, p["sudo_pass"])
+            text = self._read_remote(out.split()[0], p) if rc == 0 and out.strip() else None
+            if text is None:
+                raise RuntimeError("La copia no contiene snapshot/manifest.json")
+            manifest = json.loads(text)
+            src = {k: staging / v.lstrip("/") for k, v in manifest["paths"].items()}
+            self.log_msg(f"Copia de {manifest['host']} ({manifest['created']}, {manifest['db_type']})", "out")
+            if manifest["db_type"] != "sqlite" and manifest["db_type"] != p["db_type"]:
+                raise RuntimeError(f"La copia es de {manifest['db_type']}; configure db_type y "
+                                   f"los datos de conexión de ese backend para restaurarla")
+
+            self._run("sudo systemctl stop ejabberd", p)
+            self._run(f"sudo mkdir -p {EJABBERD_PREFIX}/etc && sudo cp -a {src['etc']}/. {EJABBERD_PREFIX}/etc/", p)
+            if "upload" in src:
+                self._run(f"sudo mkdir -p {UPLOAD_DIR} && sudo cp -a {src['upload']}/. {UPLOAD_DIR}/", p)
+            if "mnesia/" in manifest["contents"]:
+                self._run(f"sudo mkdir -p {SPOOL_DIR} && sudo cp -a {src['snapshot']}/mnesia/. {SPOOL_DIR}/", p)
+            self._restore_sql(p, manifest, src["snapshot"], staging)
+            self._step_permissions(p)
+
+            rc, _ = self._run("sudo systemctl start ejabberd", p)
+            if rc != 0:
+                raise RuntimeError("No se pudo arrancar ejabberd con los datos restaurados")
+            if "mnesia.backup" in manifest["contents"]:
+                self._run(f"sudo chown -R ejabberd:ejabberd {src['snapshot']}", p)
+                self._run(f"sudo -u ejabberd {EJABBERDCTL} started", p)
+                rc, _ = self._run(f"sudo -u ejabberd {EJABBERDCTL} restore {src['snapshot']}/mnesia.backup", p)
+                if rc != 0:
+                    raise RuntimeError("ejabberdctl restore falló")
+        finally:
+            self._run(f"sudo rm -rf {staging}", p)
+        self.log_msg("✔ Nodo restaurado.", "ok")
+
+    def _restore_sql(self, p: dict, manifest: dict, snap: PurePosixPath, staging: PurePosixPath):
+        """Devuelve la base SQL de la copia a su sitio."""
+        if manifest["db_type"] == "sqlite":
+            db = PurePosixPath(manifest["db_path"])
+            rc, _ = self._run(f"sudo mkdir -p {db.parent} && sudo install -o ejabberd -g ejabberd "
+                              f"-m 640 {snap}/ejabberd.db {db} && sudo rm -f {db}-wal {db}-shm", p)
+        elif manifest["db_type"] == "pgsql":
+            cred = self._sql_credentials(p, staging)
+            rc, _ = self._run(f"sudo env PGPASSFILE={cred} pg_restore --clean --if-exists "
+                              f"--no-owner {self._sql_conn_args(p)} {snap}/ejabberd.pgdump", p)
+        else:
+            cred = self._sql_credentials(p, staging)
+            rc, _ = self._run(f"sudo sh -c 'mysql --defaults-extra-file={cred} "
+                              f"{self._sql_conn_args(p)} < {snap}/ejabberd.sql'", p)
+        if rc != 0:
+            raise RuntimeError("No se pudo restaurar la base de datos")
+
+    # ── diario de pasos ──────────────────────────────────────────────────────
+
+    def _step_inputs(self, step: str, p: dict):
+        """Entradas de las que depende cada paso: si cambian, se repite."""
+        if step == "deps":
+            return [p["apt_mode"], p["apt_bundle_dir"], *self._apt_packages(p)]
+        if step == "otp":
+            return [p["otp_version"], OTP_CONFIGURE]
+        if step == "build":
+            return [p["vendor_mode"], p["vendor_dir"], p["otp_version"], *self._features(p)]
+        if step == "yaml":
+            return yaml_sections(self._render_yaml(p))   # sin la fecha de la cabecera
+        if step == "systemd":
+            inputs = [self._render_unit(p), p["enable_svc"], p["apply_mode"]]
+            if p["health_agent"] != "off":
+                inputs.append(_HEALTH_AGENT_SCRIPT)
+            return inputs
+        if step == "retention":
+            return [self._render_retention_script(p), self._render_retention_units(p)]
+        if step == "exporter":
+            return [p["exporter"], _EXPORTER_SCRIPT, self._render_exporter_unit(p)]
+        if step == "turn":
+            return [turn_listen_yaml(p), p["turn_secret"]]
+        if step == "upload":
+            return render_nginx_upload(p) if upload_offloaded(p) else ""
+        keys = {"etc_hosts": ("etc_hosts", "hosts_ip", "domain"), "cert": ("cn", "cert_days")}
+        return [p[k] for k in keys.get(step, ())]
+
+    def _journal_state(self) -> dict:
+        """Estado acumulado que los pasos siguientes necesitan (p. ej. _step_apply)."""
+        changes = getattr(self, "_config_changes", None)
+        return {
+            "config_changes": sorted(changes) if changes is not None else None,
+            "restart_reasons": list(self._restart_reasons),
+            "cert_changed": self._cert_changed,
+        }
+
+    def _journal_restore(self, state: dict):
+        changes = state["config_changes"]
+        self._config_changes = set(changes) if changes is not None else None
+        self._restart_reasons = list(state["restart_reasons"])
+        self._cert_changed = state["cert_changed"]
+
+    def _run_journaled(self, workflow: str, steps: list, p: dict):
+        """
+        Ejecuta steps [(nombre, función)] registrando cada paso terminado en
+        JOURNAL_PATH junto con la huella de sus entradas.  Los pasos ya
+        completados con las mismas entradas se omiten hasta el primero que
+        falte, haya cambiado o se fuerce (force_steps); desde ahí se ejecuta
+        todo lo que sigue.
+        """
+        import json
+        text = self._read_remote(JOURNAL_PATH, p)
+        try:
+            journal = json.loads(text) if text else {}
+        except ValueError:
+            self.log_msg(f"⚠ {JOURNAL_PATH} ilegible; se empieza desde el principio.", "warn")
+            journal = {}
+        previous = journal.get(workflow, [])
+        force = set(p["force_steps"])
+        done, resuming = [], True
+
+        for i, (name, fn) in enumerate(steps):
+            digest = step_digest(self._step_inputs(name, p))
+            entry = previous[i] if i < len(previous) else None
+            if resuming:
+                if entry is None or entry["step"] != name:
+                    reason = "sin completar"
+                elif name in force or "all" in force:
+                    reason = "forzado"
+                elif entry["inputs"] != digest:
+                    reason = "parámetros cambiados"
+                else:
+                    self._journal_restore(entry["state"])
+                    self._step_skipped(name, entry.get("title", name))
+                    self.log_msg(f"↷ {name}: completado el {entry['done']} con los mismos "
+                                 f"parámetros — se omite", "out")
+                    done.append(entry)
+                    continue
+                resuming = False
+                if done:
+                    self.log_msg(f"Reanudando desde '{name}' ({reason}).", "warn")
+
+            self._step_started(name)
+            before = self.last_section
+            try:
+                fn()
+            except Exception:
+                self.log_msg(f"El diario conserva {len(done)} pasos completados; relance para "
+                             f"continuar desde '{name}'.", "warn")
+                raise
+            finally:
+                self._step_started("")
+            title = self.last_section if self.last_section != before else ""   # sin sección propia
+            done.append({"step": name, "title": title, "inputs": digest,
+                         "done": datetime.now().isoformat(timespec="seconds"),
+                         "state": self._journal_state()})
+            journal[workflow] = done
+            self._journal_save(journal, p)
+
+    def _journal_save(self, journal: dict, p: dict):
+        import json
+        tmp = PurePosixPath("/tmp/ejabberd_journal.json")
+        self.transport.write_text(tmp, json.dumps(journal, indent=2))
+        self.transport.run(f"sudo install -D -m 600 {tmp} {JOURNAL_PATH}", _quiet, p["sudo_pass"])
+        self.transport.remove(tmp)
+
+    # ── pasos individuales ───────────────────────────────────────────────────
+
+    def _step_preflight(self, p: dict, build: bool):
+        """
+        Mide el nodo, rechaza hosts claramente insuficientes y completa en p
+        los límites que la configuración deja en automático.
+        """
+        import json
+        if not p["preflight"]:
+            return
+        self.log_msg("━━━  PASO 0: Comprobación previa del nodo  ━━━", "section")
+        data_dir = PurePosixPath(p["db_path"]).parent if p["db_type"] == "sqlite" else SPOOL_DIR
+        rc, out = self.transport.run(f"sudo python3 -c {shlex.quote(_PREFLIGHT_PROBE)} "
+                                     f"{data_dir} 200 64", _quiet, p["sudo_pass"])
+        try:
+            facts = json.loads(out.strip().splitlines()[-1]) if rc == 0 else None
+        except (ValueError, IndexError):
+            facts = None
+        if not facts:
+            self.log_msg("⚠ No se pudo medir el nodo (¿python3 ausente?); se usan los valores "
+                         "configurados.", "warn")
+            return
+        self.log_msg(f"{facts['cpus']} CPU · RAM {_fmt_bytes(facts['mem_total'])} "
+                     f"({_fmt_bytes(facts['mem_available'])} libre) · disco libre "
+                     f"{_fmt_bytes(facts['disk_free'])} en {facts['dir']}", "out")
+        self.log_msg(f"fsync 4 KiB: {facts['fsync_ms']:.2f} ms (p99 {facts['fsync_p99_ms']:.2f} ms) · "
+                     f"escritura secuencial {facts['write_mb_s']:.0f} MB/s · nr_open {facts['nr_open']}", "out")
+
+        plan = preflight_plan(facts, p, build)
+        for msg in plan["advice"]:
+            self.log_msg(f"⚠ {msg}", "warn")
+        if plan["fatal"]:
+            for msg in plan["fatal"]:
+                self.log_msg(f"✖ {msg}", "err")
+            raise RuntimeError("El nodo no alcanza el mínimo para ejabberd "
+                               "(preflight = false para instalar igualmente)")
+        p.update(plan["params"])
+        if p["max_sessions"]:
+            nofile, processes = session_limits(p["max_sessions"])
+            self.log_msg(f"Capacidad: {p['max_sessions']:,} sesiones → LimitNOFILE={nofile}, "
+                         f"ERL_PROCESSES={processes}", "out")
+        if "sql_pool_size" in plan["params"]:
+            self.log_msg(f"sql_pool_size: {p['sql_pool_size']} ({facts['cpus']} CPU)", "out")
+        self.log_msg("✔ Nodo apto.", "ok")
+
+    def _step_deps(self, p: dict):
+        """Instalación de dependencias del sistema."""
+        self.log_msg("━━━  PASO 1: Dependencias del sistema  ━━━", "section")
+        pkgs = " ".join(self._apt_packages(p))
+        if p["apt_mode"] == "online":
+            cmds = [
+                "sudo apt-get update -y",
+                "sudo apt-get install -y software-properties-common",
+                "sudo add-apt-repository -y ppa:rabbitmq/rabbitmq-erlang",
+                "sudo apt-get update -y",
+                "sudo apt-get install -y " + pkgs,
+            ]
+            if p["otp_version"]:
+                cmds[1:4] = []  # OTP se compila aparte: el PPA no hace falta
+            for cmd in cmds:
+                rc, _ = self._run(cmd, p)
+                if rc != 0:
+                    self.log_msg(f"⚠ Código de salida {rc} en: {cmd}", "warn")
+            self.log_msg("✔ Dependencias instaladas.", "ok")
+            return
+
+        if p["apt_mode"] == "prefetch":
+            self._apt_prefetch(p)
+        self._apt_verify_bundle(p)
+        # Solo el paquete local como origen: nada sale a la red
+        bundle = PurePosixPath(p["apt_bundle_dir"])
+        opts = (f"-o Dir::Etc::sourcelist={bundle}/bundle.list "
+                "-o Dir::Etc::sourceparts=- -o APT::Get::List-Cleanup=0")
+        for cmd in (f"sudo apt-get {opts} update -y",
+                    f"sudo apt-get {opts} install -y {pkgs}"):
+            rc, _ = self._run(cmd, p)
+            if rc != 0:
+                raise RuntimeError(f"Fallo instalando desde el paquete local: {cmd}")
+        self.log_msg(f"✔ Dependencias instaladas desde {bundle}.", "ok")
+
+    def _apt_prefetch(self, p: dict):
+        """
+        Descarga el cierre completo de .deb (dependencias recursivas incluidas)
+        a un repositorio plano local con su índice Packages.
+        """
+        self.log_msg("Descargando el cierre de paquetes al repositorio local…", "out")
+        bundle = PurePosixPath(p["apt_bundle_dir"])
+        pkgs = " ".join(self._apt_packages(p))
+        closure = (
+            "apt-cache depends --recurse --no-recommends --no-suggests --no-conflicts "
+            f"--no-breaks --no-replaces --no-enhances {pkgs} | grep '^[a-z0-9]' | sort -u"
+        )
+        cmds = [
+            "sudo apt-get update -y",
+            "sudo apt-get install -y software-properties-common apt-utils",
+            "sudo add-apt-repository -y ppa:rabbitmq/rabbitmq-erlang",
+            "sudo apt-get update -y",
+            f"sudo install -d -o $(id -un) {bundle}",
+            f"cd {bundle} && rm -f ./*.deb && {closure} | xargs -r -P 8 -I{{}} "
+            "sh -c 'apt-get download {} >/dev/null 2>&1 || echo \"⚠ sin candidato: {}\"'",
+            f"cd {bundle} && apt-ftparchive packages . > Packages && gzip -kf Packages",
+            f"echo 'deb [trusted=yes] file:{bundle} ./' > {bundle}/bundle.list",
+        ]
+        for cmd in cmds:
+            rc, _ = self._run(cmd, p)
+            if rc != 0:
+                raise RuntimeError(f"Fallo preparando el paquete local: {cmd}")
+        rc, out = self.transport.run(f"ls {bundle}/*.deb | wc -l", _quiet)
+        self.log_msg(f"✔ {out.strip() or '?'} paquetes .deb en {bundle}", "ok")
+
+    def _apt_verify_bundle(self, p: dict):
+        """Comprueba que cada .deb del índice existe y coincide con su SHA256."""
+        bundle = PurePosixPath(p["apt_bundle_dir"])
+        cmd = (
+            f"cd {bundle} && test -s Packages && test -s bundle.list && "
+            "awk '/^Filename:/{f=$2} /^SHA256:/{print $2 \"  \" f}' Packages "
+            "| sha256sum --quiet -c -"
+        )
+        rc, _ = self._run(cmd, p)
+        if rc != 0:
+            raise RuntimeError(f"El paquete apt local {bundle} falta o está corrupto")
+        self.log_msg("✔ Paquete apt local verificado (SHA256).", "ok")
+
+    def _source_dir(self) -> PurePosixPath:
+        """Directorio del código fuente de ejabberd en el destino."""
+        return PurePosixPath(self.transport.home()) / "ejabberd"
+
+    def _step_clone(self, p: dict) -> PurePosixPath:
+        """Clona o actualiza el repositorio ejabberd."""
+        self.log_msg("━━━  PASO 2: Obtención del código fuente  ━━━", "section")
+        ejdir = self._source_dir()
+        if self.transport.exists(ejdir):
+            self.log_msg(f"Directorio {ejdir} ya existe — haciendo git pull.", "warn")
+            self._run(f"git -C {ejdir} pull", p)
+        else:
+            rc, _ = self._run(
+                f"git clone https://github.com/processone/ejabberd.git {ejdir}", p
+            )
+            if rc != 0:
+                raise RuntimeError("Fallo al clonar el repositorio ejabberd.")
+        self.log_msg("✔ Código fuente listo.", "ok")
+        return ejdir
+
+    def _step_user(self, p: dict):
+        """Crea el usuario del sistema ejabberd."""
+        self.log_msg("━━━  PASO 3: Usuario del sistema  ━━━", "section")
+        rc, out = self._run("id ejabberd", p)
+        if rc == 0:
+            self.log_msg("Usuario 'ejabberd' ya existe.", "warn")
+        else:
+            self._run("sudo useradd -m -d /var/lib/ejabberd -s /bin/bash ejabberd", p)
+        self.log_msg("✔ Usuario listo.", "ok")
+
+    def _features(self, p: dict) -> list[str]:
+        """Funcionalidades de compilación para estos parámetros."""
+        return build_features(p, self._render_yaml(p))
+
+    def _apt_packages(self, p: dict) -> list[str]:
+        """Paquetes apt necesarios para compilar las funcionalidades elegidas."""
+        pkgs = list(APT_BASE_PACKAGES)
+        for feature in self._features(p):
+            pkgs += APT_FEATURE_PACKAGES.get(feature, [])
+        if p["otp_version"]:
+            pkgs = [pkg for pkg in pkgs if not pkg.startswith("erlang-")] + APT_OTP_PACKAGES
+        return pkgs
+
+    def _otp_env(self, p: dict) -> str:
+        """Prefijo de orden que antepone el OTP fijado al PATH (vacío si no hay)."""
+        if not p["otp_version"]:
+            return ""
+        return f"export PATH={otp_prefix(p['otp_version'])}/bin:$PATH && "
+
+    def _otp_check(self, p: dict) -> tuple[str, str] | None:
+        """(versión completa, emu_flavor) del OTP fijado, o None si no está instalado."""
+        prefix = otp_prefix(p["otp_version"])
+        cmd = (f"{prefix}/bin/erl -noshell -eval 'R = erlang:system_info(otp_release), "
+               f"{{ok, V}} = file:read_file(filename:join([code:root_dir(), \"releases\", R, \"OTP_VERSION\"])), "
+               f"io:format(\"~s ~s~n\", [string:trim(V), erlang:system_info(emu_flavor)]), halt().'")
+        rc, out = self.transport.run(cmd, _quiet, p["sudo_pass"])
+        fields = out.split()
+        return (fields[-2], fields[-1]) if rc == 0 and len(fields) >= 2 else None
+
+    def _step_otp(self, p: dict):
+        """
+        Instala el Erlang/OTP fijado en /opt/erlang/<versión>: desde la caché
+        (otp_cache_dir) si otro host ya lo compiló, o compilándolo con JIT.
+        """
+        version = p["otp_version"]
+        prefix = otp_prefix(version)
+        self.log_msg(f"━━━  PASO 1b: Erlang/OTP {version} (JIT)  ━━━", "section")
+        rc, out = self.transport.run(". /etc/os-release && echo $VERSION_CODENAME && uname -m",
+                                     _quiet, p["sudo_pass"])
+        fields = out.split()
+        if rc != 0 or len(fields) < 2:
+            raise RuntimeError("No se pudo identificar la distribución y la arquitectura")
+        archive = PurePosixPath(p["otp_cache_dir"]) / f"otp-{version}-{fields[-2]}-{fields[-1]}.tar.gz"
+
+        installed = self._otp_check(p)
+        if installed and installed[0] == version:
+            self.log_msg(f"OTP {version} ya instalado en {prefix}.", "warn")
+        elif self.transport.exists(archive):
+            rc, _ = self._run(f"cd {archive.parent} && sha256sum --quiet -c {archive.name}.sha256", p)
+            if rc != 0:
+                raise RuntimeError(f"Caché de OTP corrupta: {archive} no supera la comprobación sha256")
+            rc, _ = self._run(f"sudo tar -C / -xzf {archive}", p)
+            if rc != 0:
+                raise RuntimeError(f"No se pudo extraer {archive}")
+            self.log_msg(f"✔ OTP {version} restaurado desde la caché {archive.name}", "ok")
+        else:
+            self.log_msg(f"Sin caché para OTP {version}: se compila (solo el primer host).", "out")
+            work = PurePosixPath(self.transport.home()) / f"otp_src_{version}"
+            url = OTP_SOURCE_URL.format(v=version)
+            cmds = [
+                f"rm -rf {work} && mkdir -p {work} && curl -fsSL {url} | tar -C {work} --strip-components=1 -xzf -",
+                f"cd {work} && ./configure --prefix={prefix} {OTP_CONFIGURE}",
+                f"cd {work} && make -j$(nproc)",
+                f"cd {work} && sudo make install",
+            ]
+            for cmd in cmds:
+                rc, _ = self._run(cmd, p)
+                if rc != 0:
+                    raise RuntimeError(f"Fallo compilando OTP {version}: {cmd}")
+            part = f"{archive}.part"
+            rc, _ = self._run(
+                f"sudo mkdir -p {archive.parent} && sudo tar -C / -czf {part} {str(prefix).lstrip('/')} && "
+                f"sudo mv {part} {archive} && cd {archive.parent} && "
+                f"sudo sh -c 'sha256sum {archive.name} > {archive.name}.sha256'", p)
+            if rc != 0:
+                self.log_msg(f"⚠ No se pudo guardar la caché {archive}", "warn")
+            self._run(f"rm -rf {work}", p)
+
+        installed = self._otp_check(p)
+        if not installed or installed[0] != version:
+            raise RuntimeError(f"{prefix}/bin/erl no arranca o no es OTP {version} ({installed})")
+        if installed[1] != "jit":
+            raise RuntimeError(f"OTP {version} se ejecuta con el emulador '{installed[1]}', no con "
+                               f"JIT (¿arquitectura sin soporte?)")
+        profile = PurePosixPath("/tmp/erlang-otp.sh")
+        self.transport.write_text(profile, f'export PATH="{prefix}/bin:$PATH"\n')
+        self._run(f"sudo cp {profile} /etc/profile.d/erlang-otp.sh", p)
+        self.transport.remove(profile)
+        self.log_msg(f"✔ OTP {version} con JIT en {prefix} (añadido al PATH en /etc/profile.d).", "ok")
+
+    def _step_build(self, ejdir: PurePosixPath, p: dict):
+        """Configura y compila ejabberd."""
+        self.log_msg("━━━  PASO 4: Compilación  ━━━", "section")
+        start = time.monotonic()
+        features = self._compile(ejdir, p)
+        path = f"env PATH={otp_prefix(p['otp_version'])}/bin:$PATH " if p["otp_version"] else ""
+        cmd = f"cd {ejdir} && sudo {path}make install"
+        rc, _ = self._run(cmd, p)
+        if rc != 0:
+            raise RuntimeError(f"Fallo de compilación: {cmd}")
+        # Código nuevo: el próximo arranque vuelve a comprobar el esquema SQL
+        self._run(f"sudo rm -f {FAST_START_MARKER}", p)
+        p["sql_schema_ready"] = False
+        self.build_report = {"features": features, "seconds": time.monotonic() - start}
+        self._restart_reasons.append("binarios de ejabberd actualizados")
+        self.log_msg("✔ ejabberd compilado e instalado.", "ok")
+
+    def _compile(self, ejdir: PurePosixPath, p: dict) -> list[str]:
+        """./configure + make, reutilizando el vendor de dependencias si existe."""
+        features = self._features(p)
+        self.log_msg(f"Funcionalidades: {', '.join(features)}", "out")
+        cmd = (f"cd {ejdir} && {self._otp_env(p)}./autogen.sh && export CFLAGS='-O2 -std=gnu17' && "
+               f"./configure --prefix=/usr/local/ejabberd --enable-user=ejabberd "
+               f"{configure_flags(features)}")
+        rc, _ = self._run(cmd, p)
+        if rc != 0:
+            raise RuntimeError(f"Fallo de compilación: {cmd}")
+
+        archive = self._vendor_archive(ejdir, p)
+        vendored = archive is not None and self._vendor_restore(ejdir, archive, p)
+        # Con el vendor restaurado, rebar3/mix no deben tocar la red
+        offline = "export REBAR_OFFLINE=1 HEX_OFFLINE=1 && " if vendored else ""
+        cmd = f"cd {ejdir} && {self._otp_env(p)}{offline}make"
+        rc, _ = self._run(cmd, p)
+        if rc != 0:
+            raise RuntimeError(f"Fallo de compilación: {cmd}")
+        if archive is not None and (p["vendor_mode"] == "create" or not vendored):
+            self._vendor_save(ejdir, archive, p)
+        return features
+
+    # ── vendor de dependencias rebar3/mix ────────────────────────────────────
+
+    def _vendor_archive(self, ejdir: PurePosixPath, p: dict) -> PurePosixPath | None:
+        """
+        Ruta del archivo de vendor para este árbol: depende del commit de
+        ejabberd, de los lockfiles y, como incluye NIFs ya compilados, de la
+        versión de OTP y la arquitectura.
+        """
+        if p["vendor_mode"] == "off":
+            return None
+        base = PurePosixPath(
+            p["vendor_dir"] or f"{self.transport.home()}/.cache/ejabberd-installer/vendor"
+        )
+        probe = (
+            f"cd {ejdir} && {self._otp_env(p)}git rev-parse HEAD && "
+            "cat rebar.lock mix.lock 2>/dev/null | sha256sum | cut -c1-12 && "
+            "erl -noshell -eval 'io:format(\"~s~n\", [erlang:system_info(otp_release)]), halt().' && "
+            "uname -m"
+        )
+        rc, out = self.transport.run(probe, _quiet)
+        fields = out.split()
+        if rc != 0 or len(fields) < 4:
+            raise RuntimeError("No se pudo calcular la clave del vendor (¿git/erl disponibles?)")
+        commit, lock, otp, arch = fields[-4:]
+        return base / f"ejabberd-{commit[:12]}-{lock}-otp{otp}-{arch}.tar.gz"
+
+    def _vendor_restore(self, ejdir: PurePosixPath, archive: PurePosixPath, p: dict) -> bool:
+        """Verifica y extrae el vendor en el árbol de fuentes."""
+        if not self.transport.exists(archive):
+            if p["vendor_mode"] == "use":
+                raise RuntimeError(f"No existe el vendor {archive} (vendor_mode = use)")
+            self.log_msg("Sin vendor para esta versión: se descargarán las dependencias.", "warn")
+            return False
+        if p["vendor_mode"] == "create":
+            return False
+        rc, _ = self._run(f"cd {archive.parent} && sha256sum --quiet -c {archive.name}.sha256", p)
+        if rc != 0:
+            raise RuntimeError(f"Vendor corrupto: {archive} no supera la comprobación sha256")
+        rc, _ = self._run(f"tar -C {ejdir} -xzf {archive}", p)
+        if rc != 0:
+            raise RuntimeError(f"No se pudo extraer el vendor {archive}")
+        self.log_msg(f"✔ Dependencias y NIFs restaurados desde {archive.name}", "ok")
+        return True
+
+    def _vendor_save(self, ejdir: PurePosixPath, archive: PurePosixPath, p: dict):
+        """Empaqueta las dependencias resueltas y compiladas del árbol."""
+        part = f"{archive}.part"
+        cmd = (
+            f"mkdir -p {archive.parent} && cd {ejdir} && "
+            f"tar --exclude='_build/*/lib/ejabberd' -czf {part} $(ls -d deps _build 2>/dev/null) && "
+            f"mv {part} {archive} && cd {archive.parent} && "
+            f"sha256sum {archive.name} > {archive.name}.sha256"
+        )
+        rc, _ = self._run(cmd, p)
+        if rc != 0:
+            self.transport.remove(part)
+            self.log_msg("⚠ No se pudo guardar el vendor de dependencias.", "warn")
+            return
+        self.log_msg(f"✔ Vendor guardado en {archive}", "ok")
+
+    # ── versiones instaladas en paralelo (actualización escalonada) ──────────
+
+    def _release_build(self, p: dict) -> tuple[str, PurePosixPath]:
+        """
+        Compila la versión actual del repositorio una sola vez y deja lib/ y
+        ejabberdctl empaquetados en release_cache_dir.  Devuelve (versión, archivo).
+        """
+        self.log_msg("━━━  Compilación de la versión  ━━━", "section")
+        ejdir = self._step_clone(p)
+        probe = (f"{self._otp_env(p)}git -C {ejdir} describe --tags --always && "
+                 "erl -noshell -eval 'io:format(\"~s~n\", [erlang:system_info(otp_release)]), halt().' && "
+                 "uname -m")
+        rc, out = self.transport.run(probe, _quiet, p["sudo_pass"])
+        fields = out.split()
+        if rc != 0 or len(fields) < 3:
+            raise RuntimeError("No se pudo identificar la versión (¿git/erl disponibles?)")
+        release, otp, arch = fields[-3:]
+        archive = PurePosixPath(p["release_cache_dir"]) / f"ejabberd-{release}-otp{otp}-{arch}.tar.gz"
+        if self.transport.exists(archive):
+            self.log_msg(f"✔ {archive.name} ya está en la caché: no se recompila.", "ok")
+            return release, archive
+
+        self._compile(ejdir, p)
+        stage = PurePosixPath(self.transport.home()) / "ejabberd-stage"
+        path = f"env PATH={otp_prefix(p['otp_version'])}/bin:$PATH " if p["otp_version"] else ""
+        part = f"{archive}.part"
+        cmds = [
+            f"sudo rm -rf {stage} && cd {ejdir} && sudo {path}make install DESTDIR={stage}",
+            f"sudo mkdir -p {archive.parent} && sudo tar -C {stage}{EJABBERD_PREFIX} -czf {part} "
+            f"{' '.join(RELEASE_PATHS)} && sudo mv {part} {archive} && cd {archive.parent} && "
+            f"sudo sh -c 'sha256sum {archive.name} > {archive.name}.sha256'",
+        ]
+        for cmd in cmds:
+            rc, _ = self._run(cmd, p)
+            if rc != 0:
+                raise RuntimeError(f"No se pudo preparar la versión {release}: {cmd}")
+        self._run(f"sudo rm -rf {stage}", p)
+        self.log_msg(f"✔ Versión {release} en {archive}", "ok")
+        return release, archive
+
+    def _release_install(self, release: str, archive: PurePosixPath, p: dict):
+        """Extrae la versión junto a la actual, sin tocar el nodo en marcha."""
+        self.log_msg(f"━━━  Instalación de {release}  ━━━", "section")
+        target = RELEASES_DIR / release
+        if self.transport.exists(target / "lib"):
+            self.log_msg(f"{target} ya existe.", "warn")
+            return
+        if not self.transport.exists(archive):
+            raise RuntimeError(f"{archive} no es visible en este host: release_cache_dir "
+                               f"debe ser un montaje compartido")
+        rc, _ = self._run(f"cd {archive.parent} && sha256sum --quiet -c {archive.name}.sha256", p)
+        if rc != 0:
+            raise RuntimeError(f"{archive} no supera la comprobación sha256")
+        rc, _ = self._run(f"sudo mkdir -p {target}.part && sudo tar -C {target}.part -xzf {archive} && "
+                          f"sudo mv {target}.part {target}", p)
+        if rc != 0:
+            self._run(f"sudo rm -rf {target}.part", p)
+            raise RuntimeError(f"No se pudo extraer {archive}")
+        self.log_msg(f"✔ {release} instalada en {target}", "ok")
+
+    def _release_switch(self, release: str, p: dict) -> str:
+        """
+        Apunta el enlace current de RELEASES_DIR a la versión (con el nodo
+        parado) y devuelve la anterior.  La primera vez convierte la instalación
+        en sitio en la versión 'inicial' y enlaza lib/ y ejabberdctl al prefijo.
+        """
+        current = RELEASES_DIR / "current"
+        rc, out = self.transport.run(f"readlink {current}", _quiet, p["sudo_pass"])
+        previous = out.strip() if rc == 0 else ""
+        if not previous:
+            previous = "inicial"
+            initial = RELEASES_DIR / previous
+            # Enlaces relativos al prefijo: /usr/local/ejabberd/lib → ../ejabberd-releases/current/lib
+            up = {path: "../" * (path.count("/") + 1) + f"{RELEASES_DIR.name}/current/{path}"
+                  for path in RELEASE_PATHS}
+            cmds = [f"sudo mkdir -p {initial}/sbin {EJABBERD_PREFIX}/sbin"]
+            cmds += [f"sudo mv {EJABBERD_PREFIX}/{path} {initial}/{path}" for path in RELEASE_PATHS
+                     if self.transport.exists(EJABBERD_PREFIX / path)]
+            cmds += [f"sudo ln -sfn {up[path]} {EJABBERD_PREFIX}/{path}" for path in RELEASE_PATHS]
+            for cmd in cmds:
+                rc, _ = self._run(cmd, p)
+                if rc != 0:
+                    raise RuntimeError(f"No se pudo convertir la instalación en sitio: {cmd}")
+        rc, _ = self._run(f"sudo ln -sfn {release} {current}.new && sudo mv -T {current}.new {current}", p)
+        if rc != 0:
+            raise RuntimeError(f"No se pudo activar {release}")
+        # Código nuevo: el próximo arranque vuelve a comprobar el esquema SQL
+        self._run(f"sudo rm -f {FAST_START_MARKER}", p)
+        self.log_msg(f"✔ {current} → {release} (antes: {previous})", "ok")
+        return previous
+
+    def _health_check(self, release: str, p: dict) -> list[str]:
+        """Comprobaciones tras el reinicio; devuelve los problemas (vacía si el nodo está sano)."""
+        self.log_msg("━━━  Comprobaciones de salud  ━━━", "section")
+        problems = []
+        wait = (f"sudo sh -c 'for i in $(seq {HEALTH_TIMEOUT // 2}); do "
+                f"{EJABBERDCTL} status >/dev/null 2>&1 && exit 0; sleep 2; done; exit 1'")
+        rc, _ = self._run(wait, p)
+        if rc != 0:
+            problems.append(f"ejabberdctl status no responde tras {HEALTH_TIMEOUT} s")
+        rc, out = self.transport.run(f"readlink {RELEASES_DIR}/current", _quiet, p["sudo_pass"])
+        if out.strip() != release:
+            problems.append(f"la versión activa es {out.strip() or '?'}, no {release}")
+        connect = "import socket; socket.create_connection(('127.0.0.1', 5222), timeout=5).close()"
+        rc, _ = self.transport.run(f"python3 -c {shlex.quote(connect)}", _quiet, p["sudo_pass"])
+        if rc != 0:
+            problems.append("el puerto 5222 no acepta conexiones")
+        for msg in problems:
+            self.log_msg(f"✖ {msg}", "err")
+        if not problems:
+            self.log_msg(f"✔ Nodo sano con {release}.", "ok")
+        return problems
+
+    def _release_prune(self, release: str, previous: str, p: dict):
+        """Conserva RELEASE_KEEP versiones: la activa, la anterior y las más recientes."""
+        self._run(f"cd {RELEASES_DIR} && ls -1t | grep -vx -e current -e {release} -e {previous} "
+                  f"-e '.*\\.part' | tail -n +{RELEASE_KEEP - 1} | xargs -r sudo rm -rf", p)
+
+    def _report_footprint(self, p: dict):
+        """Muestra tiempo de compilación, tamaño instalado y memoria del nodo."""
+        report = getattr(self, "build_report", None) or {}
+        self.log_msg("━━━  Huella de la instalación  ━━━", "section")
+        if report:
+            self.log_msg(f"Funcionalidades compiladas: {', '.join(report['features'])}", "out")
+            self.log_msg(f"Tiempo de compilación:      {report['seconds']:.0f} s", "out")
+        rc, out = self.transport.run(f"sudo du -sb {EJABBERD_PREFIX}/lib/", _quiet, p["sudo_pass"])
+        if rc == 0 and out.split():
+            report["install_bytes"] = int(out.split()[0])
+            self.log_msg(f"Tamaño instalado (lib/):    {_fmt_bytes(report['install_bytes'])}", "out")
+        rc, out = self.transport.run("ps -C beam.smp -o rss=", _quiet)
+        rss = [int(x) for x in out.split() if x.isdigit()]
+        if rc == 0 and rss:
+            report["rss_bytes"] = sum(rss) * 1024
+            self.log_msg(f"Memoria del nodo (RSS):     {_fmt_bytes(report['rss_bytes'])}", "out")
+        self.build_report = report
+
+    def _tls_probe(self, p: dict, wait: float = 0.0) -> dict:
+        """
+        Mide en el nodo el tiempo hasta tener canal cifrado en cada listener
+        c2s.  Los listeners que no responden se omiten (dict vacío si ninguno).
+        """
+        import json
+        if not p["tls_probe"]:
+            return {}
+        targets = [("STARTTLS :5222", 5222, "starttls")]
+        if p["direct_tls"]:
+            targets.append((f"TLS directo :{DIRECT_TLS_PORT}", DIRECT_TLS_PORT, "direct"))
+        results = {}
+        for label, port, mode in targets:
+            cmd = (f"python3 -c {shlex.quote(_TLS_PROBE)} "
+                   f"{port} {mode} {shlex.quote(p['domain'])} 5 {wait}"
+                   + (" proxy" if p["proxy_protocol"] else ""))
+            rc, out = self.transport.run(cmd, _quiet, p["sudo_pass"])
+            try:
+                data = json.loads(out.strip().splitlines()[-1])
+            except (ValueError, IndexError):
+                continue
+            if rc == 0 and "error" not in data:
+                results[label] = data
+        return results
+
+    def _report_tls(self, p: dict, before: dict):
+        """Compara el handshake TLS tras aplicar con la medida previa."""
+        if not p["tls_probe"]:
+            return
+        self.log_msg("━━━  Handshake TLS (medido en el nodo)  ━━━", "section")
+        after = self._tls_probe(p, wait=15)
+        if not after:
+            self.log_msg("⚠ No se pudo medir el handshake (¿python3 ausente o servicio parado?).", "warn")
+            return
+        for label, r in after.items():
+            line = (f"{label}: {r['full_ms']:.1f} ms completo, {r['resumed_ms']:.1f} ms "
+                    f"reanudado ({r['version']}, {r['cipher']})")
+            if label in before:
+                line += f" — antes {before[label]['full_ms']:.1f} ms"
+            self.log_msg(line, "out")
+            if not r["reused"]:
+                self.log_msg(f"⚠ {label}: el servidor no reanudó la sesión TLS.", "warn")
+        baseline = after.get("STARTTLS :5222")
+        direct = after.get(f"TLS directo :{DIRECT_TLS_PORT}")
+        if baseline and direct:
+            saved = baseline["full_ms"] - direct["full_ms"]
+            self.log_msg(f"✔ TLS directo ahorra {saved:.1f} ms por conexión frente a STARTTLS.", "ok")
+        if p["direct_tls"]:
+            self.log_msg(f"Publique el registro SRV para que los clientes lo usen: "
+                         f"_xmpps-client._tcp.{p['domain']}. IN SRV 5 0 "
+                         f"{DIRECT_TLS_PORT} {p['domain']}.", "warn")
+
+    def _render_yaml(self, p: dict) -> str:
+        """Genera el contenido de ejabberd.yml a partir de los parámetros."""
+        # La lista de hosts ocupa varias líneas: se añade fuera de dedent()
+        # para no romper la indentación común del resto del documento.
+        header = textwrap.dedent(f"""\
+            ###
+            ### ejabberd.yml — generado por Ejabberd Installer
+            ### {datetime.now().isoformat(timespec='seconds')}
+            ###
+
+            hosts:
+        """) + p['domains_yaml'] + "\n\n"
+
+        body = log_options_yaml(p) + "\n" + textwrap.dedent("""\
+            certfiles:
+              - "/usr/local/ejabberd/etc/ejabberd/server.pem"
+
+        """)
+        tls_globals = "s2s_use_starttls: optional\n"
+        tls_globals += tls_options_yaml(p["tls_profile"], "c2s_")
+        tls_globals += tls_options_yaml(p["tls_profile"], "s2s_") + "\n"
+
+        return header + body + self._render_listen(p) + tls_globals + textwrap.dedent(f"""\
+            acl:
+              local:
+                user_regexp: ""
+              loopback:
+                ip:
+                  - 127.0.0.0/8
+                  - ::1/128
+              admin:
+                user:
+                  - "admin@{p['domain']}"
+
+            access_rules:
+              local:
+                allow: local
+              c2s:
+                deny: blocked
+                allow: all
+              announce:
+                allow: admin
+              configure:
+                allow: admin
+              muc_create:
+                allow: local
+              pubsub_createnode:
+                allow: local
+              register:
+                allow: all
+              trusted_network:
+                allow: loopback
+
+            api_permissions:
+              "console commands":
+                from:
+                  - ejabberd_ctl
+                who: all
+                what: "*"
+              "admin access":
+                who:
+                  access:
+                    allow:
+                      acl: loopback
+                      acl: admin
+                what:
+                  - "*"
+                  - "!stop"
+                  - "!start"
+              "public commands":
+                who:
+                  ip: 127.0.0.1/8
+                what:
+                  - status
+                  - connected_users_number
+
+            shaper:
+              normal:
+                rate: {p['c2s_rate']}
+                burst_size: {p['c2s_burst']}
+              fast: 100000
+
+            shaper_rules:
+              max_user_sessions: {p['max_user_sessions']}
+              max_user_offline_messages:
+                5000: admin
+                {p['max_offline_messages']}: all
+              c2s_shaper:
+                none: admin
+                normal: all
+              s2s_shaper: fast
+        """) + upload_quota_yaml(p) + "\n" + sql_options_yaml(p) + "\nacme:\n  auto: false\n\n" + self._render_modules(p)
+
+    def _render_modules(self, p: dict) -> str:
+        """Sección modules: solo con los módulos seleccionados y sus dependencias."""
+        out = "modules:\n"
+        for mod in p["modules"]:
+            opts = textwrap.dedent(MODULES[mod][0]).strip()
+            if mod == "mod_http_upload" and upload_offloaded(p):
+                opts += "\n" + upload_module_yaml(p).strip()
+            if mod == "mod_stun_disco" and p["turn"]:
+                opts = f'secret: "{p["turn_secret"]}"'
+            if opts:
+                out += f"  {mod}:\n" + textwrap.indent(opts, "    ") + "\n"
+            else:
+                out += f"  {mod}: {{}}\n"
+        if upload_offloaded(p):
+            out += f"  mod_http_upload_quota:\n    max_days: {p['upload_max_days']}\n"
+        return out
+
+    def _render_listen(self, p: dict) -> str:
+        """Sección listen: de ejabberd.yml (STARTTLS, TLS directo opcional, s2s y HTTP)."""
+        c2s = textwrap.indent(textwrap.dedent(f"""\
+            ip: "::"
+            module: ejabberd_c2s
+            max_stanza_size: {p['max_stanza_size']}
+            shaper: c2s_shaper
+            access: c2s
+        """), "    ")
+        # Detrás de HAProxy: la IP real del cliente llega en la cabecera PROXY
+        proxy = "    use_proxy_protocol: true\n" if p["proxy_protocol"] else ""
+        c2s += proxy
+        tls_opts = tls_options_yaml(p["tls_profile"], indent=4)
+        out = "listen:\n  -\n    port: 5222\n" + c2s + "    starttls_required: true\n"
+        if p["direct_tls"]:
+            out += f"  -\n    port: {DIRECT_TLS_PORT}\n" + c2s + "    tls: true\n" + tls_opts
+        out += textwrap.indent(textwrap.dedent("""\
+            -
+              port: 5269
+              ip: "::"
+              module: ejabberd_s2s_in
+              max_stanza_size: 524288
+            -
+              port: 5280
+              ip: "::"
+              module: ejabberd_http
+        """), "  ") + proxy + textwrap.indent(http_handlers_yaml(p["modules"]), "    ")
+        out += textwrap.indent(textwrap.dedent("""\
+            -
+              port: 5443
+              ip: "::"
+              module: ejabberd_http
+              tls: true
+        """), "  ") + proxy + textwrap.indent(http_handlers_yaml(p["modules"], captcha=False), "    ")
+        if p["turn"]:
+            out += tls_opts + turn_listen_yaml(p)
+            tls_opts = ""
+        if p["proxy_protocol"] and "mod_http_api" in p["modules"]:
+            out += tls_opts + textwrap.indent(textwrap.dedent(f"""\
+                -
+                  port: {LOCAL_API_PORT}
+                  ip: "127.0.0.1"
+                  module: ejabberd_http
+                  request_handlers:
+                    /api: mod_http_api
+            """), "  ")
+            return out + "\n"
+        return out + tls_opts + "\n"
+
+    def _step_yaml(self, p: dict):
+        """Escribe/actualiza ejabberd.yml con los parámetros del usuario."""
+        self.log_msg("━━━  PASO 5: Configuración ejabberd.yml  ━━━", "section")
+        conf_path = CONF_PATH
+        yaml_content = self._render_yaml(p)
+
+        problems = lint_config(yaml_content)
+        if problems:
+            for msg in problems:
+                self.log_msg(f"✖ {msg}", "err")
+            raise RuntimeError("La configuración generada no es válida; no se aplica.")
+
+        kb = session_kb(p["modules"])
+        self.log_msg(f"Módulos ({p['module_preset']}): {len(p['modules'])} cargados, "
+                     f"~{kb:.0f} KB por sesión (≈ {1048576 / kb:,.0f} sesiones por GiB)", "out")
+
+        old = self._read_remote(conf_path, p)
+        self._config_changes = diff_config(old, yaml_content) if old is not None else None
+        if self._config_changes == set():
+            self.log_msg("ejabberd.yml sin cambios.", "warn")
+            return
+        if self._config_changes:
+            self.log_msg("Secciones modificadas: " + ", ".join(sorted(self._config_changes)), "out")
+
+        tmp = PurePosixPath("/tmp/ejabberd_installer_tmp.yml")
+        self.transport.write_text(tmp, yaml_content)
+
+        conf_dir = conf_path.parent
+        rc, _ = self._run(f"sudo mkdir -p {conf_dir}", p)
+        if old is not None:
+            self._run(f"sudo cp -p {conf_path} {conf_path}.bak", p)
+        rc, _ = self._run(f"sudo cp {tmp} {conf_path}", p)
+        self.transport.remove(tmp)
+
+        if rc != 0:
+            raise RuntimeError("No se pudo escribir ejabberd.yml")
+        self.log_msg(f"✔ {conf_path} escrito correctamente.", "ok")
+
+    def _step_cert(self, p: dict):
+        """Genera certificado TLS autofirmado y crea server.pem."""
+        self.log_msg("━━━  PASO 6: Certificado TLS  ━━━", "section")
+        domain = p["cn"]
+        days   = p["cert_days"]
+        work   = PurePosixPath("/tmp/ejabberd_certs")
+        self._run(f"mkdir -p {work}", p)
+
+        key_file = work / "ejabberd.key"
+        crt_file = work / "ejabberd.crt"
+        pem_dest = "/usr/local/ejabberd/etc/ejabberd/server.pem"
+
+        cmds = [
+            (
+                f'openssl req -x509 -newkey rsa:4096 -sha256 -days {days} -nodes '
+                f'-keyout {key_file} -out {crt_file} '
+                f'-subj "/CN={domain}" '
+                f'-addext "subjectAltName=DNS:{domain}"'
+            ),
+            f"cat {key_file} {crt_file} | sudo tee {pem_dest} > /dev/null",
+            f"sudo chmod 600 {pem_dest}",
+        ]
+        for cmd in cmds:
+            rc, _ = self._run(cmd, p)
+            if rc != 0:
+                raise RuntimeError(f"Fallo al generar certificado: {cmd}")
+
+        self.transport.remove(work)
+        self._cert_changed = True
+        self.log_msg(f"✔ server.pem generado en {pem_dest}", "ok")
+
+    def _render_unit(self, p: dict) -> str:
+        """Genera la unidad systemd de ejabberd."""
+        if p["log_journald"]:
+            return self._unit_watchdog(self._unit_limits(self._render_unit_foreground(p), p), p)
+        return self._unit_watchdog(self._unit_limits(textwrap.dedent("""\
+            [Unit]
+            Description=ejabberd XMPP Server
+            Requires=network.target
+            After=network.target
+
+            [Service]
+            Type=forking
+            User=ejabberd
+            Group=ejabberd
+            ExecStart=/usr/local/ejabberd/sbin/ejabberdctl start
+            ExecStop=/usr/local/ejabberd/sbin/ejabberdctl stop
+            Restart=on-failure
+            StartLimitInterval=3
+            StartLimitBurst=100
+
+            [Install]
+            WantedBy=multi-user.target
+        """), p), p)
+
+    def _unit_limits(self, unit: str, p: dict) -> str:
+        """
+        Añade a [Service] los límites para max_sessions: descriptores de archivo
+        y las variables que ejabberdctl pasa a la BEAM (+Q puertos, +P procesos).
+        """
+        if not p["max_sessions"]:
+            return unit
+        nofile, processes = session_limits(p["max_sessions"])
+        limits = (f"LimitNOFILE={nofile}\n"
+                  f"Environment=ERL_MAX_PORTS={nofile} ERL_PROCESSES={processes}\n")
+        return unit.replace("\n[Install]", f"{limits}\n[Install]", 1)
+
+    def _unit_watchdog(self, unit: str, p: dict) -> str:
+        """
+        Con health_agent, el agente de salud arranca tras ejabberd dentro de su
+        cgroup; en modo restart sus latidos alimentan el watchdog (WatchdogSec)
+        y, si dejan de llegar, Restart=on-failure reinicia el nodo.
+        """
+        if p["health_agent"] == "off":
+            return unit
+        lines = "" if "NotifyAccess=all" in unit else "NotifyAccess=all\n"
+        if p["health_agent"] == "restart":
+            lines += f"WatchdogSec={health_watchdog_sec(p)}\n"
+        lines += (f"ExecStartPost=-/bin/sh -c '/usr/bin/python3 {HEALTH_AGENT_PATH} "
+                  f"{health_agent_args(p)} &'\n")
+        return unit.replace("\n[Install]", f"{lines}\n[Install]", 1)
+
+    def _render_unit_foreground(self, p: dict) -> str:
+        """
+        Unidad con ejabberd en primer plano (Type=notify): la salida de consola
+        va a journald.  ejabberd sigue escribiendo además sus archivos de log.
+        """
+        unit = textwrap.dedent(f"""\
+            [Unit]
+            Description=ejabberd XMPP Server
+            Requires=network.target
+            After=network.target
+
+            [Service]
+            Type=notify
+            NotifyAccess=all
+            User=ejabberd
+            Group=ejabberd
+            ExecStart=/bin/sh -c '{EJABBERDCTL} foreground'
+            ExecStop=/bin/sh -c '{EJABBERDCTL} stop && {EJABBERDCTL} stopped'
+            ExecReload={EJABBERDCTL} reload_config
+            StandardOutput=journal
+            StandardError=journal
+            SyslogIdentifier=ejabberd
+            TimeoutSec=300
+            Restart=on-failure
+            StartLimitInterval=3
+            StartLimitBurst=100
+        """)
+        if p["log_burst_limit_count"]:
+            unit += (f"LogRateLimitIntervalSec={p['log_burst_limit_window_time']}s\n"
+                     f"LogRateLimitBurst={p['log_burst_limit_count']}\n")
+        return unit + "\n[Install]\nWantedBy=multi-user.target\n"
+
+    def _step_systemd(self, p: dict):
+        """Crea y activa el servicio systemd."""
+        self.log_msg("━━━  PASO 8: Servicio systemd  ━━━", "section")
+        if p["health_agent"] != "off":
+            old = self._read_remote(HEALTH_AGENT_PATH, p)
+            if old is not None and old != _HEALTH_AGENT_SCRIPT:
+                self._restart_reasons.append("agente de salud actualizado")
+            tmp = PurePosixPath("/tmp/ejabberd-health")
+            self.transport.write_text(tmp, _HEALTH_AGENT_SCRIPT)
+            self._run(f"sudo cp {tmp} {HEALTH_AGENT_PATH}", p)
+            self._run(f"sudo chmod 755 {HEALTH_AGENT_PATH}", p)
+            self.transport.remove(tmp)
+        unit = self._render_unit(p)
+        dest = "/etc/systemd/system/ejabberd.service"
+        old = self._read_remote(dest, p)
+        if old is not None and old != unit:
+            self._restart_reasons.append("unidad systemd modificada")
+        tmp = PurePosixPath("/tmp/ejabberd.service")
+        self.transport.write_text(tmp, unit)
+        self._run(f"sudo cp {tmp} {dest}", p)
+        self._run("sudo systemctl daemon-reload", p)
+        self.transport.remove(tmp)
+        self.log_msg(f"✔ Servicio escrito en {dest}", "ok")
+        if p["health_agent"] == "restart":
+            self.log_msg(f"✔ Agente de salud con watchdog: reinicio tras {p['health_grace']} s "
+                         f"por encima de los umbrales (WatchdogSec={health_watchdog_sec(p)}).", "ok")
+        elif p["health_agent"] == "flag":
+            self.log_msg(f"✔ Agente de salud en modo flag: marca el nodo en {HEALTH_STATE} "
+                         f"y en el STATUS del servicio, sin reiniciarlo.", "ok")
+
+        if p["enable_svc"]:
+            self._run("sudo systemctl enable ejabberd", p)
+            self.log_msg("✔ Servicio ejabberd habilitado.", "ok")
+            self._step_apply(p)
+
+    # ── retención de MAM y mensajes offline ──────────────────────────────────
+
+    RETENTION_SCRIPT = EJABBERD_PREFIX / "sbin/ejabberd-retention"
+    RETENTION_UNIT   = "/etc/systemd/system/ejabberd-retention"
+
+    def _render_retention_script(self, p: dict) -> str:
+        """Script que lanza los borrados por lotes y espera a que terminen."""
+        batch, rate = p["retention_batch"], p["retention_rate"]
+        jobs = []
+        if p["mam_retention_days"] and "mod_mam" in p["modules"]:
+            jobs.append(f'    "$CTL" delete_old_mam_messages_batch "$host" all '
+                        f'{p["mam_retention_days"]} {batch} {rate}\n'
+                        f'    wait_for delete_old_mam_messages_status "$host"\n')
+        if p["offline_retention_days"] and "mod_offline" in p["modules"]:
+            jobs.append(f'    "$CTL" delete_old_messages_batch "$host" '
+                        f'{p["offline_retention_days"]} {batch} {rate}\n'
+                        f'    wait_for delete_old_messages_status "$host"\n')
+        return textwrap.dedent(f"""\
+            #!/bin/sh
+            # Retención de MAM y mensajes offline — generado por Ejabberd Installer
+            # Los comandos *_batch borran por lotes a ritmo limitado ({rate} filas/min)
+            # para no bloquear la base de datos.
+            set -eu
+            CTL={EJABBERDCTL}
+
+            wait_for() {{
+                while "$CTL" "$1" "$2" | grep -q "in progress"; do sleep 30; done
+                "$CTL" "$1" "$2"
+            }}
+
+            for host in $("$CTL" registered_vhosts); do
+        """) + ("".join(jobs) or "    :\n") + "done\n"
+
+    def _render_retention_units(self, p: dict) -> dict[str, str]:
+        """Unidades .service (oneshot) y .timer de la retención."""
+        service = textwrap.dedent(f"""\
+            [Unit]
+            Description=ejabberd: borrado de mensajes antiguos (MAM y offline)
+            Requisite=ejabberd.service
+            After=ejabberd.service
+
+            [Service]
+            Type=oneshot
+            User=ejabberd
+            Group=ejabberd
+            ExecStart={self.RETENTION_SCRIPT}
+            TimeoutStartSec=6h
+        """)
+        timer = textwrap.dedent(f"""\
+            [Unit]
+            Description=ejabberd: retención programada de mensajes
+
+            [Timer]
+            OnCalendar={p['retention_schedule']}
+            RandomizedDelaySec=15min
+            Persistent=true
+
+            [Install]
+            WantedBy=timers.target
+        """)
+        return {f"{self.RETENTION_UNIT}.service": service, f"{self.RETENTION_UNIT}.timer": timer}
+
+    def _step_retention(self, p: dict):
+        """Instala (o retira) el timer systemd de retención de mensajes."""
+        self.log_msg("━━━  PASO 9: Retención de mensajes  ━━━", "section")
+        timer = f"{self.RETENTION_UNIT}.timer"
+        if not (p["mam_retention_days"] or p["offline_retention_days"]):
+            self._run(f"sudo test -f {timer} && sudo systemctl disable --now "
+                      f"ejabberd-retention.timer || true", p)
+            self.log_msg("Retención desactivada: el archivo MAM y los mensajes offline "
+                         "crecen sin límite.", "warn")
+            return self._db_report(p)
+
+        files = {str(self.RETENTION_SCRIPT): self._render_retention_script(p),
+                 **self._render_retention_units(p)}
+        for dest, content in files.items():
+            tmp = PurePosixPath("/tmp") / PurePosixPath(dest).name
+            self.transport.write_text(tmp, content)
+            self._run(f"sudo cp {tmp} {dest}", p)
+            self.transport.remove(tmp)
+        self._run(f"sudo chmod 755 {self.RETENTION_SCRIPT}", p)
+        self._run("sudo systemctl daemon-reload", p)
+        rc, _ = self._run("sudo systemctl enable --now ejabberd-retention.timer", p)
+        if rc != 0:
+            raise RuntimeError("No se pudo activar ejabberd-retention.timer")
+
+        for days, mod in (("mam_retention_days", "mod_mam"), ("offline_retention_days", "mod_offline")):
+            if p[days] and mod not in p["modules"]:
+                self.log_msg(f"⚠ {days} se ignora: {mod} no está cargado en este preset.", "warn")
+        kept = []
+        if p["mam_retention_days"]:
+            kept.append(f"MAM {p['mam_retention_days']} días")
+        if p["offline_retention_days"]:
+            kept.append(f"offline {p['offline_retention_days']} días")
+        self.log_msg(f"✔ Retención activa ({', '.join(kept)}), programada "
+                     f"'{p['retention_schedule']}'.", "ok")
+        return self._db_report(p)
+
+    # ── exportador de métricas ───────────────────────────────────────────────
+
+    def _render_exporter_unit(self, p: dict) -> str:
+        """Unidad systemd del exportador (solo escucha en localhost)."""
+        db = f" --db {p['db_path']}" if p["db_type"] == "sqlite" else ""
+        api = f" --api {local_api_url(p)}" if p["proxy_protocol"] else ""
+        return textwrap.dedent(f"""\
+            [Unit]
+            Description=ejabberd: exportador de métricas (Prometheus)
+            After=ejabberd.service
+
+            [Service]
+            Type=simple
+            User=ejabberd
+            Group=ejabberd
+            ExecStart=/usr/bin/python3 {EXPORTER_PATH} --listen 127.0.0.1:{p['exporter_port']} --interval {p['exporter_interval']}{api}{db}
+            Restart=on-failure
+            RestartSec=5
+            NoNewPrivileges=yes
+            ProtectSystem=strict
+            ProtectHome=yes
+            PrivateTmp=yes
+
+            [Install]
+            WantedBy=multi-user.target
+        """)
+
+    def _step_exporter(self, p: dict):
+        """Instala (o retira) el servicio exportador de métricas."""
+        self.log_msg("━━━  PASO 10: Exportador de métricas  ━━━", "section")
+        unit = "/etc/systemd/system/ejabberd-exporter.service"
+        if not p["exporter"]:
+            self._run(f"sudo test -f {unit} && sudo systemctl disable --now "
+                      f"ejabberd-exporter.service || true", p)
+            self.log_msg("Exportador desactivado.", "out")
+            return
+        if "mod_http_api" not in p["modules"]:
+            self.log_msg("⚠ mod_http_api no está cargado en este preset: el exportador solo "
+                         "publicará memoria y tamaño de la base de datos.", "warn")
+
+        for dest, content in ((EXPORTER_PATH, _EXPORTER_SCRIPT), (unit, self._render_exporter_unit(p))):
+            tmp = PurePosixPath("/tmp") / PurePosixPath(dest).name
+            self.transport.write_text(tmp, content)
+            self._run(f"sudo cp {tmp} {dest}", p)
+            self.transport.remove(tmp)
+        self._run(f"sudo chmod 755 {EXPORTER_PATH}", p)
+        self._run("sudo systemctl daemon-reload", p)
+        rc, _ = self._run("sudo systemctl enable ejabberd-exporter.service && "
+                          "sudo systemctl restart ejabberd-exporter.service", p)
+        if rc != 0:
+            raise RuntimeError("No se pudo activar ejabberd-exporter.service")
+
+        url = f"http://127.0.0.1:{p['exporter_port']}/metrics"
+        script = ("import sys,time,urllib.request\n"
+                  "for _ in range(20):\n"
+                  " try: print(urllib.request.urlopen(sys.argv[1],timeout=2).read().decode()); break\n"
+                  " except OSError: time.sleep(0.5)")
+        rc, out = self.transport.run(f"python3 -c {shlex.quote(script)} {url}", _quiet, p["sudo_pass"])
+        values = dict(line.split(" ", 1) for line in out.splitlines()
+                      if line.startswith("ejabberd_") and " " in line)
+        if not values:
+            self.log_msg(f"⚠ {url} no responde todavía (journalctl -u ejabberd-exporter).", "warn")
+            return
+        self.log_msg(f"✔ Métricas en {url}: ejabberd_up={values.get('ejabberd_up', '?')}, "
+                     f"{values.get('ejabberd_connected_users', '?')} conectados, "
+                     f"{values.get('ejabberd_registered_users', '?')} registrados.", "ok")
+
+    def _step_upload(self, p: dict):
+        """Publica (o retira) el sitio nginx que sirve las descargas de mod_http_upload."""
+        if not upload_offloaded(p):
+            if self.transport.exists(NGINX_SITE_ENABLED):
+                self.log_msg("━━━  PASO 11: Descargas de archivos (nginx)  ━━━", "section")
+                self._run(f"sudo rm -f {NGINX_SITE_ENABLED} {NGINX_SITE} && "
+                          "sudo systemctl reload nginx", p)
+                self.log_msg("✔ Descargas de nuevo servidas por ejabberd.", "ok")
+            return
+        self.log_msg("━━━  PASO 11: Descargas de archivos (nginx)  ━━━", "section")
+        cmds = [
+            "sudo apt-get install -y nginx curl",
+            "sudo usermod -aG ejabberd www-data",
+            f"sudo mkdir -p {UPLOAD_DIR} && sudo chown ejabberd:ejabberd {UPLOAD_DIR} && "
+            f"sudo chmod 2750 {UPLOAD_DIR}",
+        ]
+        for cmd in cmds:
+            rc, _ = self._run(cmd, p)
+            if rc != 0:
+                raise RuntimeError(f"No se pudo preparar nginx: {cmd}")
+
+        tmp = PurePosixPath("/tmp/ejabberd-upload.nginx")
+        self.transport.write_text(tmp, render_nginx_upload(p))
+        self._run(f"sudo install -m 644 {tmp} {NGINX_SITE} && "
+                  f"sudo ln -sf {NGINX_SITE} {NGINX_SITE_ENABLED}", p)
+        self.transport.remove(tmp)
+        rc, _ = self._run("sudo nginx -t", p)
+        if rc != 0:
+            self._run(f"sudo rm -f {NGINX_SITE_ENABLED}", p)
+            raise RuntimeError("nginx -t rechaza el sitio generado; no se activa.")
+        # reload también recoge un server.pem renovado
+        rc, _ = self._run("sudo systemctl enable nginx && sudo systemctl reload-or-restart nginx", p)
+        if rc != 0:
+            raise RuntimeError("No se pudo recargar nginx (journalctl -u nginx)")
+
+        # Un archivo de prueba: rango parcial (206) y cabeceras de caché
+        probe = UPLOAD_DIR / ".installer-probe"
+        url = f"https://127.0.0.1:{p['upload_port']}/upload/{probe.name}"
+        self._run(f"sudo sh -c 'head -c 4096 /dev/zero > {probe}' && sudo chmod 644 {probe}", p)
+        rc, out = self.transport.run(f"curl -sk -D - -o /dev/null -H 'Range: bytes=0-99' {url}",
+                                     _quiet, p["sudo_pass"])
+        self._run(f"sudo rm -f {probe}", p)
+        headers = out.lower()
+        if rc != 0 or " 206" not in headers.split("\n", 1)[0]:
+            self.log_msg(f"⚠ {url} no respondió con 206 Partial Content "
+                         f"({out.splitlines()[0] if out else 'sin respuesta'}).", "warn")
+            return
+        cache = "cache-control: public" in headers
+        self.log_msg(f"✔ Descargas servidas por nginx en {upload_get_url(p).replace('@HOST@', p['domain'])} "
+                     f"(rangos: sí, caché: {'sí' if cache else 'no'}; cuota {p['upload_quota_mb']} MiB "
+                     f"por usuario, archivos borrados a los {p['upload_max_days']} días).", "ok")
+
+    def _turn_state(self, p: dict):
+        """Con turn, completa turn_secret (guardado en el nodo) y turn_ipv4_address."""
+        if not p["turn"]:
+            return
+        if not p["turn_secret"]:
+            secret = self._read_remote(TURN_SECRET_PATH, p)
+            if secret is None:
+                self._run(f"sudo mkdir -p {TURN_SECRET_PATH.parent} && "
+                          f"sudo sh -c 'umask 077; openssl rand -hex 32 > {TURN_SECRET_PATH}'", p)
+                secret = self._read_remote(TURN_SECRET_PATH, p)
+            if not secret or not secret.strip():
+                raise RuntimeError(f"No se pudo crear el secreto TURN en {TURN_SECRET_PATH}")
+            p["turn_secret"] = secret.strip()
+        if not p["turn_ipv4_address"]:
+            rc, out = self.transport.run("ip -4 route get 1.1.1.1", _quiet, p["sudo_pass"])
+            m = re.search(r"\bsrc (\d+\.\d+\.\d+\.\d+)", out)
+            if rc != 0 or not m:
+                raise RuntimeError("No se pudo deducir turn_ipv4_address: indíquela en la configuración")
+            p["turn_ipv4_address"] = m.group(1)
+            self.log_msg(f"turn_ipv4_address = {m.group(1)} (detectada; con NAT indique la IP pública)", "warn")
+
+    def _step_turn(self, p: dict):
+        """Abre los puertos STUN/TURN en el cortafuegos y comprueba que el relay asigna."""
+        import json
+        self.log_msg("━━━  PASO 12: STUN/TURN  ━━━", "section")
+        lo, hi = turn_port_range(p["turn_max_calls"])
+        self.log_msg(f"Relay: {p['turn_ipv4_address']}, puertos {lo}-{hi}/udp "
+                     f"({hi - lo + 1} para ~{p['turn_max_calls']} llamadas simultáneas)", "out")
+        rules = [f"{TURN_PORT}/udp", f"{TURN_TLS_PORT}/tcp", f"{lo}:{hi}/udp"]
+        rc, out = self.transport.run("sudo ufw status", _quiet, p["sudo_pass"])
+        if rc == 0 and "Status: active" in out:
+            for rule in rules:
+                self._run(f"sudo ufw allow {rule} comment 'ejabberd STUN/TURN'", p)
+        else:
+            self.log_msg("ufw no está activo: abra en el cortafuegos (o grupo de seguridad) "
+                         + ", ".join(rules), "warn")
+
+        cmd = (f"python3 -c {shlex.quote(_TURN_PROBE)} 127.0.0.1 {TURN_PORT} "
+               f"{shlex.quote(p['turn_secret'])}")
+        rc, out = self.transport.run(cmd, _quiet, p["sudo_pass"])
+        try:
+            result = json.loads(out.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            result = {"error": "la prueba no devolvió resultado"}
+        if "error" in result:
+            self.log_msg(f"⚠ TURN: {result['error']}", "warn")
+            return
+        port = int(result["relay"].rsplit(":", 1)[1])
+        if not lo <= port <= hi:
+            self.log_msg(f"⚠ El relay asignó {result['relay']}, fuera de {lo}-{hi}.", "warn")
+            return
+        self.log_msg(f"✔ STUN responde ({result['mapped']}) y TURN asigna relay en {result['relay']}.", "ok")
+
+    def _db_report(self, p: dict) -> dict:
+        """
+        Filas y tamaño de las tablas que crecen con el uso (archive = MAM,
+        spool = offline).  Devuelve {tabla: (filas, bytes o None)}.
+        """
+        tables = ("archive", "spool")
+        if p["db_type"] == "sqlite":
+            script = ("import os,sqlite3,sys;db=sys.argv[1];"
+                      "c=sqlite3.connect('file:'+db+'?mode=ro',uri=True);"
+                      "[print(t,c.execute('select count(*) from '+t).fetchone()[0],'',sep='|') "
+                      f"for t in {tables!r}];print('total','',os.path.getsize(db),sep='|')")
+            cmd = f"sudo python3 -c {shlex.quote(script)} {shlex.quote(p['db_path'])}"
+        else:
+            sizes = {"pgsql": "pg_total_relation_size('{t}')",
+                     "mysql": "(select data_length + index_length from information_schema.tables "
+                              "where table_schema = database() and table_name = '{t}')"}[p["db_type"]]
+            query = " union all ".join(
+                f"select '{t}', count(*), {sizes.format(t=t)} from {t}" for t in tables)
+            # Misma conexión y credenciales que ejabberd (sql_* de la configuración)
+            rc, out = self.transport.run("sudo mktemp -d", _quiet, p["sudo_pass"])
+            if rc != 0 or not out.strip():
+                self.log_msg("⚠ No se pudo consultar el tamaño de la base de datos.", "warn")
+                return {}
+            private = PurePosixPath(out.strip())
+            cred = self._sql_credentials(p, private)
+            if p["db_type"] == "pgsql":
+                cmd = f"sudo env PGPASSFILE={cred} psql {self._sql_conn_args(p)} -AtF'|' -c {shlex.quote(query)}"
+            else:
+                mysql = (f"mysql --defaults-extra-file={cred} -N -B {self._sql_conn_args(p)} "
+                         f"-e {shlex.quote(query)} | tr '\\t' '|'")
+                cmd = f"sudo sh -c {shlex.quote(mysql)}"
+        rc, out = self.transport.run(cmd, _quiet, p["sudo_pass"])
+        if p["db_type"] != "sqlite":
+            self.transport.run(f"sudo rm -rf {private}", _quiet, p["sudo_pass"])
+        report = {}
+        for line in out.splitlines() if rc == 0 else []:
+            name, _, rest = line.strip().partition("|")
+            rows, _, size = rest.partition("|")
+            if name and (rows.isdigit() or size.isdigit()):
+                report[name] = (int(rows) if rows.isdigit() else None,
+                                int(size) if size.isdigit() else None)
+        if not report:
+            self.log_msg("⚠ No se pudo consultar el tamaño de la base de datos.", "warn")
+            return report
+        labels = {"archive": "MAM (archive)", "spool": "Offline (spool)", "total": "Archivo de la BD"}
+        for name, (rows, size) in report.items():
+            parts = ([f"{rows:,} filas"] if rows is not None else []) + \
+                    ([_fmt_bytes(size)] if size is not None else [])
+            self.log_msg(f"{labels.get(name, name) + ':':<20}{', '.join(parts)}", "out")
+        return report
+
+    # ── volumen de log ───────────────────────────────────────────────────────
+
+    def _log_sample(self, p: dict) -> dict[int, int]:
+        """Tamaño de cada archivo del directorio de logs, indexado por inodo."""
+        rc, out = self.transport.run(
+            f"sudo find {LOG_DIR} -maxdepth 1 -type f -printf '%i %s\\n'", _quiet, p["sudo_pass"])
+        sample = {}
+        for line in out.splitlines() if rc == 0 else []:
+            inode, _, size = line.partition(" ")
+            if inode.isdigit() and size.strip().isdigit():
+                sample[int(inode)] = int(size)
+        return sample
+
+    def _measure_log_rate(self, p: dict, seconds: int) -> float:
+        """Mide los bytes de log por segundo que escribe el nodo en marcha."""
+        self.log_msg("━━━  Volumen de log  ━━━", "section")
+        before = self._log_sample(p)
+        if not before:
+            raise RuntimeError(f"No hay archivos de log en {LOG_DIR}")
+        self.log_msg(f"Midiendo durante {seconds} s…", "out")
+        start = time.monotonic()
+        time.sleep(seconds)
+        after = self._log_sample(p)
+        rate = _log_bytes(before, after) / (time.monotonic() - start)
+        self.log_msg(f"Archivos de log:   {_fmt_bytes(rate)}/s "
+                     f"(≈ {_fmt_bytes(rate * 86400)} al día)", "out")
+        if rate:
+            kept = p["log_rotate_size"] * (p["log_rotate_count"] + 1) / rate / 3600
+            self.log_msg(f"Con rotación {_fmt_bytes(p['log_rotate_size'])} × "
+                         f"{p['log_rotate_count']} se conservan ≈ {kept:.1f} h de log", "out")
+        if p["log_journald"]:
+            rc, out = self.transport.run(
+                f"sudo journalctl -u ejabberd --since -{seconds}s -o cat | wc -c", _quiet, p["sudo_pass"])
+            if rc == 0 and out.strip().isdigit():
+                self.log_msg(f"journald:          {_fmt_bytes(int(out) / seconds)}/s", "out")
+        return rate
+
+    def _step_apply(self, p: dict):
+        """
+        Pone en marcha la configuración nueva: arranca el servicio si está
+        parado, usa 'ejabberdctl reload_config' si todos los cambios se
+        pueden aplicar en caliente y reinicia solo cuando hace falta.
+        """
+        rc, _ = self._run("systemctl is-active --quiet ejabberd", p)
+        if rc != 0:
+            self.log_msg("Arrancando el servicio…", "out")
+            rc, _ = self._run("sudo systemctl start ejabberd", p)
+            if rc != 0:
+                raise RuntimeError("No se pudo arrancar ejabberd")
+            self.log_msg("✔ Servicio ejabberd arrancado.", "ok")
+            return
+
+        changes = getattr(self, "_config_changes", None)
+        reasons = list(self._restart_reasons)
+        if changes is None:
+            reasons.append("no había configuración previa que comparar")
+        else:
+            reasons += [f"'{k}' requiere reinicio" for k in sorted(changes & RESTART_OPTIONS)]
+        mode = p.get("apply_mode", "auto")
+        if mode == "restart" and not reasons:
+            reasons.append("apply_mode = restart")
+
+        if reasons and mode != "reload":
+            self.log_msg("Reinicio necesario: " + "; ".join(reasons), "warn")
+            rc, _ = self._run("sudo systemctl restart ejabberd", p)
+            if rc != 0:
+                raise RuntimeError("No se pudo reiniciar ejabberd")
+            self.log_msg("✔ ejabberd reiniciado.", "ok")
+            return
+        if not changes and not self._cert_changed:
+            self.log_msg("✔ Nada que aplicar: el nodo ya ejecuta esta configuración.", "ok")
+            return
+
+        self.log_msg("Aplicando en caliente (sin desconectar usuarios)…", "out")
+        rc, _ = self._run(f"sudo -u ejabberd {EJABBERDCTL} reload_config", p)
+        if rc != 0:
+            self.log_msg("✖ ejabberd rechazó la configuración; restaurando la anterior.", "err")
+            self._run(f"sudo test -f {CONF_PATH}.bak && sudo cp -p {CONF_PATH}.bak {CONF_PATH}", p)
+            self._run(f"sudo -u ejabberd {EJABBERDCTL} reload_config", p)
+            raise RuntimeError("reload_config falló; se restauró la configuración anterior")
+        self.log_msg("✔ Configuración recargada sin reiniciar.", "ok")
+
+    def _step_permissions(self, p: dict):
+        """Ajusta propietarios y permisos."""
+        self.log_msg("━━━  PASO 7: Permisos y propietarios  ━━━", "section")
+        cmds = [
+            "sudo chown -R ejabberd:ejabberd /usr/local/ejabberd",
+            "sudo mkdir -p /var/lib/ejabberd",
+            "sudo chown -R ejabberd:ejabberd /var/lib/ejabberd",
+        ]
+        cookie = PurePosixPath("/var/lib/ejabberd/.erlang.cookie")
+        for cmd in cmds:
+            self._run(cmd, p)
+        rc, _ = self._run(
+            f"sudo test -f {cookie} && sudo chown ejabberd:ejabberd {cookie} "
+            f"&& sudo chmod 400 {cookie} || true", p
+        )
+        self.log_msg("✔ Permisos aplicados.", "ok")
+
+    def _step_etc_hosts(self, p: dict):
+        """Agrega entrada a /etc/hosts si se eligió la opción."""
+        if not p["etc_hosts"]:
+            return
+        self.log_msg("━━━  OPCIONAL: /etc/hosts  ━━━", "section")
+        domain = p["domain"]
+        ip     = p["hosts_ip"]
+        entry  = f"{ip}  {domain}"
+
+        rc, out = self._run(f"grep -qF '{domain}' /etc/hosts", p)
+        if rc == 0:
+            self.log_msg(f"Entrada para {domain} ya existe en /etc/hosts.", "warn")
+        else:
+            rc, _ = self._run(f"echo '{entry}' | sudo tee -a /etc/hosts", p)
+            if rc == 0:
+                self.log_msg(f"✔ '{entry}' añadido a /etc/hosts.", "ok")
+            else:
+                self.log_msg("⚠ No se pudo editar /etc/hosts.", "warn")
+
+
+WORKFLOWS = {
+    "full":   "_do_full",
+    "config": "_do_config_only",
+    "cert":   "_do_cert_only",
+    "vendor": "_do_vendor",
+    "prefetch": "_do_prefetch",
+    "retention": "_do_retention",
+    "migrate": "_do_migrate",
+    "backup": "_do_backup",
+    "restore": "_do_restore",
+    "boot": "_do_boot",
+    "haproxy": "_do_haproxy",
+    "health": "_do_health",
+}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  API de Python: flujos con un resultado por paso
+# ══════════════════════════════════════════════════════════════════════════════
+
+def step_id(title: str) -> str:
+    """Identificador de un paso fuera del diario a partir de su título de sección."""
+    import unicodedata
+    title = re.sub(r"^(PASO \w+|OPCIONAL):\s*", "", title)
+    ascii_title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", ascii_title.lower()).strip("-")
+
+
+class StepResult:
+    """
+    Resultado de un paso de un flujo.  title es el título de su sección
+    ("PASO 8: Servicio systemd") y step su identificador estable: el nombre
+    del paso en el diario ("systemd") o, fuera del diario, el título sin
+    número ni acentos ("comprobacion-previa-del-nodo").  status es "ok",
+    "skipped" (el diario ya lo daba por hecho) o "failed", y messages son los
+    mensajes del paso como [(etiqueta, texto)] con las etiquetas de log_msg.
+    """
+
+    def __init__(self, title: str, status: str = "ok", step: str = ""):
+        self.title = title
+        self.step = step or step_id(title)
+        self.status = status
+        self.seconds = 0.0
+        self.messages: list[tuple[str, str]] = []
+        self.error = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status != "failed"
+
+    @property
+    def warnings(self) -> list[str]:
+        return [text for tag, text in self.messages if tag == "warn"]
+
+    def to_dict(self) -> dict:
+        return {"step": self.step, "title": self.title, "status": self.status, "seconds": round(self.seconds, 3),
+                "error": self.error, "messages": [list(m) for m in self.messages]}
+
+    def __repr__(self) -> str:
+        return f"StepResult({self.step!r}, {self.status!r}, {self.seconds:.2f}s)"
+
+
+class WorkflowError(RuntimeError):
+    """Un paso falló; results son los pasos ejecutados, el último el fallido."""
+
+    def __init__(self, results: list[StepResult]):
+        super().__init__(results[-1].error)
+        self.results = results
+
+
+class Engine(InstallerSteps):
+    """
+    Ejecuta flujos en el propio proceso, sin interfaz:
+
+        engine = Engine(transport, on_message=print)
+        results = engine.run("config", build_params(config))
+
+    Cada mensaje de sección abre un StepResult nuevo; on_message(text, tag)
+    recibe además todos los mensajes según se emiten.  Un fallo deja el último
+    resultado en "failed" con su error; con check=True se lanza WorkflowError.
+    """
+
+    def __init__(self, transport=None, on_message=None):
+        if transport is not None:
+            self.transport = transport
+        self.on_message = on_message
+        self.results: list[StepResult] = []
+        self._step = ""
+        self._open("(preparación)")
+
+    def log_msg(self, text: str, tag: str = "out"):
+        if tag == "section":
+            self.last_section = text.strip("━ ")
+            self._open(self.last_section)
+        self.results[-1].messages.append((tag, text))
+        if self.on_message:
+            self.on_message(text, tag)
+
+    def _step_started(self, name: str):
+        self._step = name
+
+    def _step_skipped(self, name: str, title: str):
+        if title:     # un paso que no abrió sección al ejecutarse tampoco la abre al omitirse
+            self._open(title, "skipped", name)
+
+    def _open(self, title: str, status: str = "ok", step: str = ""):
+        self._close()
+        self.results.append(StepResult(title, status, step or self._step))
+        self._started = time.perf_counter()
+
+    def _close(self):
+        if self.results:
+            self.results[-1].seconds = time.perf_counter() - self._started
+
+    def run(self, workflow: str, p: dict, check: bool = False) -> list[StepResult]:
+        """Ejecuta el flujo workflow (ver WORKFLOWS) con los parámetros de build_params."""
+        if workflow not in WORKFLOWS:
+            raise ValueError(f"flujo desconocido: {workflow!r}; opciones: {', '.join(WORKFLOWS)}")
+        self.results = []
+        self._step = ""
+        self._open("(preparación)")
+        try:
+            getattr(self, WORKFLOWS[workflow])(p)
+        except Exception as exc:
+            self.results[-1].status = "failed"
+            self.results[-1].error = str(exc)
+        finally:
+            self._close()
+        results = self.results
+        if len(results) > 1 and results[0].ok and not results[0].messages:
+            results = results[1:]
+        if check and not results[-1].ok:
+            raise WorkflowError(results)
+        return results
+
+
+def run_workflow(workflow: str, config: dict | None = None, transport=None,
+                 on_message=None, check: bool = False) -> list[StepResult]:
+    """
+    Valida config como un archivo --config (lanza ConfigError) y ejecuta el
+    flujo con un Engine; sin transport, en la máquina local.
+    """
+    p = build_params(validate_config(config or {}))
+    return Engine(transport, on_message).run(workflow, p, check)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Simulación: los flujos completos en segundos, sin sudo ni compilación
+# ══════════════════════════════════════════════════════════════════════════════
+
+class SimulatedInstaller(InstallerSteps):
+    """
+    Ejecuta flujos contra un SimulatedTransport y mide el coste propio del
+    instalador en cada paso (tiempo y número de órdenes).  Los pasos se
+    delimitan con sus mensajes de sección.
+    """
+
+    def __init__(self, transport: SimulatedTransport, verbose: bool = False):
+        self.transport = transport
+        self.verbose = verbose
+        self.timings: list[tuple[str, float, int]] = []
+        self._mark = None
+
+    def log_msg(self, text: str, tag: str = "out"):
+        if tag == "section":
+            self._lap()
+            self._mark = (text.strip("━ "), time.perf_counter(), len(self.transport.commands))
+        if self.verbose:
+            print(f"    [{tag}] {text}")
+
+    def _lap(self):
+        if self._mark:
+            name, start, ncmds = self._mark
+            self.timings.append((name, time.perf_counter() - start,
+                                 len(self.transport.commands) - ncmds))
+            self._mark = None
+
+    def simulate(self, workflow: str, p: dict) -> list[tuple[str, float, int]]:
+        """Ejecuta el flujo y devuelve [(paso, segundos, órdenes)]."""
+        self.timings = []
+        self._mark = ("(preparación)", time.perf_counter(), len(self.transport.commands))
+        try:
+            getattr(self, WORKFLOWS[workflow])(p)
+        finally:
+            self._lap()
+        return self.timings
+
+    def verify(self, workflow: str, p: dict, backups_before: int = 0) -> list[str]:
+        """
+        Comprueba el estado que el flujo debe dejar en el sistema simulado;
+        devuelve los problemas (vacía si todo está en su sitio).
+        """
+        problems = []
+        if workflow in ("full", "config"):
+            rc, text = self.transport.run(f"cat {CONF_PATH}", _quiet)
+            if rc != 0:
+                problems.append(f"falta {CONF_PATH}")
+            elif yaml_sections(text) != yaml_sections(self._render_yaml(p)):
+                problems.append(f"{CONF_PATH} no coincide con la configuración")
+            if not self.transport.exists(JOURNAL_PATH):
+                problems.append(f"falta el diario {JOURNAL_PATH}")
+            if p["systemd"]:
+                state = self.transport.services.get("ejabberd", {})
+                if not (state.get("enabled") and state.get("active")):
+                    problems.append("el servicio ejabberd no queda habilitado y en marcha")
+        if workflow in ("full", "config", "cert"):
+            if not self.transport.exists(EJABBERD_PREFIX / "etc/ejabberd/server.pem"):
+                problems.append("falta server.pem")
+        if workflow == "backup" and self.backups(p) <= backups_before:
+            problems.append(f"no hay copia nueva en {p['backup_dir']}")
+        return problems
+
+    def backups(self, p: dict) -> int:
+        """Número de copias en backup_dir."""
+        return len([n for n in self.transport.listdir(p["backup_dir"]) if n.startswith("ejabberd-")])
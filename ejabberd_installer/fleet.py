@@ -0,0 +1,275 @@
+"""
+Aprovisionamiento concurrente de una flota de hosts y actualización
+escalonada de los nodos.
+"""
+
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+from .transport import Colors, make_transport
+from .components import EJABBERDCTL, haproxy_sections, HAPROXY_SOCKET
+from .config import build_params
+from .engine import InstallerSteps, WORKFLOWS
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Aprovisionamiento concurrente de una flota de hosts
+# ══════════════════════════════════════════════════════════════════════════════
+
+class HostInstaller(InstallerSteps):
+    """Ejecuta los pasos de instalación sobre un host sin interacción."""
+
+    def __init__(self, name: str, transport, log_path: Path):
+        self.name = name
+        self.transport = transport
+        self.log_path = log_path
+        self._log = open(log_path, "a", encoding="utf-8")
+        self.last_section = ""
+
+    def log_msg(self, text: str, tag: str = "out"):
+        if tag == "section":
+            self.last_section = text.strip("━ ")
+        ts = datetime.now().strftime("%H:%M:%S")
+        self._log.write(f"[{ts}] [{tag}] {text}\n")
+        self._log.flush()
+
+    def close(self):
+        self._log.close()
+
+
+def load_inventory(path: str) -> dict:
+    """
+    Lee el inventario JSON de la flota:
+
+        {
+          "parallel": 10,
+          "defaults": {"cert_days": "730", "sudo_pass": "..."},
+          "hosts": [
+            {"name": "xmpp1", "address": "10.0.0.11", "user": "ubuntu",
+             "config": {"domain": "xmpp1.lab.local"}},
+            {"name": "lab", "transport": "local"}
+          ]
+        }
+
+    Para --rolling admite además "builder" (nombre del host que compila) y
+    "balancer" (host de HAProxy, con el mismo formato que los de "hosts").
+    """
+    import json
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    hosts = data.get("hosts") or []
+    if not hosts:
+        raise ValueError(f"El inventario {path} no define ningún host")
+    names = [h.get("name") or h.get("address") for h in hosts]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError("Cada host necesita un 'name' (o 'address') único")
+    return data
+
+
+class FleetProvisioner:
+    """
+    Aplica un flujo de instalación a muchos hosts a la vez, con concurrencia
+    acotada, un log por host y un resumen agregado de éxitos y fallos.
+    """
+
+    def __init__(self, inventory: dict, workflow: str = "full",
+                 parallel: int | None = None, log_dir: str = "fleet-logs",
+                 transport_factory=make_transport):
+        self.hosts = inventory["hosts"]
+        self.defaults = inventory.get("defaults", {})
+        self.workflow = workflow
+        self.parallel = max(1, parallel or inventory.get("parallel") or 8)
+        self.log_dir = Path(log_dir)
+        self.transport_factory = transport_factory
+
+    def run(self) -> list[dict]:
+        """Aprovisiona todos los hosts y devuelve un resultado por host."""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        results = []
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            futures = [pool.submit(self._provision, h) for h in self.hosts]
+            for fut in as_completed(futures):
+                res = fut.result()
+                results.append(res)
+                self._report(res)
+        order = {(h.get("name") or h.get("address")): i for i, h in enumerate(self.hosts)}
+        results.sort(key=lambda r: order[r["name"]])
+        return results
+
+    def _provision(self, host: dict) -> dict:
+        name = host.get("name") or host.get("address")
+        log_path = self.log_dir / f"{name}.log"
+        start = time.monotonic()
+        result = {"name": name, "ok": False, "error": "", "step": "",
+                  "seconds": 0.0, "log": str(log_path)}
+        inst = None
+        try:
+            inst = HostInstaller(name, self.transport_factory(host), log_path)
+            config = {**self.defaults, **host.get("config", {})}
+            p = build_params(config)
+            inst.log_msg(f"╔══ {self.workflow.upper()} en {name} ══╗", "head")
+            getattr(inst, WORKFLOWS[self.workflow])(p)
+            inst.log_msg("╚══ COMPLETADO ══╝", "head")
+            result["ok"] = True
+        except Exception as exc:
+            result["error"] = str(exc)
+            if inst is not None:
+                result["step"] = inst.last_section
+                inst.log_msg(f"✖ ERROR: {exc}", "err")
+        finally:
+            if inst is not None:
+                inst.close()
+            result["seconds"] = time.monotonic() - start
+        return result
+
+    @staticmethod
+    def _report(res: dict):
+        if res["ok"]:
+            print(f"{Colors.GREEN}✔ {res['name']}{Colors.RESET} "
+                  f"({res['seconds']:.0f}s)")
+        else:
+            print(f"{Colors.RED}✖ {res['name']}{Colors.RESET} "
+                  f"({res['seconds']:.0f}s) {res['error']} — ver {res['log']}")
+
+    @staticmethod
+    def print_summary(results: list[dict]):
+        ok = [r for r in results if r["ok"]]
+        failed = [r for r in results if not r["ok"]]
+        print(f"\n{Colors.BOLD}═══ RESUMEN DE LA FLOTA ═══{Colors.RESET}\n")
+        width = max(len(r["name"]) for r in results)
+        for r in results:
+            state = (f"{Colors.GREEN}OK   {Colors.RESET}" if r["ok"]
+                     else f"{Colors.RED}FALLO{Colors.RESET}")
+            detail = "" if r["ok"] else f"  {r['step']}: {r['error']}"
+            print(f"  {r['name']:<{width}}  {state}  {r['seconds']:7.1f}s{detail}")
+        print(f"\n  {Colors.GREEN}{len(ok)} correctos{Colors.RESET}, "
+              f"{Colors.RED if failed else ''}{len(failed)} fallidos{Colors.RESET}"
+              f" de {len(results)} hosts.\n")
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Actualización escalonada: una compilación, un nodo cada vez
+# ══════════════════════════════════════════════════════════════════════════════
+
+
+class RollingUpgrade:
+    """
+    Actualiza una flota sin cortar el servicio entero: compila una vez en el
+    host constructor y, nodo a nodo, instala la versión junto a la actual,
+    drena el nodo (HAProxy deja de enviarle conexiones y stop_kindly avisa a
+    los usuarios para que reanuden en otro nodo), cambia el enlace, arranca y
+    solo sigue con el siguiente si pasa las comprobaciones de salud.  Si un
+    nodo falla, vuelve a la versión anterior y se detiene.
+    """
+
+    def __init__(self, inventory: dict, log_dir: str = "fleet-logs",
+                 transport_factory=make_transport):
+        self.hosts = inventory["hosts"]
+        self.defaults = inventory.get("defaults", {})
+        self.balancer = inventory.get("balancer")
+        self.builder = inventory.get("builder") or self.hosts[0].get("name") or self.hosts[0].get("address")
+        self.log_dir = Path(log_dir)
+        self.transport_factory = transport_factory
+
+    def run(self) -> list[dict]:
+        """Compila y actualiza los nodos en orden; devuelve un resultado por host."""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        names = [h.get("name") or h.get("address") for h in self.hosts]
+        if self.builder not in names:
+            raise ValueError(f"El constructor {self.builder!r} no está en el inventario")
+        built = {}
+        res = self._on(self.hosts[names.index(self.builder)], "build",
+                       lambda inst, p: built.update(zip(("release", "archive"), inst._release_build(p))))
+        res["name"] += " (compilación)"
+        FleetProvisioner._report(res)
+        if not res["ok"]:
+            return [res]
+        results = []
+        for host in self.hosts:
+            res = self._on(host, "upgrade",
+                           lambda inst, p: self._upgrade(inst, host, built["release"], built["archive"], p))
+            FleetProvisioner._report(res)
+            results.append(res)
+            if not res["ok"]:
+                break
+        skipped = [h.get("name") or h.get("address") for h in self.hosts[len(results):]]
+        results += [{"name": n, "ok": False, "error": "no actualizado", "step": "(detenido)",
+                     "seconds": 0.0, "log": ""} for n in skipped]
+        return results
+
+    def _on(self, host: dict, label: str, action) -> dict:
+        """Ejecuta action(instalador, p) sobre un host con su log y devuelve el resultado."""
+        name = host.get("name") or host.get("address")
+        log_path = self.log_dir / f"{name}.log"
+        start = time.monotonic()
+        result = {"name": name, "ok": False, "error": "", "step": "",
+                  "seconds": 0.0, "log": str(log_path)}
+        inst = None
+        try:
+            inst = HostInstaller(name, self.transport_factory(host), log_path)
+            p = build_params({**self.defaults, **host.get("config", {})})
+            inst.log_msg(f"╔══ {label.upper()} en {name} ══╗", "head")
+            action(inst, p)
+            inst.log_msg("╚══ COMPLETADO ══╝", "head")
+            result["ok"] = True
+        except Exception as exc:
+            result["error"] = str(exc)
+            if inst is not None:
+                result["step"] = inst.last_section
+                inst.log_msg(f"✖ ERROR: {exc}", "err")
+        finally:
+            if inst is not None:
+                inst.close()
+            result["seconds"] = time.monotonic() - start
+        return result
+
+    def _upgrade(self, inst: HostInstaller, host: dict, release: str,
+                 archive: PurePosixPath, p: dict):
+        inst._begin()
+        inst._release_install(release, archive, p)
+        address = host.get("address") or host.get("name")
+
+        inst.log_msg("━━━  Drenado  ━━━", "section")
+        self._balancer(inst, address, "drain")
+        text = shlex.quote(f"Actualizando el servidor: reconectando en {p['drain_seconds']} s")
+        inst._run(f"sudo {EJABBERDCTL} stop_kindly {p['drain_seconds']} {text}", p)
+        inst._run("sudo systemctl stop ejabberd", p)
+
+        previous = inst._release_switch(release, p)
+        if p["fast_start"]:
+            inst._step_yaml(p)   # sin la marca: update_sql_schema: true para el código nuevo
+        inst._run("sudo systemctl start ejabberd", p)
+        problems = inst._health_check(release, p)
+        if problems:
+            inst.log_msg(f"Volviendo a {previous}…", "warn")
+            inst._run("sudo systemctl stop ejabberd", p)
+            inst._release_switch(previous, p)
+            inst._run("sudo systemctl start ejabberd", p)
+            self._balancer(inst, address, "ready")
+            raise RuntimeError(f"{release} no supera las comprobaciones ({'; '.join(problems)}); "
+                               f"nodo devuelto a {previous}")
+        self._balancer(inst, address, "ready")
+        inst._release_prune(release, previous, p)
+
+    def _balancer(self, inst: HostInstaller, address: str, state: str):
+        """Cambia el estado del nodo en todas las secciones de HAProxy (drain/ready)."""
+        if not self.balancer:
+            if state == "drain":
+                inst.log_msg("⚠ Sin 'balancer' en el inventario: el nodo puede recibir "
+                             "conexiones nuevas mientras se drena.", "warn")
+            return
+        lb = self.transport_factory(self.balancer)
+        config = {**self.defaults, **self.balancer.get("config", {})}
+        p = build_params(config)
+        cmds = "; ".join(f"set server {section}/{address} state {state}"
+                         for section, _ in haproxy_sections(p))
+        send = f"echo {shlex.quote(cmds)} | socat stdio {HAPROXY_SOCKET}"
+        rc, out = lb.run(f"sudo sh -c {shlex.quote(send)}", inst.log_msg, p["sudo_pass"])
+        # socat sale con 0 aunque HAProxy rechace la orden: 'set server' no responde
+        # nada si la acepta, y «No such server.» si el nodo no está en esa sección
+        if rc != 0 or out.strip():
+            raise RuntimeError(f"No se pudo poner {address} en '{state}' en el balanceador"
+                               + (f": {' '.join(out.split())}" if out.strip() else "")
+                               + " (¿coincide con su entrada de haproxy_backends?)")
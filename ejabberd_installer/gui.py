@@ -0,0 +1,400 @@
+"""
+Ventana principal (tkinter).  Este módulo importa tkinter al cargarse: solo
+se importa cuando se pide la interfaz gráfica.
+"""
+
+import threading
+import tkinter as tk
+from tkinter import ttk, scrolledtext, messagebox, font as tkfont
+from datetime import datetime
+
+from .components import MODULE_PRESETS, select_modules, session_kb
+from .config import build_params, DEFAULT_CONFIG
+from .engine import Engine
+
+
+# ── Paleta de colores (terminal dark + verde neón) ────────────────────────────
+BG       = "#0d1117"
+BG2      = "#161b22"
+BG3      = "#21262d"
+ACCENT   = "#39d353"   # verde vivo
+ACCENT2  = "#58a6ff"   # azul info
+WARN     = "#f0883e"   # naranja advertencia
+ERR      = "#f85149"   # rojo error
+FG       = "#e6edf3"
+FG2      = "#8b949e"
+BORDER   = "#30363d"
+BTN_FG   = "#0d1117"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Ventana principal (GUI con tkinter)
+# ══════════════════════════════════════════════════════════════════════════════
+
+class EjabberdInstaller(tk.Tk):
+    def __init__(self, config: dict | None = None):
+        super().__init__()
+        self.initial = {**DEFAULT_CONFIG, **(config or {})}
+        self.title("Ejabberd Installer · Ubuntu 24.04")
+        self.configure(bg=BG)
+        self.resizable(True, True)
+        self.minsize(900, 680)
+
+        # ── fuentes ──────────────────────────────────────────────────────────
+        self.font_mono  = tkfont.Font(family="Monospace", size=10)
+        self.font_ui    = tkfont.Font(family="Sans", size=10)
+        self.font_title = tkfont.Font(family="Sans", size=13, weight="bold")
+        self.font_label = tkfont.Font(family="Sans", size=9)
+
+        self._build_ui()
+        self._center()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #  Construcción de la interfaz
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _build_ui(self):
+        # ── cabecera ──────────────────────────────────────────────────────────
+        header = tk.Frame(self, bg=BG2, pady=12)
+        header.pack(fill="x")
+        tk.Label(
+            header,
+            text="⬡  Ejabberd XMPP Server — Instalador Automático",
+            font=self.font_title,
+            bg=BG2, fg=ACCENT,
+        ).pack(side="left", padx=20)
+        tk.Label(
+            header,
+            text="Ubuntu 24.04",
+            font=self.font_label,
+            bg=BG2, fg=FG2,
+        ).pack(side="right", padx=20)
+
+        # ── panel principal ───────────────────────────────────────────────────
+        main = tk.Frame(self, bg=BG)
+        main.pack(fill="both", expand=True, padx=0, pady=0)
+
+        # columna izquierda: configuración
+        left = tk.Frame(main, bg=BG2, width=320)
+        left.pack(side="left", fill="y", padx=(10, 0), pady=10)
+        left.pack_propagate(False)
+
+        self._build_config_panel(left)
+
+        # columna derecha: log + botones
+        right = tk.Frame(main, bg=BG)
+        right.pack(side="left", fill="both", expand=True, padx=10, pady=10)
+
+        self._build_log_panel(right)
+        self._build_action_buttons(right)
+
+        # ── barra de estado ───────────────────────────────────────────────────
+        self.status_var = tk.StringVar(value="Listo. Configure las opciones y presione Iniciar.")
+        status_bar = tk.Label(
+            self,
+            textvariable=self.status_var,
+            bg=BG3, fg=FG2,
+            font=self.font_label,
+            anchor="w", padx=10, pady=5,
+        )
+        status_bar.pack(fill="x", side="bottom")
+
+    # ── panel de configuración ────────────────────────────────────────────────
+
+    def _build_config_panel(self, parent):
+        def section(text):
+            f = tk.Frame(parent, bg=BORDER, height=1)
+            f.pack(fill="x", pady=(14, 4), padx=10)
+            tk.Label(
+                parent,
+                text=f"  {text}",
+                font=self.font_label,
+                bg=BG2, fg=ACCENT2, anchor="w",
+            ).pack(fill="x", padx=10)
+
+        def labeled_entry(frame, label, default, show=None):
+            tk.Label(frame, text=label, bg=BG2, fg=FG2,
+                     font=self.font_label, anchor="w").pack(fill="x", padx=10, pady=(6, 0))
+            var = tk.StringVar(value=default)
+            e = tk.Entry(
+                frame, textvariable=var, bg=BG3, fg=FG,
+                insertbackground=ACCENT, relief="flat",
+                font=self.font_mono, show=show or "",
+            )
+            e.pack(fill="x", padx=10, ipady=5)
+            return var
+
+        def check_opt(frame, label, default=True):
+            var = tk.BooleanVar(value=default)
+            c = tk.Checkbutton(
+                frame, text=label, variable=var,
+                bg=BG2, fg=FG, activebackground=BG2,
+                selectcolor=BG3, font=self.font_label,
+                activeforeground=ACCENT,
+            )
+            c.pack(anchor="w", padx=10, pady=2)
+            return var
+
+        # ── Dominio ──
+        section("Dominio XMPP")
+        self.domain_var = labeled_entry(parent, "Dominio principal:", self.initial["domain"])
+        self.extra_domain_var = labeled_entry(parent, "Dominio adicional (opcional):", self.initial["extra_domain"])
+
+        # ── Certificado ──
+        section("Certificado TLS")
+        self.cn_var = labeled_entry(parent, "Common Name (CN):", self.initial["cn"])
+        self.cert_days_var = labeled_entry(parent, "Validez (días):", self.initial["cert_days"])
+
+        # ── Base de datos ──
+        section("Base de Datos")
+        tk.Label(parent, text="  Tipo:", bg=BG2, fg=FG2,
+                 font=self.font_label, anchor="w").pack(fill="x", padx=10, pady=(6, 0))
+        self.db_type_var = tk.StringVar(value=self.initial["db_type"])
+        db_frame = tk.Frame(parent, bg=BG2)
+        db_frame.pack(fill="x", padx=10)
+        for db in ("sqlite", "pgsql", "mysql"):
+            tk.Radiobutton(
+                db_frame, text=db, variable=self.db_type_var, value=db,
+                bg=BG2, fg=FG, activebackground=BG2,
+                selectcolor=BG3, font=self.font_label,
+            ).pack(side="left", padx=4)
+
+        self.db_path_var = labeled_entry(
+            parent, "Ruta SQLite:", self.initial["db_path"]
+        )
+
+        # ── Módulos ──
+        section("Módulos")
+        self.module_preset_var = tk.StringVar(value=self.initial["module_preset"])
+        mod_frame = tk.Frame(parent, bg=BG2)
+        mod_frame.pack(fill="x", padx=10)
+        for preset in MODULE_PRESETS:
+            kb = session_kb(select_modules(preset))
+            tk.Radiobutton(
+                mod_frame, text=f"{preset} (~{kb:.0f} KB)",
+                variable=self.module_preset_var, value=preset,
+                bg=BG2, fg=FG, activebackground=BG2,
+                selectcolor=BG3, font=self.font_label,
+            ).pack(side="left", padx=4)
+        tk.Label(
+            parent,
+            text="  Memoria estimada por sesión de cliente.",
+            bg=BG2, fg=FG2, font=self.font_label, anchor="w",
+        ).pack(fill="x", padx=10)
+
+        # ── /etc/hosts ──
+        section("Red (sin DNS)")
+        self.etc_hosts_var = check_opt(parent, "Configurar /etc/hosts", default=self.initial["etc_hosts"])
+        self.hosts_ip_var = labeled_entry(parent, "IP del servidor:", self.initial["hosts_ip"])
+
+        # ── Opciones extra ──
+        section("Opciones")
+        self.systemd_var  = check_opt(parent, "Crear servicio systemd", self.initial["systemd"])
+        self.enable_svc_var = check_opt(parent, "Activar servicio al terminar", self.initial["enable_svc"])
+        self.set_perms_var = check_opt(parent, "Aplicar permisos y propietarios", self.initial["set_perms"])
+
+        # ── Sudo ──
+        section("Autenticación")
+        self.sudo_pass_var = labeled_entry(parent, "Contraseña sudo:", self.initial["sudo_pass"], show="*")
+        tk.Label(
+            parent,
+            text="  Se usa solo para comandos sudo.",
+            bg=BG2, fg=FG2, font=self.font_label, anchor="w",
+        ).pack(fill="x", padx=10)
+
+    # ── panel de log ──────────────────────────────────────────────────────────
+
+    def _build_log_panel(self, parent):
+        tk.Label(
+            parent, text="Registro de ejecución",
+            font=self.font_label, bg=BG, fg=FG2, anchor="w",
+        ).pack(fill="x", pady=(0, 4))
+
+        self.log = scrolledtext.ScrolledText(
+            parent,
+            bg=BG2, fg=FG,
+            font=self.font_mono,
+            relief="flat",
+            borderwidth=0,
+            wrap="word",
+            state="disabled",
+            height=22,
+        )
+        self.log.pack(fill="both", expand=True)
+
+        # etiquetas de color para el log
+        self.log.tag_config("cmd",     foreground=ACCENT2)
+        self.log.tag_config("out",     foreground=FG)
+        self.log.tag_config("ok",      foreground=ACCENT)
+        self.log.tag_config("warn",    foreground=WARN)
+        self.log.tag_config("err",     foreground=ERR)
+        self.log.tag_config("head",    foreground=ACCENT, font=self.font_title)
+        self.log.tag_config("section", foreground=ACCENT2)
+
+    # ── botones de acción ─────────────────────────────────────────────────────
+
+    def _build_action_buttons(self, parent):
+        btn_frame = tk.Frame(parent, bg=BG)
+        btn_frame.pack(fill="x", pady=(10, 0))
+
+        def btn(text, cmd, color=ACCENT, width=18):
+            b = tk.Button(
+                btn_frame, text=text,
+                command=cmd,
+                bg=color, fg=BTN_FG if color == ACCENT else FG,
+                activebackground=color,
+                activeforeground=BTN_FG,
+                font=self.font_ui,
+                relief="flat",
+                cursor="hand2",
+                width=width,
+                pady=7,
+            )
+            b.pack(side="left", padx=(0, 8))
+            return b
+
+        self.btn_start  = btn("▶  Instalar todo",   self._start_full)
+        self.btn_config = btn("⚙  Solo configurar", self._start_config_only, color=ACCENT2)
+        self.btn_cert   = btn("🔒 Solo certificado", self._start_cert_only,   color=ACCENT2)
+        btn("✖  Limpiar log",     self._clear_log, color=BG3, width=14)
+
+        # barra de progreso
+        self.progress = ttk.Progressbar(
+            parent, mode="indeterminate", length=400
+        )
+        self.progress.pack(fill="x", pady=(10, 0))
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #  Helpers de log / UI
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def log_msg(self, text: str, tag: str = "out"):
+        def _do():
+            self.log.config(state="normal")
+            ts = datetime.now().strftime("%H:%M:%S")
+            self.log.insert("end", f"[{ts}] {text}\n", tag)
+            self.log.see("end")
+            self.log.config(state="disabled")
+        self.after(0, _do)
+
+    def set_status(self, text: str):
+        self.after(0, lambda: self.status_var.set(text))
+
+    def _clear_log(self):
+        self.log.config(state="normal")
+        self.log.delete("1.0", "end")
+        self.log.config(state="disabled")
+
+    def _set_buttons(self, enabled: bool):
+        state = "normal" if enabled else "disabled"
+        for b in (self.btn_start, self.btn_config, self.btn_cert):
+            b.config(state=state)
+
+    def _lock(self):
+        self._set_buttons(False)
+        self.progress.start(12)
+
+    def _unlock(self):
+        self._set_buttons(True)
+        self.progress.stop()
+
+    def _center(self):
+        self.update_idletasks()
+        w, h = 980, 700
+        sw = self.winfo_screenwidth()
+        sh = self.winfo_screenheight()
+        self.geometry(f"{w}x{h}+{(sw-w)//2}+{(sh-h)//2}")
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #  Recolección de parámetros
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _params(self) -> dict:
+        return build_params({
+            **self.initial,
+            "domain"       : self.domain_var.get(),
+            "extra_domain" : self.extra_domain_var.get(),
+            "cn"           : self.cn_var.get(),
+            "cert_days"    : self.cert_days_var.get(),
+            "db_type"      : self.db_type_var.get(),
+            "db_path"      : self.db_path_var.get(),
+            "module_preset": self.module_preset_var.get(),
+            "etc_hosts"    : self.etc_hosts_var.get(),
+            "hosts_ip"     : self.hosts_ip_var.get(),
+            "systemd"      : self.systemd_var.get(),
+            "enable_svc"   : self.enable_svc_var.get(),
+            "set_perms"    : self.set_perms_var.get(),
+            "sudo_pass"    : self.sudo_pass_var.get(),
+        })
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #  Puntos de entrada de los botones (lanzan hilo)
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _start_full(self):
+        if not messagebox.askyesno(
+            "Confirmar instalación completa",
+            "Se instalarán dependencias, se compilará ejabberd y se configurará el sistema.\n"
+            "¿Continuar?"
+        ):
+            return
+        threading.Thread(target=self._run_full, daemon=True).start()
+
+    def _start_config_only(self):
+        threading.Thread(target=self._run_config_only, daemon=True).start()
+
+    def _start_cert_only(self):
+        threading.Thread(target=self._run_cert_only, daemon=True).start()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #  Flujos de trabajo
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _run_full(self):
+        self._lock()
+        p = self._params()
+        self.log_msg("╔══ INSTALACIÓN COMPLETA DE EJABBERD ══╗", "head")
+        self.set_status("Instalando… por favor espere.")
+        try:
+            Engine(on_message=self.log_msg).run("full", p, check=True)
+            self.log_msg("╚══ INSTALACIÓN COMPLETADA ══╝", "head")
+            self.set_status("✔ Instalación completada con éxito.")
+            self.after(0, lambda: messagebox.showinfo(
+                "Listo", "ejabberd se instaló y configuró correctamente."
+            ))
+        except Exception as exc:
+            self.log_msg(f"✖ ERROR: {exc}", "err")
+            self.set_status(f"Error: {exc}")
+            self.after(0, lambda msg=str(exc): messagebox.showerror("Error", msg))
+        finally:
+            self._unlock()
+
+    def _run_config_only(self):
+        self._lock()
+        p = self._params()
+        self.log_msg("╔══ CONFIGURACIÓN (sin compilar) ══╗", "head")
+        self.set_status("Configurando…")
+        try:
+            Engine(on_message=self.log_msg).run("config", p, check=True)
+            self.log_msg("╚══ CONFIGURACIÓN COMPLETADA ══╝", "head")
+            self.set_status("✔ Configuración aplicada.")
+        except Exception as exc:
+            self.log_msg(f"✖ ERROR: {exc}", "err")
+            self.set_status(f"Error: {exc}")
+        finally:
+            self._unlock()
+
+    def _run_cert_only(self):
+        self._lock()
+        p = self._params()
+        self.log_msg("╔══ GENERACIÓN DE CERTIFICADO TLS ══╗", "head")
+        self.set_status("Generando certificado…")
+        try:
+            Engine(on_message=self.log_msg).run("cert", p, check=True)
+            self.log_msg("╚══ CERTIFICADO GENERADO ══╝", "head")
+            self.set_status("✔ Certificado generado.")
+        except Exception as exc:
+            self.log_msg(f"✖ ERROR: {exc}", "err")
+            self.set_status(f"Error: {exc}")
+        finally:
+            self._unlock()
@@ -0,0 +1,499 @@
+"""
+Ejecución de órdenes en el destino: colores de terminal, utilidades de
+ejecución y transportes (local, SSH, falso y simulado).
+"""
+
+import os
+import re
+import sys
+import shlex
+import shutil
+import subprocess
+from pathlib import Path, PurePosixPath
+
+
+# ── Colores ANSI para terminal ────────────────────────────────────────────────
+class Colors:
+    """Códigos de color ANSI para terminal"""
+    RESET   = '\033[0m'
+    BOLD    = '\033[1m'
+    GREEN   = '\033[92m'
+    BLUE    = '\033[94m'
+    CYAN    = '\033[96m'
+    YELLOW  = '\033[93m'
+    RED     = '\033[91m'
+    MAGENTA = '\033[95m'
+    GRAY    = '\033[90m'
+    
+    @staticmethod
+    def strip_if_no_tty():
+        """Desactiva colores si no hay TTY"""
+        if not sys.stdout.isatty():
+            for attr in dir(Colors):
+                if not attr.startswith('_') and attr.isupper():
+                    setattr(Colors, attr, '')
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Utilidades de ejecución
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Prólogo de _sudo_wrap: guarda la contraseña (primera línea de stdin) en un
+# directorio privado y antepone al PATH un 'sudo' que la pide con -A, de modo
+# que la reciben todos los sudo del comando (tuberías, &&, xargs, sh -c…) y
+# nunca aparece en la línea de órdenes.
+_SUDO_ASKPASS = """\
+m=$(umask); umask 077; d=$(mktemp -d) || exit 1; trap 'rm -rf "$d"' EXIT
+IFS= read -r p; printf '%s\\n' "$p" > "$d/pass"; unset p
+real=$(command -v sudo)
+if [ -n "$real" ]; then
+  printf '#!/bin/sh\\ncat "%s/pass"\\n' "$d" > "$d/askpass"
+  printf '#!/bin/sh\\nSUDO_ASKPASS="%s/askpass" exec "%s" -A "$@"\\n' "$d" "$real" > "$d/sudo"
+  chmod 700 "$d/askpass" "$d/sudo"; PATH="$d:$PATH"
+fi
+umask "$m"
+"""
+
+
+def _sudo_wrap(cmd: str, sudo_password: str) -> tuple[str, str | None]:
+    """
+    Prepara cmd para que cualquier sudo que contenga reciba la contraseña.
+    Devuelve (línea de shell, datos de stdin): sin contraseña, (cmd, None).
+    """
+    if not sudo_password:
+        return cmd, None
+    return f"sh -c {shlex.quote(_SUDO_ASKPASS + cmd)}", sudo_password + "\n"
+
+
+def _stream(args, log_fn, shell: bool = False, stdin_data: str | None = None) -> tuple[int, str]:
+    """Lanza el proceso, reenvía cada línea a log_fn y devuelve (rc, salida)."""
+    env = os.environ.copy()
+    env["DEBIAN_FRONTEND"] = "noninteractive"
+    proc = subprocess.Popen(
+        args,
+        shell=shell,
+        stdin=subprocess.PIPE if stdin_data is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=env,
+        text=True,
+    )
+    if stdin_data is not None:
+        proc.stdin.write(stdin_data)
+        proc.stdin.close()
+    output_lines = []
+    for line in proc.stdout:
+        line = line.rstrip()
+        output_lines.append(line)
+        log_fn(line, tag="out")
+    proc.wait()
+    return proc.returncode, "\n".join(output_lines)
+
+
+def _quiet(text: str, tag: str = "out"):
+    """log_fn que descarta los mensajes (comprobaciones internas)."""
+
+
+def run_cmd(cmd: str, log_fn, sudo_password: str = "") -> tuple[int, str]:
+    """
+    Ejecuta un comando de shell.  Con contraseña, los sudo del comando la
+    reciben vía stdin (ver _sudo_wrap) para evitar bloqueos en scripts no
+    interactivos.
+    Devuelve (returncode, output_combinado).
+    """
+    log_fn(f"$ {cmd}", tag="cmd")
+    wrapped, stdin_data = _sudo_wrap(cmd, sudo_password)
+    return _stream(wrapped, log_fn, shell=True, stdin_data=stdin_data)
+
+
+# ── Transportes ───────────────────────────────────────────────────────────────
+#
+# Los pasos de instalación no llaman a run_cmd directamente sino a un
+# transporte, de modo que la misma lógica sirve para la máquina local, para un
+# host remoto por SSH o para un sistema simulado.  Un transporte expone:
+#
+#   run(cmd, log_fn, sudo_password)  → (rc, salida)
+#   write_text(path, content)        escribe un archivo en el destino
+#   remove(path)                     borra un archivo/directorio en el destino
+#   exists(path)                     → bool
+#   home()                           → $HOME del usuario en el destino
+
+class LocalTransport:
+    """Ejecuta los comandos en la máquina local."""
+
+    name = "local"
+
+    def run(self, cmd: str, log_fn, sudo_password: str = "") -> tuple[int, str]:
+        return run_cmd(cmd, log_fn, sudo_password)
+
+    def write_text(self, path, content: str):
+        Path(path).write_text(content)
+
+    def remove(self, path):
+        p = Path(path)
+        if p.is_dir():
+            shutil.rmtree(p, ignore_errors=True)
+        else:
+            p.unlink(missing_ok=True)
+
+    def exists(self, path) -> bool:
+        return Path(path).exists()
+
+    def home(self) -> str:
+        return str(Path.home())
+
+
+class SSHTransport:
+    """Ejecuta los comandos en un host remoto mediante el cliente ssh."""
+
+    def __init__(self, host: str, user: str = "", port: int = 22,
+                 identity: str = "", options: list[str] | None = None):
+        self.host = host
+        self.name = f"{user}@{host}" if user else host
+        self.port = int(port)
+        self.identity = identity
+        self.options = list(options or [])
+        self._home = None
+
+    def _argv(self, remote_cmd: str) -> list[str]:
+        argv = ["ssh", "-o", "BatchMode=yes", "-p", str(self.port)]
+        if self.identity:
+            argv += ["-i", self.identity]
+        for opt in self.options:
+            argv += ["-o", opt]
+        return argv + [self.name, remote_cmd]
+
+    def run(self, cmd: str, log_fn, sudo_password: str = "") -> tuple[int, str]:
+        log_fn(f"$ [{self.name}] {cmd}", tag="cmd")
+        wrapped, stdin_data = _sudo_wrap(cmd, sudo_password)
+        return _stream(self._argv(wrapped), log_fn, stdin_data=stdin_data)
+
+    def write_text(self, path, content: str):
+        rc, out = _stream(self._argv(f"cat > {shlex.quote(str(path))}"),
+                          _quiet, stdin_data=content)
+        if rc != 0:
+            raise RuntimeError(f"No se pudo escribir {path} en {self.name}: {out}")
+
+    def remove(self, path):
+        _stream(self._argv(f"rm -rf {shlex.quote(str(path))}"), _quiet)
+
+    def exists(self, path) -> bool:
+        rc, _ = _stream(self._argv(f"test -e {shlex.quote(str(path))}"), _quiet)
+        return rc == 0
+
+    def home(self) -> str:
+        if self._home is None:
+            rc, out = _stream(self._argv("echo $HOME"), _quiet)
+            if rc != 0 or not out.strip():
+                raise RuntimeError(f"No se pudo conectar con {self.name}")
+            self._home = out.strip().splitlines()[-1]
+        return self._home
+
+
+class FakeTransport:
+    """
+    Transporte de pruebas: no ejecuta nada, registra los comandos y responde
+    según una lista de reglas (regex, rc, salida).  Sin regla → (0, "").
+    """
+
+    def __init__(self, name: str = "fake", responses=None, files=None):
+        self.name = name
+        self.responses = [(re.compile(rx), rc, out) for rx, rc, out in (responses or [])]
+        self.files = dict(files or {})
+        self.commands: list[str] = []
+
+    def run(self, cmd: str, log_fn, sudo_password: str = "") -> tuple[int, str]:
+        log_fn(f"$ [{self.name}] {cmd}", tag="cmd")
+        self.commands.append(cmd)
+        for rx, rc, out in self.responses:
+            if rx.search(cmd):
+                for line in out.splitlines():
+                    log_fn(line, tag="out")
+                return rc, out
+        return 0, ""
+
+    def write_text(self, path, content: str):
+        self.files[str(path)] = content
+
+    def remove(self, path):
+        self.files.pop(str(path), None)
+
+    def exists(self, path) -> bool:
+        return str(path) in self.files
+
+    def home(self) -> str:
+        return f"/home/{self.name}"
+
+
+class SimulatedTransport:
+    """
+    Transporte de simulación: un sistema ficticio con su sistema de archivos
+    bajo root (un directorio temporal), servicios systemd y usuarios.  Evalúa
+    las líneas de shell de los pasos (&&, ||, ;, |, >, sh -c) y modela las
+    órdenes que cambian el estado (mkdir, mktemp, cp, install, mv, rm, cat, tee,
+    test, systemctl, useradd…) y las sondas de versión (git describe, otp_release,
+    uname -m); el resto devuelve (0, "").  Las reglas
+    (regex, rc, salida) fijan códigos y salidas de órdenes concretas y tienen
+    prioridad sobre el modelo.
+    """
+
+    def __init__(self, name: str = "sim", root=None, responses=None,
+                 programs=("gzip", "python3", "tar", "git", "make", "openssl"), shared=None):
+        import tempfile
+        self.name = name
+        self.root = Path(root or tempfile.mkdtemp(prefix="ejabberd-sim-"))
+        # {ruta del nodo: directorio local}: montajes compartidos entre nodos simulados
+        self.shared = {PurePosixPath(k): Path(v) for k, v in (shared or {}).items()}
+        self.responses = [(re.compile(rx), rc, out) for rx, rc, out in (responses or [])]
+        self.programs = set(programs)
+        self.commands: list[str] = []
+        self.services: dict[str, dict] = {}
+        self.users = {"root"}
+        self.temp_count = 0
+        # Lo que responden las sondas de _release_build
+        self.release, self.otp_release, self.arch = "24.02-sim", "26", "x86_64"
+
+    def _path(self, path) -> Path:
+        for mount, local in self.shared.items():
+            if PurePosixPath(path).is_relative_to(mount):
+                return local / PurePosixPath(path).relative_to(mount)
+        return self.root / str(path).lstrip("/")
+
+    def run(self, cmd: str, log_fn, sudo_password: str = "") -> tuple[int, str]:
+        log_fn(f"$ [{self.name}] {cmd}", tag="cmd")
+        self.commands.append(cmd)
+        for rx, rc, out in self.responses:
+            if rx.search(cmd):
+                break
+        else:
+            rc, out = self._shell(cmd)
+        for line in out.splitlines():
+            log_fn(line, tag="out")
+        return rc, out.rstrip("\n")
+
+    def write_text(self, path, content: str):
+        target = self._path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content)
+
+    def listdir(self, path) -> list[str]:
+        target = self._path(path)
+        return sorted(os.listdir(target)) if target.is_dir() else []
+
+    def remove(self, path):
+        target = self._path(path)
+        if target.is_dir():
+            shutil.rmtree(target, ignore_errors=True)
+        else:
+            target.unlink(missing_ok=True)
+
+    def exists(self, path) -> bool:
+        return self._path(path).exists()
+
+    def home(self) -> str:
+        return f"/home/{self.name}"
+
+    # ── intérprete mínimo de shell ───────────────────────────────────────────
+
+    def _shell(self, line: str, stdin: str = "") -> tuple[int, str]:
+        """Evalúa una línea con listas (&&, ||, ;) de tuberías (|) y redirecciones (>)."""
+        lex = shlex.shlex(line, posix=True, punctuation_chars=";&|>")
+        lex.whitespace_split = True
+        try:
+            tokens = list(lex)
+        except ValueError:
+            return 0, ""
+        rc, output, op, pipeline = 0, "", ";", [[]]
+        for token in tokens + [";"]:
+            if token in ("&&", "||", ";"):
+                if (op == "&&" and rc != 0) or (op == "||" and rc == 0):
+                    pass
+                elif pipeline[0]:
+                    rc, out = self._pipeline(pipeline, stdin)
+                    output += out
+                op, pipeline = token, [[]]
+            elif token == "|":
+                pipeline.append([])
+            else:
+                pipeline[-1].append(token)
+        return rc, output
+
+    def _pipeline(self, commands: list[list[str]], stdin: str) -> tuple[int, str]:
+        rc, data = 0, stdin
+        for argv in commands:
+            argv, redirect = list(argv), None
+            while ops := [i for i, a in enumerate(argv) if a in (">", ">>", ">&")]:
+                i = ops[0]
+                fd2 = i > 0 and argv[i - 1] == "2"   # 2>… y 2>&1: stderr no se modela
+                if argv[i] != ">&" and not fd2:
+                    redirect = (argv[i], argv[i + 1] if i + 1 < len(argv) else "/dev/null")
+                del argv[i - 1 if fd2 else i:i + 2]
+            rc, data = self._command(argv, data)
+            if redirect:
+                if redirect[1] != "/dev/null":
+                    target = self._path(redirect[1])
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    with open(target, "a" if redirect[0] == ">>" else "w") as fh:
+                        fh.write(data)
+                data = ""
+        return rc, data
+
+    def _command(self, argv: list[str], stdin: str) -> tuple[int, str]:
+        while argv and (argv[0] in ("sudo", "env") or "=" in argv[0]):
+            argv = argv[3:] if argv[:2] == ["sudo", "-u"] else argv[1:]
+        if not argv:
+            return 0, ""
+        prog, args = PurePosixPath(argv[0]).name, argv[1:]
+        paths = [a for a in args if a.startswith("/")]
+        if prog in ("sh", "bash") and "-c" in args:
+            return self._shell(args[args.index("-c") + 1], stdin)
+        if prog in ("true", ":"):
+            return 0, ""
+        if prog == "false":
+            return 1, ""
+        if prog == "echo":
+            return 0, " ".join(a for a in args if a != "-e") + "\n"
+        if prog == "command" and args[:1] == ["-v"]:
+            found = args[1] in self.programs
+            return (0, f"/usr/bin/{args[1]}\n") if found else (1, "")
+        if prog == "git" and "describe" in args:
+            return 0, f"{self.release}\n"
+        if prog == "erl" and "otp_release" in " ".join(args):
+            return 0, f"{self.otp_release}\n"
+        if prog == "uname" and "-m" in args:
+            return 0, f"{self.arch}\n"
+        if prog == "mktemp":
+            self.temp_count += 1
+            path = f"/tmp/tmp.sim{self.temp_count:04d}"
+            if "-d" in args:
+                self._path(path).mkdir(parents=True, exist_ok=True)
+            else:
+                self.write_text(path, "")
+            return 0, f"{path}\n"
+        if prog == "id":
+            return (0, f"uid=1000({args[-1]})\n") if args[-1] in self.users else (1, "")
+        if prog == "useradd":
+            self.users.add(args[-1])
+            return 0, ""
+        if prog == "systemctl":
+            return self._systemctl(args)
+        if prog == "test":
+            target = self._path(args[1]) if len(args) > 1 else None
+            checks = {"-f": Path.is_file, "-d": Path.is_dir, "-e": Path.exists, "-L": Path.is_symlink,
+                      "-s": lambda t: t.is_file() and t.stat().st_size > 0}
+            return (0, "") if target and checks.get(args[0], Path.exists)(target) else (1, "")
+        if prog == "mkdir" or (prog == "install" and "-d" in args):
+            for path in paths:
+                self._path(path).mkdir(parents=True, exist_ok=True)
+            return 0, ""
+        if prog in ("cp", "install", "mv"):
+            return self._copy(prog, paths)
+        if prog == "tar":
+            # Solo se modela la creación del archivo (-c…f ARCHIVO), vacío
+            for i, a in enumerate(args[:-1]):
+                if re.fullmatch(r"-\w*c\w*f", a) and args[i + 1] != "-":
+                    self.write_text(args[i + 1], "")
+            return 0, ""
+        if prog == "ln" and len(args) >= 2:
+            link = self._path(args[-1])
+            link.parent.mkdir(parents=True, exist_ok=True)
+            if link.is_symlink():
+                link.unlink()
+            link.symlink_to(args[-2])
+            return 0, ""
+        if prog == "readlink" and paths:
+            link = self._path(paths[-1])
+            return (0, os.readlink(link) + "\n") if link.is_symlink() else (1, "")
+        if prog == "rm":
+            for path in paths:
+                self.remove(path)
+            return 0, ""
+        if prog == "cat":
+            if not paths:
+                return 0, stdin
+            missing = [p for p in paths if not self._path(p).is_file()]
+            if missing:
+                return 1, f"cat: {missing[0]}: No such file or directory\n"
+            return 0, "".join(self._path(p).read_text() for p in paths)
+        if prog == "tee":
+            for path in paths:
+                self.write_text(path, stdin)
+            return 0, stdin
+        if prog == "stat" and paths:
+            target = self._path(paths[-1])
+            return (0, f"{target.stat().st_size}\n") if target.exists() else (1, "")
+        return 0, ""
+
+    def _copy(self, prog: str, paths: list[str]) -> tuple[int, str]:
+        if len(paths) < 2:
+            return 0, ""
+        *sources, dest = paths
+        target = self._path(dest)
+        for source in sources:
+            src = self._path(source.removesuffix("/."))
+            if prog == "mv" and (src.is_symlink() or (src.is_dir() and not target.exists())):
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(src, target)
+                continue
+            if not src.exists():
+                return 1, f"{prog}: no se puede acceder a '{source}'\n"
+            if src.is_dir():
+                shutil.copytree(src, target, dirs_exist_ok=True)
+            else:
+                out = target / src.name if target.is_dir() else target
+                out.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(src, out)
+            if prog == "mv":
+                self.remove(source)
+        return 0, ""
+
+    def _systemctl(self, args: list[str]) -> tuple[int, str]:
+        verbs = [a for a in args if not a.startswith("-")]
+        if not verbs:
+            return 0, ""
+        verb, units = verbs[0], [u.removesuffix(".service") for u in verbs[1:]]
+        for unit in units:
+            state = self.services.setdefault(unit, {"enabled": False, "active": False})
+            if verb in ("is-active", "is-enabled"):
+                on = state["active" if verb == "is-active" else "enabled"]
+                return (0, "" if "--quiet" in args else "active\n") if on else (3, "")
+            if verb in ("enable", "disable"):
+                state["enabled"] = verb == "enable"
+                if "--now" in args:
+                    state["active"] = verb == "enable"
+            elif verb in ("start", "restart", "reload"):
+                state["active"] = True
+            elif verb == "stop":
+                state["active"] = False
+        return 0, ""
+
+
+def make_transport(spec: dict):
+    """Crea el transporte descrito por una entrada de inventario."""
+    kind = spec.get("transport", "ssh")
+    if kind == "local":
+        return LocalTransport()
+    if kind == "ssh":
+        address = spec.get("address") or spec.get("name")
+        if not address:
+            raise ValueError("Host SSH sin 'address'")
+        return SSHTransport(
+            address,
+            user=spec.get("user", ""),
+            port=spec.get("port", 22),
+            identity=spec.get("identity", ""),
+            options=spec.get("ssh_options"),
+        )
+    if kind == "fake":
+        return FakeTransport(
+            spec.get("name", "fake"),
+            responses=spec.get("responses"),
+        )
+    if kind == "sim":
+        return SimulatedTransport(
+            spec.get("name", "sim"),
+            root=spec.get("root"),
+            responses=spec.get("responses"),
+            shared=spec.get("shared"),
+        )
+    raise ValueError(f"Transporte desconocido: {kind!r}")
@@ -0,0 +1,98 @@
+"""Alta masiva contra una API de ejabberd sustituta: concurrencia y recuento de errores."""
+
+import http.server
+import json
+import threading
+
+import pytest
+
+from ejabberd_installer import api
+from ejabberd_installer.api import BulkRegistrar
+
+
+class StandInRegister(http.server.ThreadingHTTPServer):
+    """/api/register con respuestas según el nombre de usuario y medida de la concurrencia."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+        self.clients, self.attempts = set(), {}
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(handler):
+                args = json.loads(handler.rfile.read(int(handler.headers["Content-Length"])))
+                with self.lock:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                    self.clients.add(handler.client_address)
+                    tries = self.attempts[args["user"]] = self.attempts.get(args["user"], 0) + 1
+                threading.Event().wait(0.02)    # time.sleep está anulado en los tests
+                status, body = self.answer(args["user"], tries)
+                with self.lock:
+                    self.in_flight -= 1
+                data = json.dumps(body).encode()
+                handler.send_response(status)
+                handler.send_header("Content-Length", str(len(data)))
+                handler.end_headers()
+                handler.wfile.write(data)
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def answer(user, tries):
+        if user.startswith("dup"):
+            return 409, {"message": "User already exists"}
+        if user.startswith("bad"):
+            return 400, {"message": "invalid user"}
+        if user.startswith("flaky") and tries == 1:
+            return 503, "busy"
+        if user.startswith("down"):
+            return 503, "busy"
+        return 200, "ok"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(api.time, "sleep", lambda s: None)    # sin esperas entre reintentos
+    srv = StandInRegister()
+    yield srv
+    srv.shutdown()
+
+
+def _users(tmp_path, names):
+    path = tmp_path / "users.csv"
+    path.write_text("user,password\n" + "".join(f"{n},pw-{n}\n" for n in names))
+    return str(path)
+
+
+def test_counts_outcomes_and_bounds_concurrency(tmp_path, server):
+    names = ([f"u{i}" for i in range(40)] + ["dup1", "dup2", "bad1", "flaky1", "down1"])
+    path = _users(tmp_path, names)
+    url = f"http://127.0.0.1:{server.server_address[1]}/api"
+    result = BulkRegistrar(path, "chat.example.com", url, concurrency=4, retries=2).run()
+
+    assert {k: result[k] for k in ("ok", "exists", "failed", "processed")} == \
+        {"ok": 41, "exists": 2, "failed": 2, "processed": 45}
+    assert 1 < server.max_in_flight <= 4
+    assert len(server.clients) <= 4                   # una conexión keep-alive por hilo
+    assert server.attempts["bad1"] == 1 and server.attempts["down1"] == 3
+    assert server.attempts["flaky1"] == 2
+    failed = [json.loads(line) for line in open(f"{path}.failed.jsonl")]
+    assert sorted(f["user"] for f in failed) == ["bad1", "down1"]
+    assert all(f["error"].startswith(("HTTP 400", "HTTP 503")) for f in failed)
+    assert json.loads(open(f"{path}.progress").read())["done"] == 45
+
+
+def test_resume_skips_completed_records(tmp_path, server):
+    path = _users(tmp_path, [f"u{i}" for i in range(10)])
+    url = f"http://127.0.0.1:{server.server_address[1]}/api"
+    BulkRegistrar(path, "chat.example.com", url, concurrency=2).run()
+    again = BulkRegistrar(path, "chat.example.com", url, concurrency=2).run()
+    assert again["processed"] == 0 and again["ok"] == 10
+    assert all(tries == 1 for tries in server.attempts.values())
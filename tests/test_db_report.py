@@ -0,0 +1,32 @@
+"""Informe de tamaño de la base de datos con los datos de conexión SQL configurados."""
+
+import pytest
+
+from ejabberd_installer import Engine, FakeTransport, build_params, validate_config
+
+SQL = {"domain": "chat.example.com", "sql_server": "db.lab.local", "sql_database": "xmpp",
+       "sql_username": "ejabberd", "sql_password": "s3cret"}
+
+
+@pytest.mark.parametrize("db_type, client, cred", [
+    ("pgsql", "psql -h db.lab.local -U ejabberd -d xmpp", "PGPASSFILE=/tmp/tmp.Xq/.pgpass"),
+    ("mysql", "mysql --defaults-extra-file=/tmp/tmp.Xq/.my.cnf", "-u ejabberd xmpp"),
+])
+def test_sql_report_uses_configured_database_and_credentials(db_type, client, cred):
+    transport = FakeTransport(responses=[
+        (r"^sudo mktemp -d$", 0, "/tmp/tmp.Xq"),
+        (r"^mktemp -d$", 0, "/tmp/tmp.Us"),
+        (r"psql|mysql ", 0, "archive|120|8192\nspool|3|4096"),
+    ])
+    p = build_params(validate_config({**SQL, "db_type": db_type}))
+    report = Engine(transport)._db_report(p)
+
+    assert report == {"archive": (120, 8192), "spool": (3, 4096)}
+    [query] = [c for c in transport.commands if "union all" in c]
+    assert client in query and cred in query
+    assert "postgres" not in query and p["db_path"] not in query and "s3cret" not in query
+    assert transport.commands[-1] == "sudo rm -rf /tmp/tmp.Xq"
+    # La copia intermedia con la contraseña, solo en el directorio privado del usuario
+    [(path, content)] = transport.files.items()
+    assert path.startswith("/tmp/tmp.Us/") and "s3cret" in content
+    assert any(c.startswith(f"sudo install -m 600 {path} /tmp/tmp.Xq/") for c in transport.commands)
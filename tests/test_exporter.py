@@ -0,0 +1,107 @@
+"""Exportador de métricas contra una API de ejabberd sustituta (http.server)."""
+
+import http.server
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from ejabberd_installer.components import _EXPORTER_SCRIPT
+
+
+class StandInApi(http.server.ThreadingHTTPServer):
+    """mod_http_api mínimo: HTTP/1.1 keep-alive y registro de las conexiones cliente."""
+
+    def __init__(self):
+        self.clients, self.calls, self.status = set(), 0, 200
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(handler):
+                handler.rfile.read(int(handler.headers["Content-Length"]))
+                self.clients.add(handler.client_address)
+                self.calls += 1
+                body = json.dumps(3).encode() if self.status == 200 else b'"error"'
+                handler.send_response(self.status)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _metrics(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+        lines = resp.read().decode().splitlines()
+    return {name: float(value) for name, value in
+            (line.split() for line in lines if line and not line.startswith("#"))}
+
+
+def _wait_for(check, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = check()
+        if result:
+            return result
+        time.sleep(0.05)
+    raise AssertionError("la condición no se cumplió a tiempo")
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    api = StandInApi()
+    script = tmp_path / "ejabberd-exporter"
+    script.write_text(_EXPORTER_SCRIPT)
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, str(script), "--interval", "0.1",
+                             "--api", f"http://127.0.0.1:{api.server_address[1]}/api",
+                             "--listen", f"127.0.0.1:{port}"])
+    try:
+        _wait_for(lambda: _try_metrics(port))
+        yield api, port
+    finally:
+        proc.kill()
+        proc.wait()
+        api.shutdown()
+
+
+def _try_metrics(port):
+    try:
+        return _metrics(port)
+    except OSError:
+        return None
+
+
+def test_polls_reuse_one_keep_alive_connection(exporter):
+    api, port = exporter
+    metrics = _wait_for(lambda: (m := _metrics(port)) and api.calls >= 30 and m)
+    assert metrics["ejabberd_up"] == 1 and metrics["ejabberd_connected_users"] == 3
+    assert metrics["ejabberd_exporter_api_connections_total"] == 1
+    assert len(api.clients) == 1
+
+
+def test_up_drops_to_zero_when_the_api_errors(exporter):
+    api, port = exporter
+    assert _metrics(port)["ejabberd_up"] == 1
+    api.status = 500
+    metrics = _wait_for(lambda: (m := _metrics(port))["ejabberd_up"] == 0 and m)
+    assert metrics["ejabberd_exporter_errors_total"] > 0
+    api.status = 200
+    _wait_for(lambda: _metrics(port)["ejabberd_up"] == 1)
@@ -0,0 +1,51 @@
+"""Balanceador: espera a que las comprobaciones de salud de HAProxy se estabilicen."""
+
+from ejabberd_installer import FakeTransport, run_workflow
+from ejabberd_installer import engine
+
+
+def _state(*servers):
+    """Salida de 'show servers state' (formato 1) con (nombre, op_state, check_result, health)."""
+    lines = ["1", "# be_id be_name srv_id srv_name srv_addr srv_op_state srv_admin_state ..."]
+    for i, (name, op, result, health) in enumerate(servers, 1):
+        lines.append(f"3 xmpp_c2s {i} {name} 10.0.0.1{i} {op} 0 1 1 4 6 {result} {health} 7 0 0 0 - 5222 -")
+    return "\n".join(lines)
+
+
+class SocketTransport(FakeTransport):
+    """FakeTransport cuyo socket de administración devuelve estados sucesivos."""
+
+    def __init__(self, states):
+        super().__init__()
+        self.states = list(states)
+
+    def run(self, cmd, log_fn, sudo_password=""):
+        if "show servers state" in cmd:
+            self.commands.append(cmd)
+            return 0, self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        return super().run(cmd, log_fn, sudo_password)
+
+
+def _haproxy(transport):
+    config = {"domain": "chat.example.com", "haproxy_backends": ["10.0.0.11", "10.0.0.12"]}
+    [result] = run_workflow("haproxy", config, transport)
+    return result
+
+
+def test_polls_until_every_check_has_settled(monkeypatch):
+    monkeypatch.setattr(engine.time, "sleep", lambda s: None)
+    transport = SocketTransport([
+        _state(("n1", 2, 0, 4), ("n2", 2, 0, 4)),     # sin comprobar todavía
+        _state(("n1", 2, 3, 4), ("n2", 2, 2, 2)),     # n2 falla, aún no llega a fall
+        _state(("n1", 2, 3, 4), ("n2", 0, 2, 0)),
+    ])
+    result = _haproxy(transport)
+    polls = [c for c in transport.commands if "show servers state" in c]
+    assert len(polls) == 3 and all(c.startswith("sudo sh -c ") for c in polls)
+    assert ("warn", "⚠ Nodos que no superan la comprobación de salud: xmpp_c2s/n2") in result.messages
+
+
+def test_stops_polling_after_the_timeout(monkeypatch):
+    monkeypatch.setattr(engine, "HAPROXY_SETTLE", 0)
+    result = _haproxy(SocketTransport([_state(("n1", 2, 0, 4), ("n2", 2, 0, 4))]))
+    assert any("no se estabilizaron" in text for _, text in result.messages)
@@ -0,0 +1,107 @@
+"""Agente de salud contra sustitutos del listener c2s, ejabberdctl, la API y erl_call."""
+
+import http.server
+import json
+import socket
+import stat
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from ejabberd_installer import FakeTransport, run_workflow
+from ejabberd_installer.components import _HEALTH_AGENT_SCRIPT
+
+STATUS = ("The node ejabberd@localhost is started with status: started\n"
+          "ejabberd 24.02 is running in that node")
+
+
+def _executable(path, text):
+    path.write_text(text)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return path
+
+
+@pytest.fixture
+def listener():
+    """Listener c2s que responde a cualquier cabecera con la suya."""
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                conn.recv(4096)
+                conn.sendall(b"<?xml version='1.0'?><stream:stream id='1'>")
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def agent(tmp_path, listener):
+    """Ejecuta una ronda (--once) del agente y devuelve (rc, resultado)."""
+    script = tmp_path / "ejabberd-health"
+    script.write_text(_HEALTH_AGENT_SCRIPT)
+    _executable(tmp_path / "erl_call",
+                f'#!/bin/sh\necho "$@" > {tmp_path}/erl_call.args\necho 7\n')
+    ctl = _executable(tmp_path / "ejabberdctl", f"#!/bin/sh\necho '{STATUS}'\n")
+
+    def run(*extra):
+        argv = [sys.executable, str(script), "--port", str(listener), "--ctl", str(ctl),
+                "--erl-call", str(tmp_path / "erl_*"), "--timeout", "2", *extra, "--once"]
+        res = subprocess.run(argv, capture_output=True, text=True, timeout=30)
+        return res.returncode, json.loads(res.stdout)
+    return run
+
+
+def test_healthy_node_reports_the_beam_run_queue(agent, tmp_path):
+    rc, result = agent("--run-queue", "10")
+    assert rc == 0 and result["problems"] == []
+    assert result["run_queue"] == 7 and result["status"].startswith("The node ejabberd@localhost")
+    args = (tmp_path / "erl_call.args").read_text().split()
+    assert args == ["-sname", "ejabberd@localhost", "-a", "erlang", "statistics", "[run_queue]"]
+
+
+def test_run_queue_above_threshold_is_a_problem(agent):
+    rc, result = agent("--run-queue", "5")
+    assert rc == 1 and result["problems"] == ["cola de ejecución: 7 > 5"]
+
+
+def test_missing_erl_call_leaves_the_run_queue_unjudged(agent, tmp_path):
+    rc, result = agent("--erl-call", str(tmp_path / "no-such-erl_call"))
+    assert rc == 0 and "run_queue" not in result and "erl_call" in result["run_queue_error"]
+
+
+def test_api_errors_fail_the_status_check(agent):
+    class Api(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Api)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        rc, result = agent("--api", f"http://127.0.0.1:{server.server_address[1]}/api")
+    finally:
+        server.shutdown()
+    assert rc == 1 and result["problems"] == ["status: HTTP 500"] and "run_queue" not in result
+
+
+def test_health_workflow_runs_the_agent_as_ejabberd():
+    once = json.dumps({"accept_ms": 3.2, "status": STATUS.splitlines()[0], "run_queue": 0,
+                       "problems": []})
+    transport = FakeTransport(responses=[(r"--once", 0, once)])
+    run_workflow("health", {"domain": "chat.example.com"}, transport)
+    [cmd] = [c for c in transport.commands if "--once" in c]
+    assert cmd.startswith("sudo -u ejabberd -H python3 -c ")
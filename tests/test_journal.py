@@ -0,0 +1,26 @@
+"""Diario de pasos: un flujo repetido con los mismos parámetros no rehace nada."""
+
+from ejabberd_installer import SimulatedTransport, run_workflow
+
+
+def test_config_twice_skips_every_step(tmp_path):
+    transport = SimulatedTransport(root=tmp_path)
+    config = {"domain": "xmpp.lab.local"}
+    first = run_workflow("config", config, transport, check=True)
+    assert all(r.status == "ok" for r in first)
+
+    second = run_workflow("config", config, transport, check=True)
+    journaled = [r for r in second if r.status == "skipped"]
+    assert [r.step for r in journaled] == [
+        "user", "yaml", "cert", "permissions", "systemd", "retention", "exporter"]
+    assert [r.status for r in second if r not in journaled] == ["ok", "ok"]   # preflight y TLS
+
+
+def test_step_ids_match_between_executed_and_skipped_runs(tmp_path):
+    transport = SimulatedTransport(root=tmp_path)
+    config = {"domain": "xmpp.lab.local"}
+    first = {r.step: r.title for r in run_workflow("config", config, transport)}
+    second = {r.step: r.title for r in run_workflow("config", config, transport)}
+    assert first == second
+    assert first["yaml"] == "PASO 5: Configuración ejabberd.yml"
+    assert first["comprobacion-previa-del-nodo"] == "PASO 0: Comprobación previa del nodo"
@@ -0,0 +1,31 @@
+"""Migración sqlite → SQL: el trabajo con la contraseña no queda expuesto en /tmp."""
+
+import json
+
+from ejabberd_installer import SimulatedTransport, run_workflow
+
+SUMMARY = {"ok": True, "tables": {"users": [2, 2]}, "skipped": [], "new_schema": False}
+
+
+def test_job_file_lives_in_a_private_directory(tmp_path):
+    written = {}
+
+    class Recorder(SimulatedTransport):
+        def write_text(self, path, content):
+            written[str(path)] = content
+            super().write_text(path, content)
+
+    transport = Recorder(root=tmp_path, programs=("psql", "python3"), responses=[
+        (r"python3 \S+/migrate\.py", 0, json.dumps(SUMMARY))])
+    db = "/usr/local/ejabberd/var/lib/ejabberd/ejabberd.db"
+    transport.write_text(db, "")
+    config = {"domain": "chat.example.com", "migrate_to": "pgsql", "sql_server": "db.lab.local",
+              "sql_username": "ejabberd", "sql_password": "s3cret"}
+    results = run_workflow("migrate", config, transport)
+
+    assert results[0].ok, results[0].error
+    [job] = [path for path, content in written.items() if "s3cret" in content and "job" in path]
+    assert job.startswith("/tmp/tmp.sim") and job.endswith("/job.json")
+    run = next(c for c in transport.commands if "migrate.py" in c)
+    assert run.startswith("sudo python3 ") and job in run
+    assert not (tmp_path / job.lstrip("/")).parent.exists()
@@ -0,0 +1,57 @@
+"""Actualización escalonada de extremo a extremo sobre nodos simulados."""
+
+import os
+
+from ejabberd_installer import make_transport
+from ejabberd_installer.fleet import RollingUpgrade
+
+
+def test_rolling_upgrade_builds_once_and_switches_every_node(tmp_path):
+    shared = {"/var/cache/ejabberd-installer": str(tmp_path / "cache")}
+    inventory = {
+        "defaults": {"domain": "chat.example.com", "drain_seconds": 5, "sudo_pass": "x"},
+        "balancer": {"name": "lb", "transport": "sim", "root": str(tmp_path / "lb")},
+        "hosts": [{"name": name, "address": f"10.0.0.1{i}", "transport": "sim",
+                   "root": str(tmp_path / name), "shared": shared}
+                  for i, name in enumerate(("n1", "n2"))],
+    }
+    transports = {}
+
+    def factory(host):
+        return transports.setdefault(host["name"], make_transport(host))
+
+    results = RollingUpgrade(inventory, log_dir=tmp_path / "logs",
+                             transport_factory=factory).run()
+
+    assert [(r["name"], r["ok"]) for r in results] == [("n1", True), ("n2", True)], results
+    assert os.listdir(tmp_path / "cache" / "releases") == ["ejabberd-24.02-sim-otp26-x86_64.tar.gz"]
+    for name in ("n1", "n2"):
+        current = tmp_path / name / "usr/local/ejabberd-releases/current"
+        assert os.readlink(current).endswith("24.02-sim")
+    # Solo el constructor compila; el otro nodo extrae el archivo de la caché
+    builds = {n: any("make install" in c for c in t.commands) for n, t in transports.items()}
+    assert builds == {"n1": True, "n2": False, "lb": False}
+    waits = [c for c in transports["n2"].commands if "status >/dev/null" in c]
+    assert waits and all(c.startswith("sudo sh -c ") for c in waits)
+    drains = [c for c in transports["lb"].commands if "state drain" in c]
+    assert len(drains) == 2
+
+
+def test_rolling_upgrade_stops_before_stop_kindly_if_haproxy_rejects_the_drain(tmp_path):
+    inventory = {
+        "defaults": {"domain": "chat.example.com", "drain_seconds": 5, "sudo_pass": "x"},
+        "balancer": {"name": "lb", "transport": "sim", "root": str(tmp_path / "lb"),
+                     "responses": [["state drain", 0, "No such server.\n\nNo such server.\n"]]},
+        "hosts": [{"name": "n1", "address": "10.0.0.11", "transport": "sim",
+                   "root": str(tmp_path / "n1")}],
+    }
+    transports = {}
+
+    def factory(host):
+        return transports.setdefault(host["name"], make_transport(host))
+
+    [result] = RollingUpgrade(inventory, log_dir=tmp_path / "logs",
+                              transport_factory=factory).run()
+
+    assert not result["ok"] and "No such server." in result["error"]
+    assert not any("stop_kindly" in c or "systemctl stop" in c for c in transports["n1"].commands)
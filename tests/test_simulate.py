@@ -0,0 +1,37 @@
+"""--simulate: los flujos corren contra el sistema simulado y dejan el estado esperado."""
+
+from ejabberd_installer import DEFAULT_CONFIG, SimulatedTransport, build_params
+from ejabberd_installer.cli import main
+from ejabberd_installer.components import CONF_PATH
+from ejabberd_installer.engine import SimulatedInstaller
+
+
+def test_simulate_runs_and_verifies_the_default_workflows(capsys):
+    assert main(["--simulate"]) == 0
+    out = capsys.readouterr().out
+    for workflow in ("full", "config", "cert", "backup"):
+        assert f"Simulación: {workflow}" in out
+    assert "✖" not in out
+
+
+def test_verify_reports_what_the_workflow_left_undone(tmp_path):
+    transport = SimulatedTransport(root=tmp_path)
+    app = SimulatedInstaller(transport)
+    p = build_params(DEFAULT_CONFIG)
+    timings = app.simulate("full", p)
+    assert timings and all(ncmds >= 0 for _, _, ncmds in timings)
+    assert app.verify("full", p) == []
+
+    transport.write_text(CONF_PATH, "hosts:\n  - otro.example.com\n")
+    transport.remove("/usr/local/ejabberd/etc/ejabberd/server.pem")
+    transport.run("systemctl stop ejabberd", lambda *a, **k: None)
+    assert app.verify("full", p) == [
+        f"{CONF_PATH} no coincide con la configuración",
+        "el servicio ejabberd no queda habilitado y en marcha",
+        "falta server.pem",
+    ]
+
+    before = app.backups(p)
+    app.simulate("backup", p)
+    assert app.verify("backup", p, before) == []
+    assert app.verify("backup", p, app.backups(p)) == [f"no hay copia nueva en {p['backup_dir']}"]
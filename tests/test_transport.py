@@ -0,0 +1,42 @@
+"""Inyección de la contraseña sudo en las órdenes locales."""
+
+import stat
+
+import pytest
+
+from ejabberd_installer.transport import _quiet, _sudo_wrap, run_cmd
+
+
+@pytest.fixture
+def fake_sudo(tmp_path, monkeypatch):
+    """Un 'sudo' en el PATH que solo ejecuta la orden si -A le da la contraseña."""
+    script = tmp_path / "sudo"
+    script.write_text('#!/bin/sh\n'
+                      '[ "$1" = -A ] && shift && [ "$("$SUDO_ASKPASS")" = s3cret ] '
+                      '|| { echo denegado; exit 1; }\n'
+                      'exec "$@"\n')
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    return script
+
+
+@pytest.mark.parametrize("cmd, expected", [
+    ("sudo echo hola", "hola"),
+    ("echo hola | sudo cat", "hola"),
+    ("cd / && sudo pwd", "/"),
+    ("printf 'a\\nb\\n' | xargs sudo echo", "a b"),
+    ("sudo sh -c 'sudo echo anidado'", "anidado"),
+])
+def test_every_sudo_in_the_command_gets_the_password(fake_sudo, cmd, expected):
+    assert run_cmd(cmd, _quiet, "s3cret") == (0, expected)
+
+
+def test_wrong_password_is_refused(fake_sudo):
+    rc, out = run_cmd("echo hola | sudo cat", _quiet, "otra")
+    assert rc != 0 and out == "denegado"
+
+
+def test_password_never_reaches_the_command_line():
+    wrapped, stdin_data = _sudo_wrap("echo x | sudo tee /etc/hosts", "s3cret")
+    assert "s3cret" not in wrapped and stdin_data == "s3cret\n"
+    assert _sudo_wrap("sudo true", "") == ("sudo true", None)
@@ -9,11 +9,12 @@ cat << 'EOF'
 MODOS DE USO:
 
   Modo Gráfico (GUI):
-    python3 ejabberd_installer.py
+    python3 ejabberd-installer.py
     
   Modo Terminal (CLI):
-    python3 ejabberd_installer.py --cli
-    python3 ejabberd_installer.py --no-gui
+    python3 ejabberd-installer.py --cli
+    python3 ejabberd-installer.py --no-gui
+    python3 -m ejabberd_installer --cli
 
 REQUISITOS:
 
@@ -25,16 +26,14 @@ REQUISITOS:
 
 INSTALACIÓN RÁPIDA (modo CLI):
 
-  1. Descarga el script:
-     wget https://ejemplo.com/ejabberd_installer.py
+  1. Descarga el proyecto (ejabberd-installer.py y el paquete
+     ejabberd_installer/) y entra en su directorio
   
-  2. Dale permisos de ejecución:
-     chmod +x ejabberd_installer.py
+  2. Ejecuta en modo CLI:
+     python3 ejabberd-installer.py --cli
+     (o bien: python3 -m ejabberd_installer --cli)
   
-  3. Ejecuta en modo CLI:
-     python3 ejabberd_installer.py --cli
-  
-  4. Sigue el menú interactivo
+  3. Sigue el menú interactivo
 
 DESPUÉS DE INSTALAR:
 